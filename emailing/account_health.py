@@ -0,0 +1,123 @@
+# account_health.py
+"""Negative cache for email accounts whose credentials stopped working.
+
+Every IMAP/SMTP login outcome is recorded under `auth_health` on the
+`email_accounts` document. After an authentication failure the account is
+quarantined until `auth_health.retry_at`, following BACKOFF_SCHEDULE, so
+inbox checks, campaigns and the reply watcher stop paying a TLS handshake
+plus a failed login on every call. Updating the credentials through
+`PUT /email-accounts/{id}` clears the quarantine immediately.
+"""
+import os
+import smtplib
+from datetime import datetime, timedelta
+from typing import Optional, Any, Dict
+
+import http_cache
+
+# minutes to wait after the 1st, 2nd, 3rd... consecutive auth failure
+BACKOFF_SCHEDULE = [
+    int(m) for m in os.getenv("ACCOUNT_AUTH_BACKOFF_MINUTES", "5,30,120,720,1440").split(",")
+]
+
+# Classified by exception type, never by message text: an unrelated error that
+# mentions "535" (a port, an address, a message id) must not quarantine an account.
+SMTP_AUTH_CODES = (534, 535)  # 534: application-specific password required
+# rejected IMAP logins: imap_tools' MailboxLoginError, reply_watcher's ImapAuthError
+# (matched by name so this module imports neither)
+IMAP_AUTH_ERRORS = ("MailboxLoginError", "ImapAuthError")
+
+STATUS_OK = "ok"
+STATUS_QUARANTINED = "quarantined"
+STATUS_RETRYING = "retrying"
+STATUS_UNKNOWN = "unknown"
+
+
+def is_auth_error(error: Any) -> bool:
+    """True when the exception means the server rejected the credentials."""
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException) and error.smtp_code in SMTP_AUTH_CODES:
+        return True
+    return any(cls.__name__ in IMAP_AUTH_ERRORS for cls in type(error).__mro__)
+
+
+def backoff_for(failures: int) -> timedelta:
+    index = min(max(failures, 1), len(BACKOFF_SCHEDULE)) - 1
+    return timedelta(minutes=BACKOFF_SCHEDULE[index])
+
+
+def available_filter(now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Mongo filter fragment matching accounts that are not quarantined right now."""
+    return {"auth_health.retry_at": {"$not": {"$gt": now or datetime.utcnow()}}}
+
+
+def is_quarantined(account: Dict[str, Any], now: Optional[datetime] = None) -> bool:
+    retry_at = (account.get("auth_health") or {}).get("retry_at")
+    return bool(retry_at and retry_at > (now or datetime.utcnow()))
+
+
+def health_state(account: Dict[str, Any], now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Health summary exposed in the account listing."""
+    health = account.get("auth_health") or {}
+    if is_quarantined(account, now):
+        status_ = STATUS_QUARANTINED
+    elif health.get("failures"):
+        status_ = STATUS_RETRYING  # backoff expired, next login decides
+    elif health.get("last_ok_at"):
+        status_ = STATUS_OK
+    else:
+        status_ = STATUS_UNKNOWN
+    return {
+        "status": status_,
+        "auth_failures": health.get("failures", 0),
+        "retry_at": health.get("retry_at"),
+        "last_error": health.get("last_error"),
+        "last_ok_at": health.get("last_ok_at"),
+    }
+
+
+async def record_auth_failure(accounts_col, account: Dict[str, Any], error: Any) -> datetime:
+    """Bump the failure count and push retry_at out along the backoff schedule."""
+    now = datetime.utcnow()
+    failures = (account.get("auth_health") or {}).get("failures", 0) + 1
+    retry_at = now + backoff_for(failures)
+    await accounts_col.update_one(
+        {"_id": account["_id"]},
+        {"$set": {
+            "auth_health.failures": failures,
+            "auth_health.failed_at": now,
+            "auth_health.retry_at": retry_at,
+            "auth_health.last_error": str(error)[:300],
+        }},
+    )
+    account.setdefault("auth_health", {}).update({"failures": failures, "retry_at": retry_at})
+    # the listing flips from quarantined to retrying at retry_at, so its ETag has to change then too
+    if account.get("user_id"):
+        await http_cache.bump(http_cache.sibling(accounts_col), account["user_id"], "email_accounts", recheck_at=retry_at)
+    print(f"🔐 {account.get('email')} quarantined until {retry_at:%Y-%m-%d %H:%M} UTC after {failures} auth failure(s)")
+    return retry_at
+
+
+async def record_auth_success(accounts_col, account: Dict[str, Any]):
+    """Clear the failure state after a successful login. Skips the write when nothing changed recently."""
+    health = account.get("auth_health") or {}
+    now = datetime.utcnow()
+    last_ok = health.get("last_ok_at")
+    if not health.get("failures") and last_ok and now - last_ok < timedelta(hours=1):
+        return
+    await accounts_col.update_one(
+        {"_id": account["_id"]},
+        {
+            "$set": {"auth_health.failures": 0, "auth_health.last_ok_at": now},
+            "$unset": {"auth_health.retry_at": "", "auth_health.last_error": "", "auth_health.failed_at": ""},
+        },
+    )
+    account["auth_health"] = {"failures": 0, "last_ok_at": now}
+    if account.get("user_id"):
+        await http_cache.bump(http_cache.sibling(accounts_col), account["user_id"], "email_accounts")
+
+
+def reset_update() -> Dict[str, Any]:
+    """Update fragment used when credentials change: forget the quarantine entirely."""
+    return {"$unset": {"auth_health": ""}}
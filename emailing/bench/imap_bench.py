@@ -0,0 +1,250 @@
+# bench/imap_bench.py
+"""Offline benchmark for the inbox endpoints and the reply watcher.
+
+Starts bench/imap_stub.py on localhost, seeds it with synthetic mailboxes,
+points the API at it (IMAP_HOST/IMAP_PORT/IMAP_SSL=false) and reports
+latency, bytes transferred and logins per request.
+
+Run from the emailing/ directory:
+
+    python -m bench.imap_bench --accounts 5 --messages 200 --attachment-kb 64 \
+        --seen-ratio 0.5 --requests 10 --latency-ms 20
+
+By default the throwaway database `imap_bench` on MONGODB_URI is used and
+dropped afterwards; pass --mongomock to run without a MongoDB server
+(requires the mongomock-motor package).
+"""
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import contextlib
+import statistics
+from datetime import datetime
+from typing import List, Dict, Any
+
+from bench.imap_stub import ImapStubServer, make_message
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(name: str, latencies: List[float], deltas: List[Dict[str, int]]) -> Dict[str, Any]:
+    def per_request(key):
+        return statistics.mean(d.get(key, 0) for d in deltas) if deltas else 0
+    return {
+        "name": name,
+        "requests": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1) if latencies else 0.0,
+        "logins_per_request": round(per_request("logins"), 2),
+        "connections_per_request": round(per_request("connections"), 2),
+        "commands_per_request": round(per_request("commands"), 1),
+        "kb_out_per_request": round(per_request("bytes_out") / 1024, 1),
+        "kb_in_per_request": round(per_request("bytes_in") / 1024, 1),
+    }
+
+
+def delta(before: Dict[str, int], after: Dict[str, int]) -> Dict[str, int]:
+    return {k: after.get(k, 0) - before.get(k, 0) for k in set(before) | set(after)}
+
+
+@contextlib.contextmanager
+def quiet(enabled: bool):
+    if not enabled:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+SHARED_DB_MODULES = ("db", "sending", "scraping", "lead_activity")
+
+
+def bind_db(module, db):
+    """Point every Motor collection global of `module` at `db` (used with --mongomock).
+
+    The modules main imports its collections from are rebound as well.
+    """
+    import motor.motor_asyncio
+    modules = [module] + [sys.modules[name] for name in SHARED_DB_MODULES if name in sys.modules]
+    for target in modules:
+        for name in dir(target):
+            value = getattr(target, name)
+            if isinstance(value, motor.motor_asyncio.AsyncIOMotorCollection):
+                setattr(target, name, db[value.name])
+        if hasattr(target, "db"):
+            target.db = db
+
+
+async def seed_database(main, db, stub: ImapStubServer, args) -> Dict[str, Any]:
+    user = {"email": "bench@example.com", "password": "-", "created_at": datetime.utcnow()}
+    user_id = str((await db["users"].insert_one(user)).inserted_id)
+    accounts, leads = [], []
+    for i in range(args.accounts):
+        address = f"bench{i}@example.com"
+        senders = [f"lead{i}-{j}@example.com" for j in range(args.leads_per_account)]
+        stub.add_account(address, "app-password")
+        stub.seed(address, args.messages, attachment_kb=args.attachment_kb,
+                  seen_ratio=args.seen_ratio, senders=senders)
+        accounts.append({
+            "email": address,
+            "password": "app-password",
+            "sender_name": "Bench",
+            "is_active": True,
+            "created_at": datetime.utcnow(),
+            "user_id": user_id,
+        })
+        leads.extend({
+            "company_name": f"Company {s}",
+            "email": s,
+            "mail_sent": True,
+            "created_at": datetime.utcnow(),
+            "user_id": user_id,
+        } for s in senders)
+    await db["email_accounts"].insert_many(accounts)
+    if leads:
+        await db["leads"].insert_many(leads)
+    token = main.create_access_token({"sub": user["email"]})
+    return {"user_id": user_id, "token": token, "accounts": accounts}
+
+
+async def bench_unread_emails(main, stub: ImapStubServer, token: str, args) -> Dict[str, Any]:
+    import httpx
+    latencies, deltas = [], []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        for _ in range(args.requests):
+            before = stub.snapshot()
+            started = time.perf_counter()
+            with quiet(not args.verbose):
+                response = await client.get(
+                    "/unread-emails",
+                    params={"max_emails": args.max_emails},
+                    headers={"Authorization": f"Bearer {token}"},
+                )
+            latencies.append(time.perf_counter() - started)
+            deltas.append(delta(before, stub.snapshot()))
+            response.raise_for_status()
+    return summarize("GET /unread-emails", latencies, deltas)
+
+
+async def bench_reply_watcher(reply_watcher, db, stub: ImapStubServer, accounts, args) -> Dict[str, Any]:
+    before = stub.snapshot()
+    watcher = reply_watcher.ReplyWatcher(db)
+    started = time.perf_counter()
+    with quiet(not args.verbose):
+        task = asyncio.create_task(watcher.run())
+        while stub.idling() < len(accounts):
+            if time.perf_counter() - started > args.timeout:
+                raise TimeoutError(f"only {stub.idling()}/{len(accounts)} accounts reached IDLE")
+            await asyncio.sleep(0.01)
+    startup = time.perf_counter() - started
+    startup_delta = delta(before, stub.snapshot())
+
+    latencies, deltas = [], []
+    inbox = db["inbox_messages"]
+    for i in range(args.deliveries):
+        account = accounts[i % len(accounts)]
+        sender = account["email"].replace("bench", "lead").replace("@", "-0@")
+        raw = make_message(sender, account["email"], f"Re: offer {i}", "Sounds interesting, tell me more.")
+        expected = await inbox.count_documents({}) + 1
+        before = stub.snapshot()
+        started = time.perf_counter()
+        with quiet(not args.verbose):
+            stub.deliver(account["email"], raw)
+            while await inbox.count_documents({}) < expected:
+                if time.perf_counter() - started > args.timeout:
+                    raise TimeoutError("reply watcher did not store the delivered message")
+                await asyncio.sleep(0.002)
+        latencies.append(time.perf_counter() - started)
+        deltas.append(delta(before, stub.snapshot()))
+
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    result = summarize("reply watcher (deliver -> stored)", latencies, deltas)
+    result["startup_ms"] = round(startup * 1000, 1)
+    result["startup_logins"] = startup_delta.get("logins", 0)
+    result["startup_kb_out"] = round(startup_delta.get("bytes_out", 0) / 1024, 1)
+    result["replied_leads"] = await db["leads"].count_documents({"replied": True})
+    return result
+
+
+def print_report(results: List[Dict[str, Any]], args):
+    print(f"\nIMAP stand-in: {args.accounts} accounts x {args.messages} messages, "
+          f"{args.attachment_kb} KB attachments, {args.seen_ratio:.0%} seen, {args.latency_ms} ms per reply\n")
+    for r in results:
+        print(r["name"])
+        for key, value in r.items():
+            if key != "name":
+                print(f"  {key:<26} {value}")
+        print()
+
+
+async def run(args):
+    stub = ImapStubServer(latency=args.latency_ms / 1000)
+    host, port = stub.start_in_thread()
+    os.environ.update({"IMAP_HOST": host, "IMAP_PORT": str(port), "IMAP_SSL": "false"})
+    os.environ.setdefault("MONGODB_DB", "imap_bench")
+
+    with quiet(not args.verbose):
+        import main
+        import reply_watcher
+
+    if args.mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+        db = AsyncMongoMockClient()["imap_bench"]
+        bind_db(main, db)
+    else:
+        db = main.db
+        await db.client.drop_database(db.name)
+
+    try:
+        seeded = await seed_database(main, db, stub, args)
+        results = [await bench_unread_emails(main, stub, seeded["token"], args)]
+        if args.deliveries:
+            results.append(await bench_reply_watcher(reply_watcher, db, stub, seeded["accounts"], args))
+    finally:
+        if not args.mongomock:
+            await db.client.drop_database(db.name)
+        stub.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results, args)
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark inbox endpoints and the reply watcher against a local IMAP stand-in")
+    parser.add_argument("--accounts", type=int, default=3)
+    parser.add_argument("--messages", type=int, default=100, help="messages seeded per account")
+    parser.add_argument("--attachment-kb", type=int, default=0, help="attachment size per seeded message")
+    parser.add_argument("--seen-ratio", type=float, default=0.5, help="fraction of seeded messages flagged \\Seen")
+    parser.add_argument("--leads-per-account", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=5, help="GET /unread-emails calls")
+    parser.add_argument("--max-emails", type=int, default=10)
+    parser.add_argument("--deliveries", type=int, default=10, help="messages pushed to the reply watcher (0 to skip)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated server round trip")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--mongomock", action="store_true", help="use an in-memory MongoDB (mongomock-motor)")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="show the API's own logging")
+    args = parser.parse_args(argv)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
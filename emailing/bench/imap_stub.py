@@ -0,0 +1,405 @@
+# bench/imap_stub.py
+"""Local IMAP server stand-in for benchmarks and offline runs.
+
+Implements the IMAP4rev1 subset that imap_tools (used by /unread-emails) and
+aioimaplib (used by reply_watcher.py) actually send: CAPABILITY, LOGIN,
+SELECT/EXAMINE, [UID] SEARCH, [UID] FETCH, [UID] STORE, IDLE, NOOP, UNSELECT,
+CLOSE and LOGOUT. Mailboxes live in memory and every connection, login,
+command and byte is counted so a benchmark can attribute cost per request.
+
+    stub = ImapStubServer(latency=0.02)
+    stub.add_account("a@example.com", "secret")
+    stub.seed("a@example.com", messages=100, attachment_kb=64, seen_ratio=0.5)
+    host, port = stub.start_in_thread()
+"""
+import re
+import random
+import asyncio
+import threading
+from collections import Counter
+from datetime import datetime, timezone, timedelta
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formataddr, format_datetime, make_msgid
+from typing import List, Optional, Dict, Any
+
+CRLF = b"\r\n"
+UIDVALIDITY = 1
+TOKEN_RE = re.compile(r'"((?:[^"\\]|\\.)*)"|(\()|(\))|([^\s()"]+(?:\[[^\]]*\](?:<[\d.]+>)?)?)')
+FETCH_ITEM_RE = re.compile(
+    r"(BODY(?:\.PEEK)?\[([^\]]*)\](?:<(\d+)\.(\d+)>)?|UID|FLAGS|RFC822\.SIZE|RFC822\.HEADER|RFC822|INTERNALDATE)",
+    re.I,
+)
+
+
+def make_message(sender: str, recipient: str, subject: str, body: str,
+                 attachment_kb: int = 0, in_reply_to: Optional[str] = None,
+                 date: Optional[datetime] = None) -> bytes:
+    msg = MIMEMultipart()
+    msg["From"] = formataddr(("", sender)) if "<" not in sender else sender
+    msg["To"] = recipient
+    msg["Subject"] = subject
+    msg["Date"] = format_datetime(date or datetime.now(timezone.utc))
+    msg["Message-ID"] = make_msgid(domain="stub.local")
+    if in_reply_to:
+        msg["In-Reply-To"] = in_reply_to
+        msg["References"] = in_reply_to
+    msg.attach(MIMEText(body, "plain"))
+    if attachment_kb:
+        part = MIMEApplication(random.randbytes(attachment_kb * 1024), Name="attachment.bin")
+        part["Content-Disposition"] = 'attachment; filename="attachment.bin"'
+        msg.attach(part)
+    return msg.as_bytes()
+
+
+class Mailbox:
+    def __init__(self, password: str):
+        self.password = password
+        self.messages: List[Dict[str, Any]] = []
+        self.uidnext = 1
+        self.idlers: List["ImapSession"] = []
+
+    def append(self, raw: bytes, flags=(), date: Optional[datetime] = None) -> int:
+        uid = self.uidnext
+        self.uidnext += 1
+        self.messages.append({
+            "uid": uid,
+            "raw": raw,
+            "flags": set(flags),
+            "date": date or datetime.now(timezone.utc),
+        })
+        return uid
+
+
+def _parse_set(spec: str, maximum: int) -> List[range]:
+    ranges = []
+    for part in spec.split(","):
+        lo, _, hi = part.partition(":")
+        lo_v = maximum if lo == "*" else int(lo)
+        hi_v = lo_v if not hi else (maximum if hi == "*" else int(hi))
+        if lo_v > hi_v:
+            lo_v, hi_v = hi_v, lo_v
+        ranges.append(range(lo_v, hi_v + 1))
+    return ranges
+
+
+def _tokens(text: str) -> List[str]:
+    out = []
+    for quoted, open_, close, atom in TOKEN_RE.findall(text):
+        if open_ or close:
+            out.append(open_ or close)
+        elif atom:
+            out.append(atom)
+        else:
+            out.append(quoted.replace('\\"', '"').replace("\\\\", "\\"))
+    return out
+
+
+class ImapSession:
+    def __init__(self, server: "ImapStubServer", reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.user: Optional[str] = None
+        self.mailbox: Optional[Mailbox] = None
+        self.readonly = False
+        self.idle_event: Optional[asyncio.Event] = None
+
+    async def write(self, data: bytes):
+        self.server.stats["bytes_out"] += len(data)
+        self.writer.write(data)
+        await self.writer.drain()
+
+    async def untagged(self, text: str):
+        await self.write(b"* " + text.encode() + CRLF)
+
+    async def tagged(self, tag: str, text: str):
+        if self.server.latency:
+            await asyncio.sleep(self.server.latency)
+        await self.write(f"{tag} {text}".encode() + CRLF)
+
+    async def run(self):
+        self.server.stats["connections"] += 1
+        try:
+            if self.server.latency:
+                await asyncio.sleep(self.server.latency)
+            await self.untagged("OK [CAPABILITY IMAP4rev1 IDLE UIDPLUS] IMAP stub ready")
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                self.server.stats["bytes_in"] += len(line)
+                text = line.decode(errors="replace").rstrip("\r\n")
+                if not text:
+                    continue
+                tag, _, rest = text.partition(" ")
+                command, _, args = rest.partition(" ")
+                self.server.stats["commands"] += 1
+                self.server.commands[command.upper()] += 1
+                if not await self.dispatch(tag, command.upper(), args):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if self.mailbox is not None and self in self.mailbox.idlers:
+                self.mailbox.idlers.remove(self)
+            try:
+                self.writer.close()
+            except Exception:
+                pass
+
+    async def dispatch(self, tag: str, command: str, args: str) -> bool:
+        if command == "CAPABILITY":
+            await self.untagged("CAPABILITY IMAP4rev1 IDLE UIDPLUS")
+            await self.tagged(tag, "OK CAPABILITY completed")
+        elif command == "NOOP":
+            await self.tagged(tag, "OK NOOP completed")
+        elif command == "LOGIN":
+            user, password = (_tokens(args) + ["", ""])[:2]
+            account = self.server.mailboxes.get(user.lower())
+            self.server.stats["logins"] += 1
+            if account is None or account.password != password:
+                self.server.stats["failed_logins"] += 1
+                await self.tagged(tag, "NO [AUTHENTICATIONFAILED] Invalid credentials (Failure)")
+            else:
+                self.user = user.lower()
+                await self.tagged(tag, "OK [CAPABILITY IMAP4rev1 IDLE UIDPLUS] LOGIN completed")
+        elif command == "LOGOUT":
+            await self.untagged("BYE logging out")
+            await self.tagged(tag, "OK LOGOUT completed")
+            return False
+        elif self.user is None:
+            await self.tagged(tag, "BAD not authenticated")
+        elif command in ("SELECT", "EXAMINE"):
+            self.mailbox = self.server.mailboxes[self.user]
+            self.readonly = command == "EXAMINE"
+            unseen = sum(1 for m in self.mailbox.messages if "\\Seen" not in m["flags"])
+            await self.untagged(f"{len(self.mailbox.messages)} EXISTS")
+            await self.untagged("0 RECENT")
+            await self.untagged("FLAGS (\\Answered \\Flagged \\Deleted \\Seen \\Draft)")
+            await self.untagged(f"OK [UIDVALIDITY {UIDVALIDITY}] UIDs valid")
+            await self.untagged(f"OK [UIDNEXT {self.mailbox.uidnext}] Predicted next UID")
+            await self.untagged(f"OK [UNSEEN {unseen}] unseen")
+            mode = "READ-ONLY" if self.readonly else "READ-WRITE"
+            await self.tagged(tag, f"OK [{mode}] {command} completed")
+        elif command in ("UNSELECT", "CLOSE"):
+            self.mailbox = None
+            await self.tagged(tag, f"OK {command} completed")
+        elif self.mailbox is None:
+            await self.tagged(tag, "BAD no mailbox selected")
+        elif command == "UID":
+            sub, _, sub_args = args.partition(" ")
+            await self.run_selected(tag, sub.upper(), sub_args, by_uid=True)
+        elif command in ("SEARCH", "FETCH", "STORE"):
+            await self.run_selected(tag, command, args, by_uid=False)
+        elif command == "IDLE":
+            await self.idle(tag)
+        else:
+            await self.tagged(tag, f"BAD unknown command {command}")
+        return True
+
+    async def run_selected(self, tag: str, command: str, args: str, by_uid: bool):
+        messages = self.mailbox.messages
+        if command == "SEARCH":
+            criteria = [t.upper() for t in _tokens(args)]
+            if criteria[:1] == ["CHARSET"]:
+                criteria = criteria[2:]
+            hits = []
+            for seq, m in enumerate(messages, start=1):
+                if "UNSEEN" in criteria and "\\Seen" in m["flags"]:
+                    continue
+                if "SEEN" in criteria and "\\Seen" not in m["flags"]:
+                    continue
+                hits.append(m["uid"] if by_uid else seq)
+            await self.untagged("SEARCH" + "".join(f" {h}" for h in hits))
+            await self.tagged(tag, "OK SEARCH completed")
+            return
+
+        spec, _, rest = args.partition(" ")
+        selected = self.select_messages(spec, by_uid)
+        if command == "FETCH":
+            for seq, m in selected:
+                await self.write_fetch(seq, m, rest, by_uid)
+            await self.tagged(tag, "OK FETCH completed")
+        elif command == "STORE":
+            action, _, flags = rest.partition(" ")
+            flag_set = {f for f in _tokens(flags) if f not in ("(", ")")}
+            for seq, m in selected:
+                if action.upper().startswith("+"):
+                    m["flags"] |= flag_set
+                elif action.upper().startswith("-"):
+                    m["flags"] -= flag_set
+                else:
+                    m["flags"] = set(flag_set)
+                if ".SILENT" not in action.upper():
+                    await self.untagged(f"{seq} FETCH (UID {m['uid']} FLAGS ({' '.join(sorted(m['flags']))}))")
+            await self.tagged(tag, "OK STORE completed")
+        else:
+            await self.tagged(tag, f"BAD unknown UID command {command}")
+
+    def select_messages(self, spec: str, by_uid: bool):
+        messages = self.mailbox.messages
+        if not messages:
+            return []
+        maximum = messages[-1]["uid"] if by_uid else len(messages)
+        ranges = _parse_set(spec, maximum)
+        selected = []
+        for seq, m in enumerate(messages, start=1):
+            key = m["uid"] if by_uid else seq
+            if any(key in r for r in ranges):
+                selected.append((seq, m))
+        return selected
+
+    async def write_fetch(self, seq: int, m: Dict[str, Any], items: str, by_uid: bool):
+        raw = m["raw"]
+        header, sep, text = raw.partition(b"\r\n\r\n")
+        if not sep:
+            header, sep, text = raw.partition(b"\n\n")
+        parts: List[bytes] = []
+        wants_uid = by_uid
+        for match in FETCH_ITEM_RE.finditer(items):
+            item = match.group(1).upper()
+            if item == "UID":
+                wants_uid = True
+            elif item == "FLAGS":
+                parts.append(f"FLAGS ({' '.join(sorted(m['flags']))})".encode())
+            elif item == "RFC822.SIZE":
+                parts.append(f"RFC822.SIZE {len(raw)}".encode())
+            elif item == "INTERNALDATE":
+                parts.append(f'INTERNALDATE "{m["date"].strftime("%d-%b-%Y %H:%M:%S %z")}"'.encode())
+            else:
+                section = (match.group(2) or "").upper()
+                if item == "RFC822.HEADER" or section == "HEADER" or section.startswith("HEADER.FIELDS"):
+                    data, name = header + sep, "BODY[HEADER]" if item.startswith("BODY") else "RFC822.HEADER"
+                elif section == "TEXT":
+                    data, name = text, "BODY[TEXT]"
+                else:
+                    data, name = raw, "BODY[]" if item.startswith("BODY") else "RFC822"
+                if match.group(3) is not None:
+                    start, length = int(match.group(3)), int(match.group(4))
+                    data = data[start:start + length]
+                    name += f"<{start}>"
+                parts.append(f"{name} {{{len(data)}}}".encode() + CRLF + data)
+                if item.startswith("BODY[") and not self.readonly:
+                    m["flags"].add("\\Seen")
+        if wants_uid:
+            parts.insert(0, f"UID {m['uid']}".encode())
+        await self.write(f"* {seq} FETCH (".encode() + b" ".join(parts) + b")" + CRLF)
+
+    async def idle(self, tag: str):
+        self.server.stats["idles"] += 1
+        self.idle_event = asyncio.Event()
+        self.mailbox.idlers.append(self)
+        await self.write(b"+ idling" + CRLF)
+        reader_task = asyncio.ensure_future(self.reader.readline())
+        try:
+            while True:
+                waiter = asyncio.ensure_future(self.idle_event.wait())
+                done, _ = await asyncio.wait({reader_task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+                if waiter in done:
+                    self.idle_event.clear()
+                    await self.untagged(f"{len(self.mailbox.messages)} EXISTS")
+                else:
+                    waiter.cancel()
+                if reader_task in done:
+                    line = reader_task.result()
+                    self.server.stats["bytes_in"] += len(line)
+                    break
+        finally:
+            if self in self.mailbox.idlers:
+                self.mailbox.idlers.remove(self)
+            self.idle_event = None
+        await self.tagged(tag, "OK IDLE terminated")
+
+
+class ImapStubServer:
+    """In-memory IMAP server; `latency` (seconds) is added before every greeting and tagged reply."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.mailboxes: Dict[str, Mailbox] = {}
+        self.stats: Counter = Counter()
+        self.commands: Counter = Counter()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.server: Optional[asyncio.base_events.Server] = None
+        self.sessions: set = set()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- mailbox setup ----
+    def add_account(self, address: str, password: str):
+        self.mailboxes[address.lower()] = Mailbox(password)
+
+    def seed(self, address: str, messages: int, attachment_kb: int = 0, seen_ratio: float = 0.0,
+             senders: Optional[List[str]] = None):
+        box = self.mailboxes[address.lower()]
+        start = datetime.now(timezone.utc) - timedelta(minutes=messages)
+        for i in range(messages):
+            sender = senders[i % len(senders)] if senders else f"sender{i}@example.com"
+            raw = make_message(sender, address, f"Message {i}", f"Hello, this is message {i}.",
+                               attachment_kb=attachment_kb, date=start + timedelta(minutes=i))
+            flags = {"\\Seen"} if random.random() < seen_ratio else set()
+            box.append(raw, flags, start + timedelta(minutes=i))
+
+    def deliver(self, address: str, raw: bytes) -> int:
+        """Append a message and wake any IDLE sessions on that mailbox. Thread-safe."""
+        if self._thread is not None and threading.current_thread() is not self._thread:
+            return asyncio.run_coroutine_threadsafe(self._deliver(address, raw), self.loop).result()
+        return self._deliver_now(address, raw)
+
+    async def _deliver(self, address: str, raw: bytes) -> int:
+        return self._deliver_now(address, raw)
+
+    def _deliver_now(self, address: str, raw: bytes) -> int:
+        box = self.mailboxes[address.lower()]
+        uid = box.append(raw)
+        for session in list(box.idlers):
+            if session.idle_event is not None:
+                session.idle_event.set()
+        return uid
+
+    def idling(self) -> int:
+        return sum(len(box.idlers) for box in self.mailboxes.values())
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(self.stats)
+
+    # ---- serving ----
+    async def _handle(self, reader, writer):
+        session = ImapSession(self, reader, writer)
+        self.sessions.add(session)
+        try:
+            await session.run()
+        finally:
+            self.sessions.discard(session)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        self.loop = asyncio.get_running_loop()
+        self._thread = threading.current_thread()
+        self.server = await asyncio.start_server(self._handle, host, port, limit=2 ** 20)
+        return self.server.sockets[0].getsockname()[:2]
+
+    def start_in_thread(self, host: str = "127.0.0.1", port: int = 0):
+        """Serve from a dedicated thread/loop so blocking clients in the caller cannot stall it."""
+        ready = threading.Event()
+        address = {}
+
+        def runner():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            address["value"] = loop.run_until_complete(self.start(host, port))
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=runner, name="imap-stub", daemon=True).start()
+        ready.wait()
+        return address["value"]
+
+    def stop(self):
+        if self.loop is None:
+            return
+        if self._thread is threading.current_thread():
+            self.server.close()
+        else:
+            self.loop.call_soon_threadsafe(self.server.close)
+            self.loop.call_soon_threadsafe(self.loop.stop)
@@ -0,0 +1,134 @@
+# bench/import_profile.py
+"""Cold-start import profile for the API (or any module in emailing/).
+
+Imports the module in fresh interpreters --runs times and reports the
+median wall time, then runs once more under `python -X importtime` and
+lists the slowest imports by cumulative and by self time. Also checks that
+the dependencies meant to load lazily (agents SDK, pyarrow, selenium,
+fake_useragent) were not pulled in by the import. Exits with status 1 when
+the median exceeds --budget-ms or a lazy dependency was imported, so it can
+gate a deploy script.
+
+Run from the emailing/ directory:
+
+    python -m bench.import_profile --runs 5 --top 15 --budget-ms 1000
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from typing import Any, Dict, List
+
+from bench.imap_bench import percentile
+
+LAZY_MODULES = ("agents", "openai", "pyarrow", "selenium", "fake_useragent")
+
+_CHILD = """
+import sys, time, json
+started = time.perf_counter()
+__import__({module!r})  # not importlib.import_module: -X importtime only sees the import statement path
+elapsed_ms = (time.perf_counter() - started) * 1000
+print(json.dumps({{"ms": elapsed_ms, "loaded": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def _child(module: str, lazy=LAZY_MODULES, *flags: str) -> subprocess.CompletedProcess:
+    code = _CHILD.format(module=module, lazy=tuple(lazy))
+    result = subprocess.run(
+        [sys.executable, *flags, "-c", code],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        raise SystemExit(f"importing {module} failed:\n" + "\n".join(errors[-5:]))
+    return result
+
+
+def _last_json(stdout: str) -> Dict[str, Any]:
+    # the module's own startup prints come first
+    return json.loads(stdout.strip().splitlines()[-1])
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """Rows of `import time: self | cumulative | name` (microseconds), skipping the header."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        rows.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_ms": int(parts[0]) / 1000,
+            "cumulative_ms": int(parts[1]) / 1000,
+        })
+    return rows
+
+
+def profile(args) -> Dict[str, Any]:
+    timings, loaded = [], set()
+    for _ in range(args.runs):
+        result = _last_json(_child(args.module, args.lazy).stdout)
+        timings.append(result["ms"])
+        loaded.update(result["loaded"])
+
+    rows = parse_importtime(_child(args.module, args.lazy, "-X", "importtime").stderr)
+    direct = [r for r in rows if r["depth"] == 1]
+    return {
+        "module": args.module,
+        "runs": args.runs,
+        "import_p50_ms": round(statistics.median(timings), 1),
+        "import_max_ms": round(max(timings), 1),
+        "import_p90_ms": round(percentile(timings, 90), 1),
+        "budget_ms": args.budget_ms,
+        "lazy_modules_loaded": sorted(loaded),
+        "slowest_direct_imports": [
+            {"module": r["module"], "cumulative_ms": round(r["cumulative_ms"], 1)}
+            for r in sorted(direct, key=lambda r: r["cumulative_ms"], reverse=True)[:args.top]
+        ],
+        "slowest_self": [
+            {"module": r["module"], "self_ms": round(r["self_ms"], 1)}
+            for r in sorted(rows, key=lambda r: r["self_ms"], reverse=True)[:args.top]
+        ],
+    }
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start import time of the API")
+    parser.add_argument("--module", default="main", help="module to import (from emailing/)")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to time")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=1000.0, help="fail when the median import is slower")
+    parser.add_argument("--lazy", type=lambda v: [m for m in v.split(",") if m], default=list(LAZY_MODULES),
+                        help="comma-separated modules the import must not load (default: %(default)s)")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    report = profile(args)
+    over_budget = report["import_p50_ms"] > args.budget_ms
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"import {report['module']}: p50 {report['import_p50_ms']} ms, p90 {report['import_p90_ms']} ms, "
+              f"max {report['import_max_ms']} ms over {report['runs']} runs (budget {args.budget_ms:.0f} ms)")
+        print("\nslowest direct imports (cumulative)")
+        for r in report["slowest_direct_imports"]:
+            print(f"  {r['cumulative_ms']:>8.1f} ms  {r['module']}")
+        print("\nslowest modules (self)")
+        for r in report["slowest_self"]:
+            print(f"  {r['self_ms']:>8.1f} ms  {r['module']}")
+        print()
+        if report["lazy_modules_loaded"]:
+            print(f"❌ imported eagerly but meant to load lazily: {', '.join(report['lazy_modules_loaded'])}")
+        print(f"{'❌ over' if over_budget else '✅ within'} the {args.budget_ms:.0f} ms budget")
+    return 1 if over_budget or report["lazy_modules_loaded"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
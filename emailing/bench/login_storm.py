@@ -0,0 +1,138 @@
+# bench/login_storm.py
+"""Latency of unrelated endpoints while the API is hit by a burst of logins.
+
+Runs the app in-process, fires --logins concurrent POST /login calls and,
+at the same time, probes a cheap authenticated endpoint (/leads/count) at a
+fixed rate. Reports probe p50/p99 and how the logins were answered (200 or
+429). --inline repeats the run with bcrypt executed on the event loop, the
+way /login used to work, for comparison.
+
+Run from the emailing/ directory:
+
+    python -m bench.login_storm --logins 200 --concurrency 100 --inline --mongomock
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+from typing import Dict, Any, List
+
+from bench.imap_bench import percentile, quiet, bind_db
+
+EMAIL = "storm@example.com"
+PASSWORD = "storm-password"
+
+
+async def storm(main, args, label: str) -> Dict[str, Any]:
+    import httpx
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        login = await client.post("/login", data={"username": EMAIL, "password": PASSWORD})
+        login.raise_for_status()
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        await client.get("/leads/count", headers=headers)  # warm the user cache
+
+        statuses: Dict[int, int] = {}
+        login_latencies: List[float] = []
+        gate = asyncio.Semaphore(args.concurrency)
+
+        async def one_login():
+            async with gate:
+                started = time.perf_counter()
+                r = await client.post("/login", data={"username": EMAIL, "password": PASSWORD})
+                login_latencies.append(time.perf_counter() - started)
+                statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+        probe_latencies: List[float] = []
+        done = asyncio.Event()
+
+        async def probe():
+            # latency counts from when the probe was due, so time the loop spent blocked
+            # before it could even start the request is included (no coordinated omission)
+            interval = args.probe_interval_ms / 1000
+            due = time.perf_counter()
+            while not done.is_set():
+                await asyncio.sleep(max(0.0, due - time.perf_counter()))
+                r = await client.get("/leads/count", headers=headers)
+                now = time.perf_counter()
+                probe_latencies.append(now - due)
+                r.raise_for_status()
+                due = max(due + interval, now - interval)
+
+        started = time.perf_counter()
+        with quiet(not args.verbose):
+            prober = asyncio.create_task(probe())
+            await asyncio.gather(*(one_login() for _ in range(args.logins)))
+            done.set()
+            await prober
+        elapsed = time.perf_counter() - started
+
+    return {
+        "name": label,
+        "logins": args.logins,
+        "login_statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "login_p50_ms": round(percentile(login_latencies, 50) * 1000, 1),
+        "probe_requests": len(probe_latencies),
+        "probe_p50_ms": round(percentile(probe_latencies, 50) * 1000, 1),
+        "probe_p99_ms": round(percentile(probe_latencies, 99) * 1000, 1),
+        "probe_max_ms": round(max(probe_latencies) * 1000, 1) if probe_latencies else 0.0,
+        "elapsed_s": round(elapsed, 2),
+    }
+
+
+async def run(args):
+    with quiet(not args.verbose):
+        import main
+        import password_hashing
+
+    if args.mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+        db = AsyncMongoMockClient()["login_storm"]
+        bind_db(main, db)
+    else:
+        db = main.db.client["login_storm"]
+        bind_db(main, db)
+        await db.client.drop_database(db.name)
+
+    try:
+        with quiet(not args.verbose):
+            await db["users"].insert_one({"email": EMAIL, "password": main.pwd_context.hash(PASSWORD)})
+        results = [await storm(main, args, f"off-loop hashing ({password_hashing.HASH_WORKERS} workers, "
+                                           f"queue {password_hashing.HASH_QUEUE_MAX})")]
+        if args.inline:
+            async def inline(fn, *fn_args):
+                return fn(*fn_args)
+            password_hashing.run = inline
+            main.user_cache.cache.clear()
+            results.append(await storm(main, args, "inline hashing (previous behaviour)"))
+    finally:
+        if not args.mongomock:
+            await db.client.drop_database(db.name)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        print(r["name"])
+        for key, value in r.items():
+            if key != "name":
+                print(f"  {key:<16} {value}")
+        print()
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Probe endpoint latency during a burst of logins")
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50, help="logins in flight at once")
+    parser.add_argument("--probe-interval-ms", type=float, default=5.0)
+    parser.add_argument("--inline", action="store_true", help="also measure with bcrypt on the event loop")
+    parser.add_argument("--mongomock", action="store_true", help="use an in-memory MongoDB (mongomock-motor)")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="show the API's own logging")
+    args = parser.parse_args(argv)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,169 @@
+# bounces.py
+"""Bounce (DSN) and auto-reply detection for synced inbox messages.
+
+`classify_message` looks at a parsed message and tells whether it is a
+delivery failure or an out-of-office style auto reply, and for bounces which
+recipients failed. `apply_feedback` turns a batch of those results into bulk
+updates on `leads`, so dead addresses stop being picked for campaigns.
+Addresses come out lowercased; the updates match leads case-insensitively
+(the `leads_user_email_ci` index), since stored leads keep their own case.
+"""
+import re
+from datetime import datetime
+from typing import List, Optional, Any, Dict
+from email.message import Message
+from pymongo import UpdateMany
+
+from lead_import import CASE_INSENSITIVE
+
+# lead.email_status values that campaign builders must skip
+EMAIL_STATUS_BOUNCED = "bounced"
+EMAIL_STATUS_INVALID = "invalid_email"
+UNDELIVERABLE_STATUSES = [EMAIL_STATUS_BOUNCED, EMAIL_STATUS_INVALID]
+
+BOUNCE_SENDER_RE = re.compile(r"^(mailer-daemon|postmaster|mail-daemon|mailerdaemon)@", re.I)
+BOUNCE_SUBJECT_RE = re.compile(
+    r"(delivery status notification|undeliverable|undelivered mail|mail delivery (failed|failure|subsystem)"
+    r"|returned mail|delivery (has )?failed|failure notice|could not be delivered)",
+    re.I,
+)
+AUTO_REPLY_SUBJECT_RE = re.compile(
+    r"^(auto(matic)?[ -]?(reply|response)|out of (the )?office|autoreply|auto:|abwesend|absence|on vacation|away from)",
+    re.I,
+)
+STATUS_RE = re.compile(r"\b([245])\.(\d{1,3})\.(\d{1,3})\b")
+EMAIL_IN_TEXT_RE = re.compile(r"[\w\.\+-]+@[\w\.-]+\.\w+")
+
+
+def _addr(value: str) -> str:
+    # Final-Recipient / Original-Recipient look like "rfc822; someone@example.com"
+    value = (value or "").split(";", 1)[-1]
+    return value.strip().strip("<>").lower()
+
+
+def _delivery_status_blocks(msg: Message) -> List[Message]:
+    for part in msg.walk():
+        if part.get_content_type() == "message/delivery-status":
+            payload = part.get_payload()
+            if isinstance(payload, list):
+                return payload
+    return []
+
+
+def _text_body(msg: Message, limit: int = 20000) -> str:
+    chunks = []
+    for part in msg.walk():
+        if part.get_content_maintype() != "text":
+            continue
+        try:
+            payload = part.get_payload(decode=True) or b""
+            chunks.append(payload.decode(part.get_content_charset() or "utf-8", errors="replace"))
+        except Exception:
+            continue
+        if sum(len(c) for c in chunks) >= limit:
+            break
+    return "\n".join(chunks)[:limit]
+
+
+def _lead_status(status: Optional[str]) -> str:
+    # 5.1.x is a bad mailbox or domain; anything else permanent is a generic bounce
+    if status and status.startswith("5.1."):
+        return EMAIL_STATUS_INVALID
+    return EMAIL_STATUS_BOUNCED
+
+
+def classify_message(msg: Message, from_email: str, subject: str, account_email: str = "") -> Optional[Dict[str, Any]]:
+    """Return {"kind": "bounce"|"auto_reply", ...} for feedback messages, None for ordinary mail."""
+    subject = subject or ""
+    own = (account_email or "").lower()
+
+    if msg.get_content_type() == "multipart/report" or _delivery_status_blocks(msg):
+        failures = []
+        for block in _delivery_status_blocks(msg):
+            recipient = _addr(block.get("Final-Recipient") or block.get("Original-Recipient") or "")
+            action = (block.get("Action") or "").strip().lower()
+            status = (block.get("Status") or "").strip()
+            if not recipient or action not in ("failed", ""):
+                continue
+            if status and not status.startswith("5."):
+                continue  # transient failures are retried by the remote server
+            failures.append({
+                "email": recipient,
+                "status": status or None,
+                "diagnostic": (block.get("Diagnostic-Code") or "").strip()[:500] or None,
+            })
+        if failures:
+            return {"kind": "bounce", "failures": failures}
+
+    daemon = bool(BOUNCE_SENDER_RE.match(from_email or ""))
+    if daemon or BOUNCE_SUBJECT_RE.search(subject):
+        body = _text_body(msg)
+        status_match = STATUS_RE.search(body)
+        status = status_match.group(0) if status_match else None
+        permanent = bool(status and status.startswith("5."))
+        if daemon and status and not permanent:
+            return None  # transient failures are retried by the remote server
+        # a bounce-like subject alone is not enough: people reply to "returned mail"
+        # threads and quote other addresses
+        if daemon or permanent:
+            recipients = []
+            for header in msg.get_all("X-Failed-Recipients") or []:
+                recipients.extend(_addr(r) for r in header.split(","))
+            if not recipients:
+                recipients = [
+                    e.lower() for e in EMAIL_IN_TEXT_RE.findall(body)
+                    if e.lower() != own and not BOUNCE_SENDER_RE.match(e)
+                ][:1]
+            if recipients:
+                return {
+                    "kind": "bounce",
+                    "failures": [{"email": r, "status": status, "diagnostic": None} for r in recipients if r],
+                }
+            return None
+
+    auto_submitted = (msg.get("Auto-Submitted") or "").lower()
+    if (
+        auto_submitted.startswith("auto-replied")
+        or msg.get("X-Autoreply") or msg.get("X-Autorespond")
+        or (msg.get("Precedence") or "").lower() == "auto_reply"
+        or AUTO_REPLY_SUBJECT_RE.search(subject)
+    ):
+        return {"kind": "auto_reply", "email": (from_email or "").lower()}
+
+    return None
+
+
+async def apply_feedback(db, user_id: str, results: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Bulk-update the user's leads from classify_message results."""
+    now = datetime.utcnow()
+    by_status: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    auto_replies = set()
+    for r in results:
+        if r["kind"] == "bounce":
+            for failure in r["failures"]:
+                by_status.setdefault(_lead_status(failure["status"]), {})[failure["email"]] = failure
+        elif r["kind"] == "auto_reply" and r.get("email"):
+            auto_replies.add(r["email"])
+
+    ops = []
+    for lead_status, failures in by_status.items():
+        for address, failure in failures.items():
+            ops.append(UpdateMany(
+                {"user_id": user_id, "email": address},
+                {"$set": {
+                    "email_status": lead_status,
+                    "bounce": {"status": failure["status"], "diagnostic": failure["diagnostic"], "at": now},
+                }},
+                collation=CASE_INSENSITIVE,
+            ))
+    if auto_replies:
+        ops.append(UpdateMany(
+            {"user_id": user_id, "email": {"$in": list(auto_replies)}},
+            {"$set": {"last_auto_reply_at": now}},
+            collation=CASE_INSENSITIVE,
+        ))
+    if not ops:
+        return {"bounced": 0, "auto_replies": 0}
+
+    await db["leads"].bulk_write(ops, ordered=False)
+    return {"bounced": sum(len(f) for f in by_status.values()), "auto_replies": len(auto_replies)}
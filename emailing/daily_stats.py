@@ -0,0 +1,148 @@
+# daily_stats.py
+"""Per-user, per-day rollups behind the /analytics endpoints.
+
+One `daily_stats` document per (user_id, day) carries the leads created and
+the emails sent/failed that UTC day. The API `$inc`s them as leads are
+inserted and campaigns are logged, so an N-day chart reads at most N small
+documents instead of grouping raw leads and mail_logs on every request.
+
+History written before the rollups existed (or by scripts that bypass the
+API) is rebuilt with the backfill command:
+
+    python daily_stats.py                 # every user
+    python daily_stats.py --user <id>     # one user
+"""
+import os
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from typing import Optional, Any, Dict, Iterable, List
+from dotenv import load_dotenv
+import motor.motor_asyncio
+
+import http_cache
+
+load_dotenv()
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+MONGODB_DB = os.getenv("MONGODB_DB", "email_agent_db")
+
+DAY_FORMAT = "%Y-%m-%d"
+STAT_FIELDS = ("leads", "emails_sent", "emails_failed", "campaigns")
+
+
+def day_key(when: Optional[datetime] = None) -> str:
+    return (when or datetime.utcnow()).strftime(DAY_FORMAT)
+
+
+async def record(col, user_id: str, day: str, inc: Dict[str, int]):
+    inc = {k: v for k, v in inc.items() if v}
+    if not inc:
+        return
+    await col.update_one(
+        {"user_id": user_id, "day": day},
+        {"$inc": inc, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+    await http_cache.bump(http_cache.sibling(col), user_id, "analytics")
+
+
+async def record_leads(col, leads: Iterable[Dict[str, Any]]):
+    """Count newly inserted leads on the day they were created."""
+    per_day: Dict[tuple, int] = {}
+    for lead in leads:
+        key = (lead["user_id"], day_key(lead.get("created_at")))
+        per_day[key] = per_day.get(key, 0) + 1
+    for (user_id, day), count in per_day.items():
+        await record(col, user_id, day, {"leads": count})
+
+
+async def record_campaign(col, user_id: str, sent: int, failed: int, when: Optional[datetime] = None):
+    await record(col, user_id, day_key(when), {"emails_sent": sent, "emails_failed": failed, "campaigns": 1})
+
+
+async def read_days(col, user_id: str, start: datetime, end: datetime) -> Dict[str, Dict[str, int]]:
+    """Rollups for the UTC days covering [start, end], keyed by day."""
+    cursor = col.find(
+        {"user_id": user_id, "day": {"$gte": day_key(start), "$lte": day_key(end)}},
+        {"_id": 0, "day": 1, **{f: 1 for f in STAT_FIELDS}}
+    )
+    return {doc["day"]: doc async for doc in cursor}
+
+
+async def totals(col, user_id: str) -> Dict[str, int]:
+    """All-time sums over the user's rollups (one small document per active day)."""
+    group = {f: {"$sum": f"${f}"} for f in STAT_FIELDS}
+    rows = await col.aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$group": {"_id": None, **group}},
+    ]).to_list(None)
+    row = rows[0] if rows else {}
+    return {f: row.get(f, 0) for f in STAT_FIELDS}
+
+
+async def backfill(db, user_id: Optional[str] = None) -> int:
+    """Rebuild rollups from the raw leads and mail_logs. Returns the number of day documents written."""
+    match: Dict[str, Any] = {"created_at": {"$type": "date"}}
+    if user_id:
+        match["user_id"] = user_id
+    by_day = {"user_id": "$user_id", "day": {"$dateToString": {"format": DAY_FORMAT, "date": "$created_at"}}}
+    rollups: Dict[tuple, Dict[str, int]] = {}
+
+    async for row in db["leads"].aggregate([
+        {"$match": match},
+        {"$group": {"_id": by_day, "leads": {"$sum": 1}}},
+    ]):
+        rollups.setdefault((row["_id"]["user_id"], row["_id"]["day"]), {})["leads"] = row["leads"]
+
+    async for row in db["mail_logs"].aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": by_day,
+            "emails_sent": {"$sum": {"$ifNull": ["$sent_count", 0]}},
+            # older logs only carry the list of failures, newer ones just the count
+            "emails_failed": {"$sum": {"$ifNull": ["$failed_count", {"$size": {"$ifNull": ["$failed", []]}}]}},
+            "campaigns": {"$sum": 1},
+        }},
+    ]):
+        stats = rollups.setdefault((row["_id"]["user_id"], row["_id"]["day"]), {})
+        stats.update({f: row[f] for f in ("emails_sent", "emails_failed", "campaigns")})
+
+    col = db["daily_stats"]
+    await col.delete_many({"user_id": user_id} if user_id else {})
+    now = datetime.utcnow()
+    docs = [
+        {"user_id": uid, "day": day, **{f: stats.get(f, 0) for f in STAT_FIELDS}, "updated_at": now}
+        for (uid, day), stats in rollups.items() if uid
+    ]
+    if docs:
+        await col.insert_many(docs)
+    if user_id:
+        await http_cache.bump(http_cache.sibling(col), user_id, "analytics")
+    else:
+        await http_cache.bump_all(http_cache.sibling(col), "analytics")
+    return len(docs)
+
+
+def day_range(start: datetime, end: datetime) -> List[str]:
+    days, current = [], start
+    while current.date() <= end.date():
+        days.append(day_key(current))
+        current += timedelta(days=1)
+    return days
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Rebuild the daily_stats rollups from leads and mail_logs")
+    parser.add_argument("--user", help="only rebuild this user id")
+    args = parser.parse_args()
+    client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URI)
+    try:
+        written = await backfill(client[MONGODB_DB], args.user)
+        print(f"📊 Backfilled {written} daily_stats documents")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
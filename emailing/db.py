@@ -0,0 +1,33 @@
+# db.py
+"""Motor client and collection handles shared by the API and the workers.
+
+Imported by main.py and by the worker entry points (worker.py), so a
+worker gets its collections without pulling in FastAPI. The client does
+not connect until the first operation.
+"""
+import os
+from dotenv import load_dotenv
+import motor.motor_asyncio
+
+import http_cache
+import send_events
+
+load_dotenv()
+
+MONGODB_URI = os.getenv("MONGODB_URI")
+MONGODB_DB = os.getenv("MONGODB_DB", "email_agent_db")
+
+client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URI)
+db = client[MONGODB_DB]
+templates_col = db["templates"]
+leads_col = db["leads"]
+email_accounts_col = db["email_accounts"]
+mail_logs_col = db["mail_logs"]
+lead_counters_col = db["lead_counters"]
+daily_stats_col = db["daily_stats"]
+send_events_col = db[send_events.COLLECTION]
+rephrase_cache_col = db["rephrase_cache"]
+users_collection = db["users"]
+jobs_col = db["jobs"]
+job_events_col = db["job_events"]
+cache_versions_col = db[http_cache.COLLECTION]
@@ -0,0 +1,65 @@
+# events.py
+"""In-process publish/subscribe for pushing live updates to the browser.
+
+Background tasks (scrapes, campaigns, lead writes) publish small events for
+a user; every open `GET /events` stream of that user gets them over SSE.
+Nothing is stored: a tab that is not connected simply misses the event and
+re-reads the current state when it reconnects. Events only reach streams
+served by the same process as the publisher; worker processes forward
+theirs through the job event relay (jobs.py) instead.
+"""
+import json
+import asyncio
+from typing import Any, Callable, Dict, Set, Optional
+
+QUEUE_SIZE = 256
+
+
+class EventBus:
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._forward: Optional[Callable[[str, str, Dict[str, Any]], None]] = None
+
+    def forward_to(self, sink: Callable[[str, str, Dict[str, Any]], None]):
+        """Also hand every event to `sink` (on the loop). Used by workers, which serve no streams."""
+        self._loop = asyncio.get_running_loop()
+        self._forward = sink
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        self._loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def has_subscribers(self, user_id: str) -> bool:
+        return self._forward is not None or bool(self._subscribers.get(user_id))
+
+    def publish(self, user_id: str, event: str, data: Dict[str, Any]):
+        """Deliver to every stream of `user_id`. Call on the event loop; never blocks."""
+        for queue in list(self._subscribers.get(user_id, ())):
+            if queue.full():
+                # a stalled client loses its oldest update rather than slowing the publisher
+                queue.get_nowait()
+            queue.put_nowait((event, data))
+        if self._forward is not None:
+            self._forward(user_id, event, data)
+
+    def publish_threadsafe(self, user_id: str, event: str, data: Dict[str, Any]):
+        """Same as publish, from a worker thread (e.g. the SMTP sender)."""
+        if self._loop is not None and self.has_subscribers(user_id):
+            self._loop.call_soon_threadsafe(self.publish, user_id, event, data)
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+bus = EventBus()
@@ -0,0 +1,169 @@
+# executors.py
+"""Named thread pools, one per class of blocking work.
+
+Everything that cannot run on the event loop goes to the pool for its kind
+of work instead of asyncio's shared default executor, so hours-long SMTP
+campaigns cannot starve IMAP checks, scrapes or password hashing:
+
+    smtp     campaign send loops (one thread per running campaign)
+    imap     blocking IMAP checks (imap_tools), one thread per account checked;
+             a user with more accounts than workers has the rest wait for a
+             thread within IMAP_CHECK_TIMEOUT, so size it for the largest user
+    scrape   Selenium/requests scrapers
+    hashing  bcrypt
+    cpu      parsing, encoding and short local reads (email parsing, parquet
+             row groups, upload chunks)
+
+Sizes come from EXECUTOR_<NAME>_WORKERS and EXECUTOR_<NAME>_QUEUE_MAX
+(0 = unbounded queue; beyond the bound `run` raises PoolSaturated instead of
+queueing). Each pool counts busy threads, queued calls, wait and run time;
+`stats()` reports them and calls that waited longer than
+EXECUTOR_WAIT_WARN_MS for a thread are logged.
+"""
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+CPU_COUNT = os.cpu_count() or 1
+WAIT_WARN_MS = float(os.getenv("EXECUTOR_WAIT_WARN_MS", 1000))
+
+# name -> (default workers, default queue bound)
+DEFAULTS: Dict[str, tuple] = {
+    "smtp": (16, 0),
+    "imap": (16, 0),
+    "scrape": (2, 0),
+    # the older HASH_* settings still apply to the hashing pool
+    "hashing": (int(os.getenv("HASH_WORKERS", min(4, CPU_COUNT))), int(os.getenv("HASH_QUEUE_MAX", 32))),
+    "cpu": (CPU_COUNT, 0),
+}
+
+
+class PoolSaturated(Exception):
+    pass
+
+
+class Pool:
+    def __init__(self, name: str, workers: int, queue_max: int = 0):
+        self.name = name
+        self.workers = max(1, workers)
+        self.queue_max = max(0, queue_max)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{name}-pool")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.busy = 0
+        self.peak_queued = 0
+        self.peak_busy = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """Run `fn(*args)` on this pool, or raise PoolSaturated if the queue is full."""
+        with self._lock:
+            if self.queue_max and self.queued >= self.queue_max:
+                self.rejected += 1
+                raise PoolSaturated(f"{self.name} pool: {self.busy} running, {self.queued} queued")
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+        submitted = time.perf_counter()
+        state = {"started": False}
+
+        def call():
+            started = time.perf_counter()
+            with self._lock:
+                state["started"] = True
+                self.queued -= 1
+                self.busy += 1
+                self.peak_busy = max(self.peak_busy, self.busy)
+                self.wait_seconds += started - submitted
+            waited_ms = (started - submitted) * 1000
+            if waited_ms > WAIT_WARN_MS:
+                print(f"⏳ {self.name} pool: call waited {waited_ms:.0f} ms for a thread ({self.workers} workers)")
+            ok = False
+            try:
+                result = fn(*args)
+                ok = True
+                return result
+            finally:
+                with self._lock:
+                    self.busy -= 1
+                    self.run_seconds += time.perf_counter() - started
+                    if ok:
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+
+        def dequeue_unstarted(_future=None):
+            # cancelled while still queued (caller cancelled, or shutdown(cancel_futures=True)):
+            # `call` never ran, so it is not there to take the call off the queue count
+            with self._lock:
+                if not state["started"]:
+                    state["started"] = True
+                    self.queued -= 1
+                    self.cancelled += 1
+
+        try:
+            future = self._executor.submit(call)
+        except RuntimeError:  # pool already shut down
+            dequeue_unstarted()
+            raise
+        future.add_done_callback(dequeue_unstarted)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            done = self.completed + self.failed
+            return {
+                "workers": self.workers,
+                "queue_max": self.queue_max,
+                "busy": self.busy,
+                "queued": self.queued,
+                "saturation": round(self.busy / self.workers, 2),
+                "peak_busy": self.peak_busy,
+                "peak_queued": self.peak_queued,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "cancelled": self.cancelled,
+                "avg_wait_ms": round(self.wait_seconds / done * 1000, 1) if done else 0.0,
+                "avg_run_ms": round(self.run_seconds / done * 1000, 1) if done else 0.0,
+            }
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def _configured(name: str) -> Pool:
+    workers, queue_max = DEFAULTS[name]
+    key = name.upper()
+    return Pool(
+        name,
+        int(os.getenv(f"EXECUTOR_{key}_WORKERS", workers)),
+        int(os.getenv(f"EXECUTOR_{key}_QUEUE_MAX", queue_max)),
+    )
+
+
+pools: Dict[str, Pool] = {name: _configured(name) for name in DEFAULTS}
+
+
+def pool(name: str) -> Pool:
+    return pools[name]
+
+
+async def run(name: str, fn: Callable[..., Any], *args) -> Any:
+    return await pools[name].run(fn, *args)
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    return {name: p.stats() for name, p in pools.items()}
+
+
+def shutdown(wait: bool = False):
+    for p in pools.values():
+        p.shutdown(wait=wait)
@@ -41,14 +41,25 @@ def human_like_scroll(driver):
         driver.execute_script(f"window.scrollBy(0, {random.randint(100, 300)});")
         time.sleep(random.uniform(0.5, 1.5))
 
-try:
-    from fake_useragent import UserAgent
-    ua = UserAgent()
-    print("fake_useragent library loaded")
-except ImportError:
-    print(" fake_useragent not installed. Using static user agents.")
-    print(" Install with: pip install fake-useragent")
-    ua = None
+# fake_useragent reads its data file when instantiated, so it is loaded on first use
+_ua = None
+_ua_loaded = False
+_ua_lock = threading.Lock()
+
+def get_user_agents():
+    """The shared fake_useragent.UserAgent, created on first call; None if the package is missing."""
+    global _ua, _ua_loaded
+    with _ua_lock:
+        if not _ua_loaded:
+            try:
+                from fake_useragent import UserAgent
+                _ua = UserAgent()
+                print("fake_useragent library loaded")
+            except ImportError:
+                print(" fake_useragent not installed. Using static user agents.")
+                print(" Install with: pip install fake-useragent")
+            _ua_loaded = True
+    return _ua
 
 def click_next_page(driver):
     """Click the next page button in Google Search results"""
@@ -111,6 +122,7 @@ class HeaderManager:
     
     def get_random_user_agent(self):
         """Get a random user agent"""
+        ua = get_user_agents()
         if ua:
             try:
                 return ua.random
@@ -121,6 +133,7 @@ class HeaderManager:
     
     def get_chrome_user_agent(self):
         """Get a Chrome-specific user agent"""
+        ua = get_user_agents()
         if ua:
             try:
                 return ua.chrome
@@ -342,7 +355,14 @@ class ProxyManager:
             except:
                 pass
 
-proxy_manager = ProxyManager(SCRAPER_API_KEY)
+_proxy_manager = None
+
+def get_proxy_manager() -> ProxyManager:
+    """The shared ProxyManager, created on the first scrape rather than at import."""
+    global _proxy_manager
+    if _proxy_manager is None:
+        _proxy_manager = ProxyManager(SCRAPER_API_KEY)
+    return _proxy_manager
 
 def clean_email_raw(e: str) -> str:
     e = e.strip().strip('.,;:"\'<>[]{} ')
@@ -1346,7 +1366,7 @@ def scrape_google_maps(query, max_businesses):
                 try:
                     print(f"\n{'='*50}")
                     print(f" Processing business {total_processed+1} of {max_businesses}")
-                    print(f" Current Proxy: {proxy_manager.current_proxy}")
+                    print(f" Current Proxy: {get_proxy_manager().current_proxy}")
                     
                     try:
                         # Get fresh listing reference
@@ -1542,13 +1562,13 @@ def scrape_google_maps(query, max_businesses):
     finally:
         print("\nClosing driver and cleaning up...")
         driver.quit()
-        proxy_manager.cleanup()
+        get_proxy_manager().cleanup()
         
         print("\n" + "=" * 60)
         print("SCRAPING COMPLETE")
         print("=" * 60)
         print(f" Scraping complete! Collected {len(results)} businesses.")
-        print(f" Connection method used: {proxy_manager.current_proxy}")
+        print(f" Connection method used: {get_proxy_manager().current_proxy}")
         print("=" * 60)
     
     return results
\ No newline at end of file
@@ -0,0 +1,99 @@
+# http_cache.py
+"""Per-user version counters behind the ETags of the rarely-changing reads.
+
+One `cache_versions` document per user (`_id` = user id) holds a counter
+per scope: `templates`, `email_accounts` and `analytics`. Every write that
+changes what a scope's GET endpoints return bumps the counter (the template
+and account endpoints in main.py; lead_counters, daily_stats and
+account_health for the rest), and those endpoints use an ETag derived from
+it. A repeat load sending If-None-Match gets `304 Not Modified` without the
+collection read or the serialisation.
+
+Versions are cached in-process for HTTP_CACHE_VERSION_TTL_SECONDS. A bump
+made by this process invalidates its entry straight away. Other processes
+(API replicas, workers) see it once their entry expires, so the TTL bounds
+how long they can answer 304 for a stale copy.
+
+The account listing also changes with time alone, when a quarantine runs
+out. Each quarantine's retry_at is therefore kept in `<scope>_recheck`, and
+the ETag counts the ones already in the past.
+"""
+import os
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, Optional, Sequence, Union
+
+from ttl_cache import TTLCache
+
+HTTP_CACHE_VERSION_TTL_SECONDS = float(os.getenv("HTTP_CACHE_VERSION_TTL_SECONDS", 5))
+HTTP_CACHE_MAX_AGE_SECONDS = int(os.getenv("HTTP_CACHE_MAX_AGE_SECONDS", 0))  # 0: browsers revalidate every time
+HTTP_CACHE_MAX_SIZE = int(os.getenv("HTTP_CACHE_MAX_SIZE", 10000))
+
+COLLECTION = "cache_versions"
+SCOPES = ("templates", "email_accounts", "analytics")
+RECHECK_MAX = 20  # newest retry times kept per scope; dropping one also bumps the version
+
+cache = TTLCache(HTTP_CACHE_VERSION_TTL_SECONDS, HTTP_CACHE_MAX_SIZE)
+
+
+def sibling(col):
+    """The cache_versions collection of the database `col` lives in."""
+    return col.database[COLLECTION]
+
+
+async def bump(col, user_id: str, *scopes: str, recheck_at: Optional[datetime] = None):
+    """Invalidate every ETag of `scopes` for the user. Call after the write, never before."""
+    update: Dict[str, Any] = {"$inc": {scope: 1 for scope in scopes}, "$set": {"updated_at": datetime.utcnow()}}
+    if recheck_at is not None:
+        update["$push"] = {
+            f"{scope}_recheck": {"$each": [recheck_at], "$sort": 1, "$slice": -RECHECK_MAX} for scope in scopes
+        }
+    await col.update_one({"_id": user_id}, update, upsert=True)
+    cache.invalidate(user_id)
+
+
+async def bump_all(col, *scopes: str):
+    """Bump `scopes` for every user (maintenance jobs that rewrite data for all of them)."""
+    await col.update_many({}, {"$inc": {scope: 1 for scope in scopes}, "$set": {"updated_at": datetime.utcnow()}})
+    cache.clear()
+
+
+async def versions(col, user_id: str) -> Dict[str, Any]:
+    doc = cache.get(user_id)
+    if doc is None:
+        doc = await col.find_one({"_id": user_id}) or {}
+        cache.put(user_id, doc)
+    return doc
+
+
+def etag(user_id: str, scopes: Union[str, Sequence[str]], doc: Dict[str, Any], *parts: Any) -> str:
+    """Weak ETag over one or more scopes: the body is the same, but gzip may change the bytes."""
+    now = datetime.utcnow()
+    fields = [user_id]
+    for scope in ([scopes] if isinstance(scopes, str) else scopes):
+        passed = sum(1 for at in doc.get(f"{scope}_recheck", []) if at <= now)
+        fields += [scope, doc.get(scope, 0), passed]
+    raw = ":".join(str(p) for p in (*fields, *parts))
+    return f'W/"{hashlib.sha1(raw.encode()).hexdigest()[:20]}"'
+
+
+def matches(if_none_match: Optional[str], tag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = tag[2:] if tag.startswith("W/") else tag
+    return any(
+        (candidate[2:] if candidate.startswith("W/") else candidate) == bare
+        for candidate in (c.strip() for c in if_none_match.split(","))
+    )
+
+
+def headers(tag: str) -> Dict[str, str]:
+    cache_control = f"private, max-age={HTTP_CACHE_MAX_AGE_SECONDS}" if HTTP_CACHE_MAX_AGE_SECONDS > 0 else "private, no-cache"
+    # the same URL returns each user's own data
+    return {"ETag": tag, "Cache-Control": cache_control, "Vary": "Authorization"}
+
+
+def stats() -> Dict[str, Any]:
+    return cache.stats()
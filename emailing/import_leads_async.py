@@ -1,49 +1,62 @@
 # import_leads_async.py
+"""Import a CSV or NDJSON file of leads for one user from the command line.
+
+    python import_leads_async.py leads.csv --user someone@example.com
+
+Uses the same streaming parser and deduplicating upserts as POST /leads/import.
+"""
 import os
-import csv
-import re
+import json
 import asyncio
-from datetime import datetime
+import argparse
+from bson import ObjectId
 from dotenv import load_dotenv
 import motor.motor_asyncio
 
+import daily_stats
+import lead_counters
+import lead_import
+
 load_dotenv()
 
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
 MONGODB_DB = os.getenv("MONGODB_DB", "email_agent_db")
 CSV_FILE = "abcd.csv"   # expected columns: company_name,contact_number,email,owner_name
 
-EMAIL_REGEX = r'^[\w\.-]+@[\w\.-]+\.\w+$'
-def is_valid_email(e: str) -> bool:
-    return re.match(EMAIL_REGEX, e or "") is not None
+
+async def find_user_id(db, user: str) -> str:
+    query = {"_id": ObjectId(user)} if ObjectId.is_valid(user) else {"email": user}
+    doc = await db["users"].find_one(query, {"_id": 1})
+    if not doc:
+        raise SystemExit(f"No user matching {user!r}")
+    return str(doc["_id"])
+
 
 async def main():
+    parser = argparse.ArgumentParser(description="Import leads from a CSV or NDJSON file")
+    parser.add_argument("file", nargs="?", default=CSV_FILE)
+    parser.add_argument("--user", required=True, help="email or id of the user who owns the leads")
+    parser.add_argument("--source", default="file_import")
+    parser.add_argument("--batch", type=int, default=lead_import.BATCH_SIZE)
+    args = parser.parse_args()
+
     client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URI)
     db = client[MONGODB_DB]
-    leads_col = db["leads"]
-
-    to_insert = []
-    with open(CSV_FILE, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            email = (row.get("email") or "").strip()
-            doc = {
-                "company_name": (row.get("company_name") or "").strip(),
-                "contact_number": (row.get("contact_number") or "").strip(),
-                "email": email if is_valid_email(email) else None,
-                "owner_name": (row.get("owner_name") or "").strip(),
-                "mail_sent": False,
-                "created_at": datetime.utcnow()
-            }
-            to_insert.append(doc)
-
-    if not to_insert:
-        print("No rows found to insert.")
-        return
-
-    result = await leads_col.insert_many(to_insert)
-    print(f"Inserted {len(result.inserted_ids)} leads.")
-    await client.close()
+    try:
+        user_id = await find_user_id(db, args.user)
+
+        async def on_inserted(leads):
+            await lead_counters.record_inserted(db["lead_counters"], leads)
+            await daily_stats.record_leads(db["daily_stats"], leads)
+
+        async for progress in lead_import.import_leads(
+            db["leads"], user_id, lead_import.file_chunks(args.file),
+            fmt=lead_import.detect_format(args.file, None), source=args.source,
+            batch_size=max(1, args.batch), on_inserted=on_inserted
+        ):
+            print(json.dumps(progress))
+    finally:
+        client.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,77 @@
+# inbox_search.py
+"""Search over the `inbox_messages` the reply watcher syncs.
+
+Messages are indexed locally (a Mongo text index prefixed by `user_id`), so
+finding a reply never needs an IMAP round trip. `build_search_query` turns
+the endpoint's filters into a query that always starts with the user id and
+either a `$text` match or an indexed sender/date range.
+"""
+import re
+from datetime import datetime
+from typing import Optional, Any, Dict, List, Tuple
+from pymongo import ASCENDING, DESCENDING, TEXT
+
+TEXT_INDEX_NAME = "inbox_text"
+
+SEARCH_INDEXES = [
+    # equality prefix keeps every $text search scoped to one user's messages
+    ([("user_id", ASCENDING), ("subject", TEXT), ("snippet", TEXT), ("from_name", TEXT),
+      ("from_email", TEXT), ("lead_company", TEXT)],
+     {"name": TEXT_INDEX_NAME, "weights": {"subject": 5, "from_name": 3, "from_email": 3, "lead_company": 3, "snippet": 1},
+      "default_language": "none"}),
+    ([("user_id", ASCENDING), ("date", DESCENDING)], {"name": "inbox_user_date"}),
+    ([("user_id", ASCENDING), ("from_email", ASCENDING), ("date", DESCENDING)], {"name": "inbox_user_sender_date"}),
+]
+
+SEARCH_FIELDS = (
+    "account_id", "account_email", "uid", "message_id", "from_email", "from_name", "to",
+    "subject", "date", "snippet", "kind", "in_reply_to", "lead_id", "lead_company",
+)
+
+
+def _prefix(value: str) -> Dict[str, Any]:
+    # anchored, escaped prefix match so the sender index can still be used
+    return {"$regex": "^" + re.escape(value.strip().lower())}
+
+
+def build_search_query(
+    user_id: str,
+    q: Optional[str] = None,
+    sender: Optional[str] = None,
+    subject: Optional[str] = None,
+    company: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    kind: Optional[str] = None,
+) -> Tuple[Dict[str, Any], List[Tuple[str, Any]], Dict[str, Any]]:
+    """Return (filter, sort, extra projection) for a search request."""
+    query: Dict[str, Any] = {"user_id": user_id}
+    projection: Dict[str, Any] = {}
+    sort: List[Tuple[str, Any]] = [("date", DESCENDING)]
+
+    if q and q.strip():
+        query["$text"] = {"$search": q.strip()}
+        projection["score"] = {"$meta": "textScore"}
+        sort = [("score", {"$meta": "textScore"}), ("date", DESCENDING)]
+    if sender:
+        query["from_email"] = _prefix(sender)
+    if subject:
+        query["subject"] = {"$regex": re.escape(subject.strip()), "$options": "i"}
+    if company:
+        query["lead_company"] = {"$regex": "^" + re.escape(company.strip()), "$options": "i"}
+    if since or until:
+        query["date"] = {}
+        if since:
+            query["date"]["$gte"] = since
+        if until:
+            query["date"]["$lte"] = until
+    if kind:
+        query["kind"] = kind
+    return query, sort, projection
+
+
+async def search_messages(db, user_id: str, limit: int = 50, **filters) -> List[Dict[str, Any]]:
+    query, sort, extra = build_search_query(user_id, **filters)
+    projection = {**{field: 1 for field in SEARCH_FIELDS}, **extra}
+    cursor = db["inbox_messages"].find(query, projection).sort(sort).limit(limit)
+    return await cursor.to_list(length=limit)
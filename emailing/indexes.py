@@ -0,0 +1,180 @@
+# indexes.py
+"""Index declarations for every collection, created idempotently at startup.
+
+`ensure_indexes` builds whatever is missing (existing identical indexes are
+a no-op on the server) and reports conflicts or duplicate data instead of
+failing startup. `check_query_plans` explains the hot query shapes the API
+issues and warns about any that would fall back to a collection scan.
+
+Can also be run by hand:  python indexes.py
+"""
+import os
+import asyncio
+from typing import List, Dict, Any
+from dotenv import load_dotenv
+import motor.motor_asyncio
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure, DuplicateKeyError
+
+import jobs
+import lead_import
+import send_events
+from inbox_search import SEARCH_INDEXES
+
+load_dotenv()
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+MONGODB_DB = os.getenv("MONGODB_DB", "email_agent_db")
+INDEX_PLAN_CHECK = os.getenv("INDEX_PLAN_CHECK", "true").lower() != "false"
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "leads": [
+        # get_leads keyset pages / leads_count(sent=...) / send_emails default batch
+        IndexModel([("user_id", ASCENDING), ("mail_sent", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                   name="leads_user_sent_created_id"),
+        # analytics date ranges and total counts
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="leads_user_created"),
+        # Google Maps upsert key and reply/bounce matching by address
+        IndexModel([("user_id", ASCENDING), ("email", ASCENDING), ("company_name", ASCENDING)],
+                   name="leads_user_email_company"),
+        # lead_import's case-insensitive lookup of addresses the user already has
+        IndexModel([("user_id", ASCENDING), ("email", ASCENDING)], name="leads_user_email_ci",
+                   collation=lead_import.CASE_INSENSITIVE),
+        # only leads with bounce feedback carry email_status
+        IndexModel([("user_id", ASCENDING), ("email_status", ASCENDING)], name="leads_user_email_status",
+                   partialFilterExpression={"email_status": {"$exists": True}}),
+        # In-Reply-To matching in the reply watcher
+        IndexModel([("user_id", ASCENDING), ("outbound_message_ids", ASCENDING)], name="leads_user_outbound_ids",
+                   partialFilterExpression={"outbound_message_ids": {"$exists": True}}),
+    ],
+    "templates": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="templates_user_created"),
+        IndexModel([("user_id", ASCENDING), ("name", ASCENDING)], name="templates_user_name"),
+    ],
+    "email_accounts": [
+        IndexModel([("user_id", ASCENDING), ("email", ASCENDING)], name="accounts_user_email", unique=True),
+        IndexModel([("user_id", ASCENDING), ("is_active", ASCENDING), ("created_at", DESCENDING)],
+                   name="accounts_user_active_created"),
+        # reply watcher loads every active account
+        IndexModel([("is_active", ASCENDING)], name="accounts_active"),
+    ],
+    "mail_logs": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="mail_logs_user_created"),
+    ],
+    "daily_stats": [
+        IndexModel([("user_id", ASCENDING), ("day", ASCENDING)], name="daily_user_day", unique=True),
+    ],
+    # time-series collection: secondary indexes on the meta and time fields only
+    "send_events": [
+        IndexModel([("meta.user_id", ASCENDING), ("ts", DESCENDING)], name="send_events_user_ts"),
+        IndexModel([("meta.user_id", ASCENDING), ("meta.account_id", ASCENDING), ("ts", DESCENDING)],
+                   name="send_events_user_account_ts"),
+    ],
+    # expires_at is set per entry from REPHRASE_CACHE_TTL_HOURS
+    "rephrase_cache": [
+        IndexModel([("expires_at", ASCENDING)], name="rephrase_cache_ttl", expireAfterSeconds=0),
+    ],
+    # claim: oldest queued or lease-lapsed job of the worker's kinds
+    "jobs": [
+        IndexModel([("kind", ASCENDING), ("status", ASCENDING), ("created_at", ASCENDING)], name="jobs_kind_status_created"),
+    ],
+    "job_events": [
+        IndexModel([("created_at", ASCENDING)], name="job_events_ttl",
+                   expireAfterSeconds=int(jobs.JOB_EVENTS_TTL_HOURS * 3600)),
+    ],
+    "users": [
+        IndexModel([("email", ASCENDING)], name="users_email", unique=True),
+    ],
+    "inbox_messages": [
+        IndexModel([("account_id", ASCENDING), ("uidvalidity", ASCENDING), ("uid", ASCENDING)],
+                   name="inbox_account_uid", unique=True),
+        *[IndexModel(keys, **options) for keys, options in SEARCH_INDEXES],
+    ],
+}
+
+# Representative shapes of the queries the API runs on every request
+SAMPLE_USER = "000000000000000000000000"
+HOT_QUERIES: List[Dict[str, Any]] = [
+    {"collection": "leads", "filter": {"user_id": SAMPLE_USER, "mail_sent": False}, "sort": [("created_at", -1), ("_id", -1)]},
+    {"collection": "leads", "filter": {"user_id": SAMPLE_USER}, "sort": None},
+    {"collection": "leads", "filter": {"user_id": SAMPLE_USER, "email": "a@example.com", "company_name": "Acme"}, "sort": None},
+    {"collection": "leads", "filter": {"user_id": SAMPLE_USER, "created_at": {"$gte": 0}}, "sort": None},
+    {"collection": "templates", "filter": {"user_id": SAMPLE_USER}, "sort": [("created_at", -1)]},
+    {"collection": "email_accounts", "filter": {"user_id": SAMPLE_USER, "is_active": True}, "sort": [("created_at", -1)]},
+    {"collection": "mail_logs", "filter": {"user_id": SAMPLE_USER, "created_at": {"$gte": 0}}, "sort": None},
+    {"collection": "daily_stats", "filter": {"user_id": SAMPLE_USER, "day": {"$gte": "2024-01-01", "$lte": "2024-01-31"}}, "sort": None},
+    {"collection": "users", "filter": {"email": "a@example.com"}, "sort": None},
+    {"collection": "jobs", "filter": {"kind": {"$in": ["send"]}, "status": "queued"}, "sort": [("created_at", 1)]},
+    {"collection": "inbox_messages", "filter": {"user_id": SAMPLE_USER}, "sort": [("date", -1)]},
+]
+
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """Create every declared index that is missing. Returns the index names per collection."""
+    created: Dict[str, List[str]] = {}
+    for collection, models in INDEXES.items():
+        col = db[collection]
+        created[collection] = []
+        for model in models:
+            name = model.document["name"]
+            try:
+                await col.create_indexes([model])
+                created[collection].append(name)
+            except DuplicateKeyError as e:
+                print(f"⚠️ {collection}.{name} not created: existing documents violate uniqueness ({e.details.get('keyValue') if e.details else e})")
+            except OperationFailure as e:
+                # 85/86: an index with the same keys or name but different options already exists
+                print(f"⚠️ {collection}.{name} not created: {e.details.get('errmsg') if e.details else e}")
+    return created
+
+
+def _stages(plan: Dict[str, Any]):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if isinstance(plan.get(key), dict):
+            yield from _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+async def check_query_plans(db) -> List[Dict[str, Any]]:
+    """Explain the hot query shapes and warn about collection scans or in-memory sorts."""
+    problems = []
+    for q in HOT_QUERIES:
+        cursor = db[q["collection"]].find(q["filter"])
+        if q["sort"]:
+            cursor = cursor.sort(q["sort"])
+        try:
+            explain = await cursor.explain()
+        except Exception as e:
+            print(f"⚠️ Could not explain {q['collection']} {q['filter']}: {e}")
+            continue
+        winning = explain.get("queryPlanner", {}).get("winningPlan", {})
+        stages = set(_stages(winning))
+        if "COLLSCAN" in stages or "SORT" in stages:
+            problem = {**q, "stages": sorted(s for s in stages if s)}
+            problems.append(problem)
+            print(f"⚠️ Query on {q['collection']} cannot fully use an index ({', '.join(problem['stages'])}): "
+                  f"filter={q['filter']} sort={q['sort']}")
+    return problems
+
+
+async def bootstrap(db):
+    """Startup entry point: create collections and indexes, then sanity-check the hot query plans."""
+    await send_events.ensure_collection(db)
+    created = await ensure_indexes(db)
+    print(f"🗂️ Indexes ensured: {sum(len(v) for v in created.values())} across {len(created)} collections")
+    if INDEX_PLAN_CHECK:
+        await check_query_plans(db)
+
+
+async def main():
+    client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URI)
+    try:
+        await bootstrap(client[MONGODB_DB])
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
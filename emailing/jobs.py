@@ -0,0 +1,179 @@
+# jobs.py
+"""Mongo-backed job queue between the API and the worker processes.
+
+With WORKER_MODE=queue the API only enqueues campaign and scrape jobs in
+the `jobs` collection; `python -m worker sender-worker` / `scraper-worker`
+claim them. A claim is a lease (JOB_LEASE_SECONDS) that the worker keeps
+extending while the job runs, so a job whose worker died is picked up
+again once the lease lapses, up to the kind's attempt limit. Campaigns get
+a single attempt: a lost sender may already have mailed part of the list,
+so it is marked failed rather than sent twice.
+
+Workers serve no /events streams, so their events are written to the
+`job_events` collection (TTL JOB_EVENTS_TTL_HOURS) and every API process
+relays them to its own streams.
+"""
+import os
+import socket
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+WORKER_MODE = os.getenv("WORKER_MODE", "inline").lower()  # "inline" (API runs jobs) or "queue" (workers do)
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 120))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 2))
+JOB_EVENTS_TTL_HOURS = float(os.getenv("JOB_EVENTS_TTL_HOURS", 24))
+JOB_EVENTS_POLL_SECONDS = float(os.getenv("JOB_EVENTS_POLL_SECONDS", 1))
+RELAY_OVERLAP_SECONDS = 5  # re-read this far back so events from slightly skewed worker clocks are not missed
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+# kind -> (worker role, attempts)
+KINDS: Dict[str, tuple] = {
+    "send": ("sender", 1),
+    "scrape_bing_maps": ("scraper", 2),
+    "scrape_google_maps": ("scraper", 2),
+}
+ROLES = {role for role, _ in KINDS.values()}
+
+
+def kinds_for(role: str) -> List[str]:
+    return [kind for kind, (r, _) in KINDS.items() if r == role]
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def enqueue(col, kind: str, user_id: str, payload: Dict[str, Any]) -> str:
+    now = datetime.utcnow()
+    doc = {
+        "kind": kind,
+        "user_id": user_id,
+        "payload": payload,
+        "status": STATUS_QUEUED,
+        "attempts": 0,
+        "attempts_left": KINDS[kind][1],
+        "created_at": now,
+        "updated_at": now,
+    }
+    result = await col.insert_one(doc)
+    return str(result.inserted_id)
+
+
+async def claim(col, kinds: List[str], worker: str) -> Optional[Dict[str, Any]]:
+    """Lease the oldest runnable job of `kinds`: queued, or running on a worker whose lease lapsed."""
+    now = datetime.utcnow()
+    return await col.find_one_and_update(
+        {
+            "kind": {"$in": kinds},
+            "attempts_left": {"$gt": 0},
+            "$or": [
+                {"status": STATUS_QUEUED},
+                {"status": STATUS_RUNNING, "lease_until": {"$lt": now}},
+            ],
+        },
+        {
+            "$set": {"status": STATUS_RUNNING, "worker": worker, "started_at": now, "updated_at": now,
+                     "lease_until": now + timedelta(seconds=JOB_LEASE_SECONDS)},
+            "$inc": {"attempts": 1, "attempts_left": -1},
+        },
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def extend_lease(col, job_id: ObjectId, worker: str) -> bool:
+    now = datetime.utcnow()
+    result = await col.update_one(
+        {"_id": job_id, "worker": worker, "status": STATUS_RUNNING},
+        {"$set": {"lease_until": now + timedelta(seconds=JOB_LEASE_SECONDS), "updated_at": now}},
+    )
+    return result.matched_count == 1
+
+
+async def finish(col, job_id: ObjectId, worker: str, result: Optional[Dict[str, Any]] = None):
+    await col.update_one(
+        {"_id": job_id, "worker": worker},
+        {"$set": {"status": STATUS_DONE, "result": result or {}, "finished_at": datetime.utcnow(),
+                  "updated_at": datetime.utcnow()},
+         "$unset": {"lease_until": ""}},
+    )
+
+
+async def fail(col, job_id: ObjectId, worker: str, error: str):
+    await col.update_one(
+        {"_id": job_id, "worker": worker},
+        {"$set": {"status": STATUS_FAILED, "error": error, "finished_at": datetime.utcnow(),
+                  "updated_at": datetime.utcnow()},
+         "$unset": {"lease_until": ""}},
+    )
+
+
+async def expire_lost(col, kinds: List[str]) -> int:
+    """Mark jobs whose worker disappeared after their last allowed attempt as failed."""
+    now = datetime.utcnow()
+    result = await col.update_many(
+        {"kind": {"$in": kinds}, "status": STATUS_RUNNING, "lease_until": {"$lt": now}, "attempts_left": {"$lte": 0}},
+        {"$set": {"status": STATUS_FAILED, "error": "worker lost", "finished_at": now, "updated_at": now},
+         "$unset": {"lease_until": ""}},
+    )
+    return result.modified_count
+
+
+def public(job: Dict[str, Any]) -> Dict[str, Any]:
+    fields = ("kind", "status", "attempts", "error", "result", "created_at", "started_at", "finished_at")
+    return {"id": str(job["_id"]), **{f: job.get(f) for f in fields if f in job}}
+
+
+class EventShipper:
+    """events.bus sink for workers: batches events into `job_events` for the API processes to relay."""
+
+    def __init__(self, col):
+        self.col = col
+        self._pending: List[Dict[str, Any]] = []
+        self._flushing: Optional[asyncio.Task] = None
+
+    def add(self, user_id: str, event: str, data: Dict[str, Any]):
+        self._pending.append({"user_id": user_id, "event": event, "data": data, "created_at": datetime.utcnow()})
+        if self._flushing is None or self._flushing.done():
+            self._flushing = asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        while self._pending:
+            batch, self._pending = self._pending, []
+            try:
+                await self.col.insert_many(batch, ordered=True)
+            except Exception as e:
+                print(f"⚠️ Could not ship {len(batch)} job events: {e}")
+
+
+async def relay_forever(col, bus):
+    """API side: publish events written by workers to this process's /events streams."""
+    since = datetime.utcnow()
+    seen: Dict[ObjectId, datetime] = {}
+    primed = False  # the first pass only records what is already there
+    while True:
+        try:
+            floor = ObjectId.from_datetime(since - timedelta(seconds=RELAY_OVERLAP_SECONDS))
+            docs = await col.find({"_id": {"$gt": floor}}).sort("_id", 1).to_list(length=1000)
+            for doc in docs:
+                if doc["_id"] in seen:
+                    continue
+                seen[doc["_id"]] = doc["created_at"]
+                if primed:
+                    bus.publish(doc["user_id"], doc["event"], doc["data"])
+            primed = True
+            if docs:
+                since = max(since, docs[-1]["created_at"])
+            cutoff = since - timedelta(seconds=RELAY_OVERLAP_SECONDS * 2)
+            for key in [k for k, at in seen.items() if at < cutoff]:
+                del seen[key]
+        except Exception as e:
+            print(f"⚠️ Job event relay failed: {e}")
+        await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
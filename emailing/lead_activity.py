@@ -0,0 +1,29 @@
+# lead_activity.py
+"""Bookkeeping that follows every lead write, shared by the API and the workers.
+
+Inserted leads move the per-user counters and daily rollups, and the new
+counts are pushed to the user's open /events streams (or, in a worker, to
+the job event relay).
+"""
+from typing import Any, Dict, List
+
+import daily_stats
+import events
+import lead_counters
+from db import leads_col, lead_counters_col, daily_stats_col
+
+
+async def publish_counts(user_id: str):
+    """Push the user's current lead counters to their open /events streams"""
+    if events.bus.has_subscribers(user_id):
+        counts = await lead_counters.get_counts(leads_col, lead_counters_col, user_id)
+        events.bus.publish(user_id, "counts", counts)
+
+async def record_new_leads(leads: List[Dict[str, Any]]):
+    """Keep the lead counters and daily rollups in step with freshly inserted leads"""
+    if not leads:
+        return
+    await lead_counters.record_inserted(lead_counters_col, leads)
+    await daily_stats.record_leads(daily_stats_col, leads)
+    for user_id in {l["user_id"] for l in leads}:
+        await publish_counts(user_id)
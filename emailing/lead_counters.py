@@ -0,0 +1,137 @@
+# lead_counters.py
+"""Per-user lead counters kept next to the leads instead of counted on demand.
+
+One `lead_counters` document per user (`_id` = user id) holds total, unsent,
+sent and with_email counts plus a `by_source` breakdown. Every path in the
+API that inserts, upserts or marks leads sent applies the matching `$inc`,
+so `/leads/count` and the analytics summary are a single `_id` lookup.
+
+Writes that bypass these hooks (manual edits in the shell, old scripts) and
+the small window between a lead write and its `$inc` can make the counters
+drift; `reconcile` recounts from the leads collection and is run
+periodically by the API (LEAD_COUNTERS_RECONCILE_MINUTES) and lazily for
+users that have no counters document yet.
+"""
+import os
+import asyncio
+from datetime import datetime
+from typing import Optional, Any, Dict, Iterable
+
+import http_cache
+
+RECONCILE_MINUTES = float(os.getenv("LEAD_COUNTERS_RECONCILE_MINUTES", 60))  # 0 disables the periodic job
+
+COUNTER_FIELDS = ("total", "unsent", "sent", "with_email")
+UNKNOWN_SOURCE = "unknown"
+
+
+def source_key(source: Optional[str]) -> str:
+    # sources become field names under by_source, which cannot contain '.' or start with '$'
+    key = (source or UNKNOWN_SOURCE).replace(".", "_").lstrip("$")
+    return key or UNKNOWN_SOURCE
+
+
+def delta_for(leads: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, int]]:
+    """$inc documents per user id for a batch of newly created leads."""
+    deltas: Dict[str, Dict[str, int]] = {}
+    for lead in leads:
+        inc = deltas.setdefault(lead["user_id"], {})
+        keys = ["total", f"by_source.{source_key(lead.get('source'))}"]
+        if lead.get("mail_sent") is True:
+            keys.append("sent")
+        elif lead.get("mail_sent") is False:
+            keys.append("unsent")
+        if lead.get("email"):
+            keys.append("with_email")
+        for key in keys:
+            inc[key] = inc.get(key, 0) + 1
+    return deltas
+
+
+async def apply(col, user_id: str, inc: Dict[str, int]):
+    inc = {k: v for k, v in inc.items() if v}
+    if not inc:
+        return
+    await col.update_one(
+        {"_id": user_id},
+        {"$inc": inc, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+    await http_cache.bump(http_cache.sibling(col), user_id, "analytics")
+
+
+async def record_inserted(col, leads: Iterable[Dict[str, Any]]):
+    """Count leads that were just inserted (insert_one / insert_many)."""
+    for user_id, inc in delta_for(leads).items():
+        await apply(col, user_id, inc)
+
+
+async def record_marked_sent(col, user_id: str, count: int):
+    """Move `count` leads that just flipped mail_sent False -> True."""
+    await apply(col, user_id, {"unsent": -count, "sent": count})
+
+
+def _as_counts(doc: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    doc = doc or {}
+    counts = {field: max(int(doc.get(field, 0)), 0) for field in COUNTER_FIELDS}
+    counts["by_source"] = {k: v for k, v in (doc.get("by_source") or {}).items() if v > 0}
+    return counts
+
+
+async def reconcile(leads_col, col, user_id: Optional[str] = None) -> int:
+    """Recount from the leads collection and overwrite the counters. Returns users reconciled."""
+    match = {"user_id": user_id} if user_id else {}
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "source": "$source"},
+            "total": {"$sum": 1},
+            "unsent": {"$sum": {"$cond": [{"$eq": ["$mail_sent", False]}, 1, 0]}},
+            "sent": {"$sum": {"$cond": [{"$eq": ["$mail_sent", True]}, 1, 0]}},
+            "with_email": {"$sum": {"$cond": [{"$ne": [{"$ifNull": ["$email", ""]}, ""]}, 1, 0]}},
+        }},
+    ]
+    counters: Dict[str, Dict[str, Any]] = {}
+    async for row in leads_col.aggregate(pipeline):
+        uid = row["_id"]["user_id"]
+        if uid is None:
+            continue
+        c = counters.setdefault(uid, {**{f: 0 for f in COUNTER_FIELDS}, "by_source": {}})
+        for field in COUNTER_FIELDS:
+            c[field] += row[field]
+        key = source_key(row["_id"].get("source"))
+        c["by_source"][key] = c["by_source"].get(key, 0) + row["total"]
+    if user_id and user_id not in counters:
+        counters[user_id] = {**{f: 0 for f in COUNTER_FIELDS}, "by_source": {}}
+
+    now = datetime.utcnow()
+    versions_col = http_cache.sibling(col)
+    for uid, c in counters.items():
+        before = await col.find_one_and_replace({"_id": uid}, {**c, "updated_at": now, "reconciled_at": now}, upsert=True)
+        if before is None or _as_counts(before) != _as_counts(c):
+            await http_cache.bump(versions_col, uid, "analytics")
+    if not user_id:
+        # users whose leads are all gone
+        removed = await col.delete_many({"_id": {"$nin": list(counters)}})
+        if removed.deleted_count:
+            await http_cache.bump_all(versions_col, "analytics")
+    return len(counters)
+
+
+async def get_counts(leads_col, col, user_id: str) -> Dict[str, Any]:
+    """Counters for one user, built from the leads the first time they are asked for."""
+    doc = await col.find_one({"_id": user_id})
+    if doc is None or "reconciled_at" not in doc:
+        await reconcile(leads_col, col, user_id)
+        doc = await col.find_one({"_id": user_id})
+    return _as_counts(doc)
+
+
+async def reconcile_forever(leads_col, col, interval_minutes: float = RECONCILE_MINUTES):
+    while True:
+        await asyncio.sleep(interval_minutes * 60)
+        try:
+            users = await reconcile(leads_col, col)
+            print(f"🧮 Lead counters reconciled for {users} users")
+        except Exception as e:
+            print(f"⚠️ Lead counter reconciliation failed: {str(e)}")
@@ -0,0 +1,159 @@
+# lead_export.py
+"""Streaming lead export as CSV, NDJSON or Parquet.
+
+Rows come straight off a Mongo cursor in batches and every batch is encoded
+and handed to the response before the next one is fetched, so memory stays
+flat and the first bytes go out right away however many leads there are.
+Parquet needs the optional `pyarrow` package, imported on the first parquet
+export; each batch becomes one row group.
+"""
+import io
+import csv
+import json
+import importlib.util
+from datetime import datetime
+from typing import Any, Dict, List, AsyncIterator
+
+import executors
+
+pa = pq = None  # pyarrow, loaded by _load_pyarrow
+
+BATCH_SIZE = 1000
+
+COLUMNS = (
+    "id", "company_name", "contact_number", "email", "owner_name", "website", "source",
+    "mail_sent", "email_status", "replied", "created_at", "last_mailed_at",
+)
+PROJECTION = {c: 1 for c in COLUMNS if c != "id"}
+
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def parquet_available() -> bool:
+    return pq is not None or importlib.util.find_spec("pyarrow") is not None
+
+
+def _load_pyarrow():
+    global pa, pq
+    if pq is None:
+        import pyarrow
+        import pyarrow.parquet
+        pa, pq = pyarrow, pyarrow.parquet
+
+
+def _row(doc: Dict[str, Any]) -> Dict[str, Any]:
+    row = {c: doc.get(c) for c in COLUMNS}
+    row["id"] = str(doc["_id"])
+    row["mail_sent"] = bool(doc.get("mail_sent", False))
+    row["replied"] = bool(doc.get("replied", False))
+    for key in ("company_name", "contact_number", "email", "owner_name", "website", "source", "email_status"):
+        if row[key] is not None and not isinstance(row[key], str):
+            row[key] = str(row[key])
+    return row
+
+
+async def _batches(cursor, size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+    batch = []
+    async for doc in cursor:
+        batch.append(_row(doc))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _iso(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+async def stream_csv(cursor, size: int = BATCH_SIZE) -> AsyncIterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(COLUMNS)
+    yield buf.getvalue().encode("utf-8")
+    async for batch in _batches(cursor, size):
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows([_iso(r[c]) if r[c] is not None else "" for c in COLUMNS] for r in batch)
+        yield buf.getvalue().encode("utf-8")
+
+
+async def stream_ndjson(cursor, size: int = BATCH_SIZE) -> AsyncIterator[bytes]:
+    async for batch in _batches(cursor, size):
+        yield "".join(json.dumps({k: _iso(v) for k, v in r.items()}) + "\n" for r in batch).encode("utf-8")
+
+
+class _Drain(io.RawIOBase):
+    """Write-only sink that hands back what was written since the last drain, keeping absolute offsets."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def _parquet_schema():
+    strings = ("id", "company_name", "contact_number", "email", "owner_name", "website", "source", "email_status")
+    fields = []
+    for column in COLUMNS:
+        if column in strings:
+            fields.append(pa.field(column, pa.string()))
+        elif column in ("mail_sent", "replied"):
+            fields.append(pa.field(column, pa.bool_()))
+        else:
+            fields.append(pa.field(column, pa.timestamp("ms")))
+    return pa.schema(fields)
+
+
+def _write_row_group(writer, batch: List[Dict[str, Any]], schema):
+    writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+
+
+async def stream_parquet(cursor, size: int = BATCH_SIZE) -> AsyncIterator[bytes]:
+    if not parquet_available():
+        raise RuntimeError("pyarrow is not installed")
+    await executors.run("cpu", _load_pyarrow)
+    schema = _parquet_schema()
+    sink = _Drain()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="snappy")
+    try:
+        async for batch in _batches(cursor, size):
+            for r in batch:
+                for key in ("created_at", "last_mailed_at"):
+                    if not isinstance(r[key], datetime):
+                        r[key] = None
+            # encoding and compression of a row group run on the cpu pool
+            await executors.run("cpu", _write_row_group, writer, batch, schema)
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def stream(fmt: str, cursor, size: int = BATCH_SIZE) -> AsyncIterator[bytes]:
+    if fmt == "parquet":
+        return stream_parquet(cursor, size)
+    if fmt == "ndjson":
+        return stream_ndjson(cursor, size)
+    return stream_csv(cursor, size)
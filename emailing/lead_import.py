@@ -0,0 +1,194 @@
+# lead_import.py
+"""Streaming CSV / NDJSON lead import shared by `POST /leads/import` and import_leads_async.py.
+
+Input arrives as an async iterator of byte chunks and is parsed row by row,
+so only one batch of leads is held in memory at a time. Each batch is
+normalised, deduplicated within itself and upserted with `$setOnInsert`
+against the user's existing leads: the email address (lowercased) is the
+dedup key, and company name for rows without an email. Leads stored by
+other paths keep the case they were entered with, so each batch first looks
+up the stored spelling of its addresses case-insensitively (the
+`leads_user_email_ci` index) and upserts on that.
+"""
+import re
+import csv
+import json
+import codecs
+from datetime import datetime
+from typing import Optional, Any, Dict, List, Tuple, AsyncIterator, Callable, Awaitable
+from pymongo import UpdateOne
+from pymongo.collation import Collation, CollationStrength
+from pymongo.errors import BulkWriteError
+
+BATCH_SIZE = 1000
+MAX_ERRORS_PER_BATCH = 20
+# must match the collation of the leads_user_email_ci index (indexes.py)
+CASE_INSENSITIVE = Collation(locale="en", strength=CollationStrength.SECONDARY)
+
+EMAIL_REGEX = re.compile(r'^[\w\.\+-]+@[\w\.-]+\.\w+$')
+
+# accepted column names for each lead field
+COLUMN_ALIASES = {
+    "company_name": ("company_name", "company", "business", "business_name", "name"),
+    "contact_number": ("contact_number", "phone", "phone_number", "contact"),
+    "email": ("email", "email_address", "e-mail"),
+    "owner_name": ("owner_name", "owner", "contact_name", "first_name"),
+    "website": ("website", "url", "site"),
+}
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> str:
+    name, ctype = (filename or "").lower(), (content_type or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in ctype or "jsonl" in ctype:
+        return "ndjson"
+    return "csv"
+
+
+def normalize_row(row: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Map a raw row onto lead fields. Returns (fields, None) or (None, reason)."""
+    lowered = {str(k).strip().lower(): v for k, v in row.items() if k is not None}
+    lead: Dict[str, Any] = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        value = next((lowered[a] for a in aliases if lowered.get(a) not in (None, "")), None)
+        lead[field] = str(value).strip() if value is not None else ""
+    email = lead["email"].lower()
+    if email and not EMAIL_REGEX.match(email):
+        return None, f"invalid email {lead['email']!r}"
+    lead["email"] = email or None
+    if not lead["email"] and not lead["company_name"]:
+        return None, "row has neither email nor company name"
+    if not lead["website"]:
+        del lead["website"]
+    return lead, None
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *complete, pending = pending.split("\n")
+        for line in complete:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def iter_csv_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """Yield dict rows; a quoted field may span lines, so lines are joined until quotes balance."""
+    header = None
+    record = ""
+    async for line in _lines(chunks):
+        record += line
+        if record.count('"') % 2:
+            continue  # inside a quoted field that continues on the next line
+        text, record = record, ""
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = values
+            continue
+        yield dict(zip(header, values))
+    if record.strip():
+        yield "unterminated quoted field at end of file"
+
+
+async def iter_ndjson_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    async for line in _lines(chunks):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield f"invalid JSON: {e}"
+            continue
+        yield row if isinstance(row, dict) else "row is not a JSON object"
+
+
+def _dedup_key(lead: Dict[str, Any]) -> Tuple[str, str]:
+    return ("email", lead["email"]) if lead["email"] else ("company", lead["company_name"].lower())
+
+
+async def _write_batch(leads_col, user_id: str, leads: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+    """Upsert a deduplicated batch. Returns (inserted documents, rows matching existing leads)."""
+    emails = [lead["email"] for lead in leads if lead["email"]]
+    stored: Dict[str, str] = {}
+    if emails:
+        cursor = leads_col.find({"user_id": user_id, "email": {"$in": emails}}, {"email": 1}).collation(CASE_INSENSITIVE)
+        async for doc in cursor:
+            stored.setdefault(doc["email"].lower(), doc["email"])
+    ops = []
+    for lead in leads:
+        if lead["email"]:
+            key = {"user_id": user_id, "email": stored.get(lead["email"], lead["email"])}
+        else:
+            key = {"user_id": user_id, "email": None, "company_name": lead["company_name"]}
+        ops.append(UpdateOne(key, {"$setOnInsert": lead}, upsert=True))
+    try:
+        details = (await leads_col.bulk_write(ops, ordered=False)).bulk_api_result
+    except BulkWriteError as bwe:
+        details = bwe.details
+    inserted = [leads[u["index"]] for u in details.get("upserted", [])]
+    return inserted, details.get("nMatched", 0)
+
+
+async def import_leads(
+    leads_col,
+    user_id: str,
+    chunks: AsyncIterator[bytes],
+    fmt: str = "csv",
+    source: str = "import",
+    batch_size: int = BATCH_SIZE,
+    on_inserted: Optional[Callable[[List[Dict[str, Any]]], Awaitable[None]]] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Import rows from `chunks`, yielding a progress dict after every batch and a final summary."""
+    rows = iter_ndjson_rows(chunks) if fmt == "ndjson" else iter_csv_rows(chunks)
+    totals = {"rows": 0, "imported": 0, "duplicates": 0, "invalid": 0}
+    batch: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    errors: List[Dict[str, Any]] = []
+    number = 0
+
+    async def flush():
+        nonlocal batch, errors, number
+        number += 1
+        inserted, matched = (await _write_batch(leads_col, user_id, list(batch.values()))) if batch else ([], 0)
+        if inserted and on_inserted:
+            await on_inserted(inserted)
+        totals["imported"] += len(inserted)
+        totals["duplicates"] += matched
+        progress = {"batch": number, **totals, "errors": errors[:MAX_ERRORS_PER_BATCH]}
+        batch, errors = {}, []
+        return progress
+
+    pending_rows = 0
+    async for raw in rows:
+        totals["rows"] += 1
+        pending_rows += 1
+        lead, error = (None, raw) if isinstance(raw, str) else normalize_row(raw)
+        if error:
+            totals["invalid"] += 1
+            errors.append({"row": totals["rows"], "error": error})
+        else:
+            key = _dedup_key(lead)
+            if key in batch:
+                totals["duplicates"] += 1
+            else:
+                batch[key] = {**lead, "mail_sent": False, "created_at": datetime.utcnow(),
+                              "user_id": user_id, "source": source}
+        if pending_rows >= batch_size:
+            yield await flush()
+            pending_rows = 0
+    if pending_rows or number == 0:
+        yield await flush()
+    yield {"done": True, "batches": number, **totals}
+
+
+async def file_chunks(path: str, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
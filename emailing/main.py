@@ -1,50 +1,76 @@
 import os
 import re
+import io
+import json
 import asyncio
-import base64
 import traceback
-import random
 from typing import List, Optional, Any, Dict
 from datetime import timedelta
 from datetime import datetime
-from pydantic import BaseModel, Field, EmailStr, validator
-from imap_tools import MailBox
+from pydantic import BaseModel, Field, EmailStr, validator, ValidationError
+from imap_tools import MailBox, MailBoxUnencrypted
 import email.utils
 import threading
-from fastapi import FastAPI, HTTPException, BackgroundTasks, status, Depends
+from fastapi import FastAPI, HTTPException, BackgroundTasks, status, Depends, Request, UploadFile, File, Form
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse, Response
+from fastapi.middleware.gzip import GZipMiddleware
 from dotenv import load_dotenv
-import motor.motor_asyncio
 from bson import ObjectId
-import smtplib, ssl
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.utils import formataddr
-from email import encoders
-from email.mime.base import MIMEBase
+from pymongo import UpdateOne, DeleteOne
+from pymongo.errors import DuplicateKeyError, BulkWriteError
 import time
-from agents import Agent, Runner, AsyncOpenAI, OpenAIChatCompletionsModel
-from agents.run import RunConfig
 from passlib.context import CryptContext
 from jose import JWTError, jwt
+from bounces import UNDELIVERABLE_STATUSES
+import account_health
+import daily_stats
+import events
+import executors
+import http_cache
+import inbox_search
+import indexes
+import jobs
+import lead_counters
+import lead_export
+import lead_import
+import pagination
+import password_hashing
+import rephrase_cache
+import rephrase_variants
+import send_events
+import user_cache
+from db import (MONGODB_DB, db, templates_col, leads_col, email_accounts_col,
+                lead_counters_col, daily_stats_col, send_events_col, rephrase_cache_col, users_collection,
+                jobs_col, job_events_col, cache_versions_col)
+from lead_activity import publish_counts, record_new_leads
+from scraping import save_scraped_data_to_db, save_google_scraped_data_to_db
+from sending import SMTP_HOST, SMTP_PORT, is_valid_email, background_send
 
 load_dotenv()
 
 # --------------------
 # Config
 # --------------------
-MONGODB_URI = os.getenv("MONGODB_URI")
-MONGODB_DB = os.getenv("MONGODB_DB", "email_agent_db")
-SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
-SMTP_PORT = int(os.getenv("SMTP_PORT", 465))
-SMTP_DELAY = float(os.getenv("SMTP_DELAY", 15.0))  # seconds between emails in the blocking send loop
+IMAP_CHECK_TIMEOUT = float(os.getenv("IMAP_CHECK_TIMEOUT", 30.0))  # seconds to wait for all accounts in check_unread_emails
+IMAP_HOST = os.getenv("IMAP_HOST", "imap.gmail.com")
+IMAP_PORT = int(os.getenv("IMAP_PORT", 993))
+IMAP_SSL = os.getenv("IMAP_SSL", "true").lower() != "false"  # plain IMAP only for local stand-ins (bench/imap_stub.py)
 FRONTEND_ORIGIN = os.getenv("FRONTEND_ORIGIN", "*")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+REPHRASE_PRELOAD = os.getenv("REPHRASE_PRELOAD", "true").lower() != "false"  # warm the agents SDK after startup
+REPHRASE_MODEL = os.getenv("REPHRASE_MODEL", "gemini-2.0-flash")
 SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey123")  # 🔐 change in production
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 60 * 24 * 30))  # 30 days
+LEADS_PAGE_SIZE_MAX = int(os.getenv("LEADS_PAGE_SIZE_MAX", 1000))  # upper bound for GET /leads?limit=
+LEADS_BULK_CHUNK = int(os.getenv("LEADS_BULK_CHUNK", 1000))  # operations per bulk_write in POST /leads/bulk
+LEADS_IMPORT_BATCH = int(os.getenv("LEADS_IMPORT_BATCH", 1000))  # rows per upsert batch in POST /leads/import
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", 1024))  # bytes; 0 disables response compression
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", 15))  # keeps idle SSE streams open through proxies
+EVENTS_TOKEN_EXPIRE_SECONDS = int(os.getenv("EVENTS_TOKEN_EXPIRE_SECONDS", 60))  # ?token= for /events ends up in logs
+EVENTS_TOKEN_SCOPE = "sse"
 
 if not GEMINI_API_KEY:
     print("Warning: GEMINI_API_KEY not set. Email rephrasing will not work.")
@@ -60,15 +86,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
-client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URI)
-db = client[MONGODB_DB]
-templates_col = db["templates"]
-leads_col = db["leads"]
-email_accounts_col = db["email_accounts"]
-mail_logs_col = db["mail_logs"]
-users_collection = db["users"]
+# Streaming endpoints whose progress lines must reach the client as they are produced
+UNCOMPRESSED_PATHS = {"/leads/bulk", "/leads/import", "/events", "/rephrase-email/stream"}
+
+class StreamingAwareGZipMiddleware(GZipMiddleware):
+    """GZip everything except streaming endpoints, where compression would hold back each line"""
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in UNCOMPRESSED_PATHS:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+if GZIP_MIN_SIZE > 0:
+    app.add_middleware(StreamingAwareGZipMiddleware, minimum_size=GZIP_MIN_SIZE)
+
 
 # --------------------
 # Authentication
@@ -76,11 +110,22 @@ users_collection = db["users"]
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def hash_off_loop(fn, *args):
+    """bcrypt on the bounded hashing pool; 429 when too many hashes are already waiting"""
+    try:
+        return await password_hashing.run(fn, *args)
+    except password_hashing.HashingOverloaded:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts in progress, please retry shortly",
+            headers={"Retry-After": str(password_hashing.HASH_RETRY_AFTER_SECONDS)},
+        )
+
+async def verify_password(plain_password, hashed_password):
+    return await hash_off_loop(pwd_context.verify, plain_password, hashed_password)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    return await hash_off_loop(pwd_context.hash, password)
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
@@ -92,6 +137,10 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
+    return await user_from_token(token)
+
+async def user_from_token(token: str, scope: Optional[str] = None):
+    """The user a JWT belongs to. Scoped tokens (`scope` claim) only work where that scope is asked for."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -100,29 +149,31 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
-        if email is None:
+        if email is None or payload.get("scope") != scope:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
-    user = await users_collection.find_one({"email": email})
-    if user is None:
+    # tokens issued before token versions existed carry no "tv" claim and count as version 0
+    version = payload.get("tv", 0)
+    user = user_cache.cache.get(email)
+    if user is None or user_cache.token_version(user) != version:
+        # not cached, or the cached copy predates a revocation made by another process
+        user = await users_collection.find_one({"email": email}, user_cache.USER_PROJECTION)
+        if user is None:
+            raise credentials_exception
+        user_cache.cache.put(email, user)
+    if user_cache.token_version(user) != version:
         raise credentials_exception
     return user
 
+def invalidate_user(email: str):
+    """Drop the cached copy after the user document changes"""
+    user_cache.cache.invalidate(email)
+
 # --------------------
 # Utilities
 # --------------------
-EMAIL_REGEX = r'^[\w\.-]+@[\w\.-]+\.\w+$'
-
-def is_valid_email(email: str) -> bool:
-    if not email or not isinstance(email, str):
-        return False
-    email = email.strip()
-    if not email:
-        return False
-    return re.match(EMAIL_REGEX, email) is not None
-
 def oid(id_str: str) -> ObjectId:
     try:
         print(f"Converting to ObjectId: {id_str}")  # Debug
@@ -138,6 +189,38 @@ def serialize_doc(doc: Dict[str, Any]) -> Dict[str, Any]:
         del doc["_id"]
     return doc
 
+# Fields each list endpoint actually returns; everything else stays in Mongo
+LEAD_LIST_PROJECTION = {
+    "company_name": 1, "contact_number": 1, "email": 1, "owner_name": 1,
+    "mail_sent": 1, "email_status": 1, "created_at": 1, "user_id": 1,
+}
+TEMPLATE_LIST_PROJECTION = {"name": 1, "subject": 1, "content": 1, "created_at": 1, "user_id": 1}
+EMAIL_ACCOUNT_LIST_PROJECTION = {
+    "email": 1, "sender_name": 1, "is_active": 1, "created_at": 1,
+    "emails_sent_today": 1, "last_reset_date": 1, "user_id": 1,
+    "auth_health": 1,  # read by health_state, then dropped
+}
+
+def lean_docs(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    for doc in docs:
+        doc["id"] = str(doc.pop("_id"))
+    return docs
+
+def lean_response(docs: List[Dict[str, Any]], headers: Optional[Dict[str, str]] = None) -> ORJSONResponse:
+    """Serialise already-projected Mongo documents with orjson.
+
+    Returning a Response skips FastAPI's per-item response_model re-validation;
+    the projections above are what keep the output in the documented shape.
+    """
+    return ORJSONResponse(lean_docs(docs), headers=headers)
+
+async def conditional_get(request: Request, user_id: str, scopes, *parts: Any):
+    """ETag for cached scope(s) (see http_cache.py), plus the 304 to return when the client already has it."""
+    tag = http_cache.etag(user_id, scopes, await http_cache.versions(cache_versions_col, user_id), *parts)
+    if http_cache.matches(request.headers.get("if-none-match"), tag):
+        return tag, Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=http_cache.headers(tag))
+    return tag, None
+
 # --------------------
 # Pydantic models
 # --------------------
@@ -166,6 +249,20 @@ class UnreadEmail(BaseModel):
     time: str
     preview: str
 
+class InboxMessageOut(BaseModel):
+    id: str
+    account_id: str
+    account_email: str
+    from_email: str
+    from_name: Optional[str] = None
+    subject: str
+    date: Optional[datetime] = None
+    snippet: Optional[str] = None
+    kind: Optional[str] = None
+    lead_id: Optional[str] = None
+    lead_company: Optional[str] = None
+    score: Optional[float] = None
+
 class LeadIn(BaseModel):
     company_name: Optional[str] = None
     contact_number: Optional[str] = None
@@ -183,6 +280,7 @@ class LeadIn(BaseModel):
 class LeadOut(LeadIn):
     id: str
     mail_sent: bool = False
+    email_status: Optional[str] = None  # "bounced" / "invalid_email" once a bounce was ingested
     created_at: datetime
     user_id: str
 
@@ -190,18 +288,28 @@ class Attachment(BaseModel):
     filename: str
     content: str  # base64 encoded content
 
-class EmailAccountIn(BaseModel):
+class EmailAccountBase(BaseModel):
     email: EmailStr
-    password: str = Field(..., description="App password for the email account")
     sender_name: Optional[str] = None
     is_active: bool = True
 
-class EmailAccountOut(EmailAccountIn):
+class EmailAccountIn(EmailAccountBase):
+    password: str = Field(..., description="App password for the email account")
+
+class AccountHealth(BaseModel):
+    status: str  # ok / quarantined / retrying / unknown
+    auth_failures: int = 0
+    retry_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+    last_ok_at: Optional[datetime] = None
+
+class EmailAccountOut(EmailAccountBase):  # never echoes the app password back
     id: str
     created_at: datetime
     emails_sent_today: int = 0
-    last_reset_date: datetime
+    last_reset_date: Optional[datetime] = None
     user_id: str
+    health: Optional[AccountHealth] = None
 
 class SendEmailsPayload(BaseModel):
     template_id: str
@@ -215,6 +323,11 @@ class RephraseOutput(BaseModel):
 class RephraseRequest(BaseModel):
     template_id: str
     content: str
+    fresh: bool = False  # skip the cache and ask the model for a new variant
+
+class VariantsRequest(BaseModel):
+    count: int = Field(5, ge=1, le=rephrase_variants.VARIANT_BATCH_MAX)
+    replace: bool = False  # drop the current pool instead of adding to it
 
 class ScrapeRequest(BaseModel):
     query: str
@@ -225,6 +338,7 @@ class ScrapeResponse(BaseModel):
     message: str
     scraped_count: int = 0
     total_requested: int = 0
+    job_id: Optional[str] = None
 
 class Token(BaseModel):
     access_token: str
@@ -233,43 +347,78 @@ class Token(BaseModel):
 # --------------------
 # Email Rephrase Agent Setup
 # --------------------
+REPHRASE_INSTRUCTIONS = 'You are email rephrase agent. You rephrase the given email in human wordings. Do not change the meaning and just change the wordings.'
+
+# The agents SDK takes over a second to import, so the agents are built on first use
+# (or warmed in the background right after startup) instead of at import time.
+rephrase_agent = None
+rephrase_stream_agent = None  # same prompt with plain-text output, so tokens can be forwarded as they arrive
+_rephrase_agents_loaded = False
+_rephrase_agents_lock = threading.Lock()
+
 def setup_rephrase_agent():
-    if not GEMINI_API_KEY:
-        return None
-    
-    try:
-        external_client = AsyncOpenAI(
-            api_key=GEMINI_API_KEY,
-            base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
-            timeout=30.0
-        )
+    """Import the agents SDK and build the rephrase agents once. Blocking; returns None when not configured."""
+    global rephrase_agent, rephrase_stream_agent, _rephrase_agents_loaded
+    with _rephrase_agents_lock:
+        if _rephrase_agents_loaded or not GEMINI_API_KEY:
+            return rephrase_agent
+        try:
+            from agents import Agent, AsyncOpenAI, OpenAIChatCompletionsModel
 
-        model = OpenAIChatCompletionsModel(
-            model='gemini-2.0-flash',
-            openai_client=external_client
-        )
+            external_client = AsyncOpenAI(
+                api_key=GEMINI_API_KEY,
+                base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
+                timeout=30.0
+            )
 
-        return Agent(
-            name='Email Rephrase agent',
-            instructions='You are email rephrase agent. You rephrase the given email in human wordings. Do not change the meaning and just change the wordings.',
-            model=model,
-            output_type=RephraseOutput
-        )
-    except Exception as e:
-        print(f"Failed to initialize rephrase agent: {str(e)}")
-        traceback.print_exc()
-        return None
+            model = OpenAIChatCompletionsModel(
+                model=REPHRASE_MODEL,
+                openai_client=external_client
+            )
 
-rephrase_agent = setup_rephrase_agent()
+            rephrase_agent = Agent(
+                name='Email Rephrase agent',
+                instructions=REPHRASE_INSTRUCTIONS,
+                model=model,
+                output_type=RephraseOutput
+            )
+            rephrase_stream_agent = rephrase_agent.clone(name='Email Rephrase stream agent', output_type=None)
+        except Exception as e:
+            print(f"Failed to initialize rephrase agent: {str(e)}")
+            traceback.print_exc()
+        finally:
+            _rephrase_agents_loaded = True
+        return rephrase_agent
+
+async def load_rephrase_agent():
+    """setup_rephrase_agent without blocking the event loop on the first call"""
+    if _rephrase_agents_loaded or not GEMINI_API_KEY:
+        return rephrase_agent
+    return await executors.run("cpu", setup_rephrase_agent)
+
+async def run_rephrase_agent(content: str) -> str:
+    from agents import Runner
+    from agents.run import RunConfig
+
+    result = await Runner.run(
+        rephrase_agent,
+        content,
+        run_config=RunConfig(
+            model=rephrase_agent.model,
+            tracing_disabled=True
+        )
+    )
+    return result.final_output.rephrased_email
 
 async def check_unread_emails(user_id: str, max_emails: int = 10) -> List[Dict[str, Any]]:
     """Fetch recent emails (read or unread) for all email accounts of a user"""
     print(f"🔍 Starting recent email check for user_id: {user_id}, max_emails: {max_emails}")
     
-    # Get all email accounts for the user
+    # Get all email accounts for the user, skipping ones quarantined for bad credentials
     email_accounts = await email_accounts_col.find({
         "user_id": user_id,
-        "is_active": True
+        "is_active": True,
+        **account_health.available_filter()
     }).to_list(length=None)
     
     print(f"📧 Found {len(email_accounts)} active email accounts for user")
@@ -277,6 +426,7 @@ async def check_unread_emails(user_id: str, max_emails: int = 10) -> List[Dict[s
         print(f"  Account {i+1}: {acc.get('email', 'No email')} (ID: {acc.get('_id', 'No ID')})")
     
     recent_emails = []
+    login_outcomes = {}  # account _id -> None on successful login, or the auth error
     emails_lock = threading.Lock()
     
     def process_email_account(account):
@@ -286,8 +436,11 @@ async def check_unread_emails(user_id: str, max_emails: int = 10) -> List[Dict[s
         
         try:
             print(f"🔄 Connecting to IMAP server for {account_email}")
-            with MailBox("imap.gmail.com").login(account["email"], account["password"], "INBOX") as mailbox:
+            mailbox_cls = MailBox if IMAP_SSL else MailBoxUnencrypted
+            with mailbox_cls(IMAP_HOST, IMAP_PORT).login(account["email"], account["password"], "INBOX") as mailbox:
                 print(f"✅ Successfully connected to {account_email}")
+                with emails_lock:
+                    login_outcomes[account["_id"]] = None
                 
                 # Fetch recent emails (read + unread)
                 emails_found = 0
@@ -321,36 +474,54 @@ async def check_unread_emails(user_id: str, max_emails: int = 10) -> List[Dict[s
         except Exception as e:
             error_msg = str(e)
             print(f"❌ Error checking emails for {account_email}: {error_msg}")
-            if "Authentication failed" in error_msg:
+            if account_health.is_auth_error(e):
+                with emails_lock:
+                    login_outcomes[account["_id"]] = e
                 print(f"🔐 Authentication issue with {account_email}. Check password/app password.")
             elif "connection failed" in error_msg.lower():
                 print(f"🌐 Connection issue with {account_email}. Check network/IMAP settings.")
             elif "SSL" in error_msg:
                 print(f"🔒 SSL issue with {account_email}. Check port/SSL configuration.")
     
-    # Create threads for each email account
-    threads = []
-    print(f"🧵 Creating threads for {len(email_accounts)} email accounts")
-    
-    for account in email_accounts:
-        thread = threading.Thread(target=process_email_account, args=(account,))
-        thread.start()
-        threads.append(thread)
-        print(f"➡️ Started thread for account: {account.get('email', 'Unknown')}")
+    # Check every account on the IMAP pool; the event loop stays free while they run
+    print(f"🧵 Checking {len(email_accounts)} email accounts on the imap pool")
+    imap_workers = executors.pool("imap").workers
+    if len(email_accounts) > imap_workers:
+        print(f"⚠️ {len(email_accounts)} accounts but {imap_workers} imap workers (EXECUTOR_IMAP_WORKERS); "
+              f"the rest queue within the {IMAP_CHECK_TIMEOUT:.0f}s timeout")
+    checks = [asyncio.ensure_future(executors.run("imap", process_email_account, account)) for account in email_accounts]
     
-    # Wait for all threads to complete
     print("⏳ Waiting for all email accounts to be checked...")
-    for i, thread in enumerate(threads):
-        thread.join(timeout=30)
-        if thread.is_alive():
-            print(f"⏰ Thread {i+1} timed out after 30 seconds")
+    if checks:
+        done, pending = await asyncio.wait(checks, timeout=IMAP_CHECK_TIMEOUT)
+        for i, check in enumerate(checks):
+            if check in pending:
+                # a check still queued never starts; one already running keeps its thread
+                # and its late results are simply not returned
+                check.cancel()
+                print(f"⏰ Account check {i+1} timed out after {IMAP_CHECK_TIMEOUT:.0f} seconds")
+            else:
+                print(f"✅ Account check {i+1} completed successfully")
+    
+    # Late checks may still be writing; read the results under the lock
+    with emails_lock:
+        found_emails = list(recent_emails)
+        outcomes = dict(login_outcomes)
+    
+    # Remember login outcomes so bad credentials are skipped until their backoff expires
+    for account in email_accounts:
+        if account["_id"] not in outcomes:
+            continue
+        error = outcomes[account["_id"]]
+        if error is None:
+            await account_health.record_auth_success(email_accounts_col, account)
         else:
-            print(f"✅ Thread {i+1} completed successfully")
+            await account_health.record_auth_failure(email_accounts_col, account, error)
     
     # Sort by time (newest first) and limit to max_emails
-    print(f"📊 Sorting {len(recent_emails)} found emails by time")
-    recent_emails.sort(key=lambda x: x.get("time", ""), reverse=True)
-    result = recent_emails[:max_emails]
+    print(f"📊 Sorting {len(found_emails)} found emails by time")
+    found_emails.sort(key=lambda x: x.get("time", ""), reverse=True)
+    result = found_emails[:max_emails]
     
     print(f"🎉 Recent email check completed. Returning {len(result)} emails")
     return result
@@ -358,20 +529,6 @@ async def check_unread_emails(user_id: str, max_emails: int = 10) -> List[Dict[s
 # --------------------
 # Email Account Management
 # --------------------
-async def get_available_email_accounts(user_id: str) -> List[Dict[str, Any]]:
-    """Get all active email accounts for a specific user (no daily limit checks)"""
-    # Get all active accounts
-    cursor = email_accounts_col.find({
-        "user_id": user_id,
-        "is_active": True
-    })
-    
-    accounts = []
-    async for acc in cursor:
-        accounts.append(acc)
-    
-    return accounts
-
 async def update_email_account_usage(account_id: ObjectId, emails_sent: int):
     """Update the count of emails sent for an account - now a no-op"""
     # No longer tracking usage, so this function does nothing
@@ -396,7 +553,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     
     # Debug password verification
     print(f"Stored hash: {user.get('password')}")  # Debug
-    password_valid = verify_password(form_data.password, user["password"])
+    password_valid = await verify_password(form_data.password, user["password"])
     print(f"Password valid: {password_valid}")  # Debug
     
     if not password_valid:
@@ -406,9 +563,16 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
             detail="Invalid email or password",
         )
     
-    access_token = create_access_token({"sub": user["email"]})
+    access_token = create_access_token({"sub": user["email"], "tv": user_cache.token_version(user)})
     return {"access_token": access_token, "token_type": "bearer"}
 
+@app.post("/logout-all")
+async def logout_all(current_user: dict = Depends(get_current_user)):
+    """Revoke every token issued to the current user, including this one"""
+    await users_collection.update_one({"_id": current_user["_id"]}, {"$inc": {"token_version": 1}})
+    invalidate_user(current_user["email"])
+    return {"status": "revoked"}
+
 @app.post("/signup", response_model=UserOut)
 async def signup(user: UserCreate):
     # Check if user already exists
@@ -420,244 +584,23 @@ async def signup(user: UserCreate):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash(user.password)
     user_dict = {
         "email": user.email,
         "password": hashed_password,
         "created_at": datetime.utcnow()
     }
     
-    result = await users_collection.insert_one(user_dict)
+    try:
+        result = await users_collection.insert_one(user_dict)
+    except DuplicateKeyError:
+        # unique users.email index catches concurrent signups that both passed the check above
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
     return {"id": str(result.inserted_id), "email": user.email}
 
-# --------------------
-# Email sending helpers
-# --------------------
-def build_message(
-    sender_email: str, 
-    recipient_email: str, 
-    subject: str, 
-    body: str, 
-    sender_name: Optional[str] = None,
-    attachments: Optional[List[Dict[str, str]]] = None
-) -> str:
-    msg = MIMEMultipart()
-    if sender_name:
-        msg["From"] = formataddr((sender_name, sender_email))
-    else:
-        msg["From"] = sender_email
-    msg["To"] = recipient_email
-    msg["Subject"] = subject
-    
-    # Add body
-    msg.attach(MIMEText(body, "plain"))
-    
-    # Add attachments
-    if attachments:
-        for attachment in attachments:
-            try:
-                part = MIMEBase("application", "octet-stream")
-                part.set_payload(base64.b64decode(attachment["content"]))
-                encoders.encode_base64(part)
-                part.add_header(
-                    "Content-Disposition",
-                    f"attachment; filename={attachment['filename']}",
-                )
-                msg.attach(part)
-            except Exception as e:
-                print(f"Failed to attach {attachment['filename']}: {str(e)}")
-                continue
-    
-    return msg.as_string()
-
-def send_bulk_via_smtp_blocking(
-    email_accounts: List[Dict[str, Any]], 
-    messages: List[Dict[str, Any]], 
-    delay: float = 1.0
-) -> Dict[str, Any]:
-    """Send emails using multiple accounts with round-robin distribution (no daily limits)"""
-    sent = []
-    failed = []
-    
-    # Create SMTP connections for each account
-    connections = {}
-    for acc in email_accounts:
-        try:
-            ctx = ssl.create_default_context()
-            server = smtplib.SMTP_SSL(acc.get("smtp_host", SMTP_HOST), acc.get("smtp_port", SMTP_PORT), context=ctx)
-            server.login(acc["email"], acc["password"])
-            connections[str(acc["_id"])] = server
-        except Exception as e:
-            print(f"Failed to connect with account {acc['email']}: {str(e)}")
-            # Remove failed account from pool
-            email_accounts = [a for a in email_accounts if a["_id"] != acc["_id"]]
-    
-    if not connections:
-        raise Exception("No valid email accounts available")
-    
-    # Round-robin distribution of emails to accounts
-    account_ids = list(connections.keys())
-    current_account_index = 0
-    
-    for i, m in enumerate(messages):
-        if not email_accounts:
-            break  # No accounts left
-            
-        # Select next account in round-robin fashion
-        account_id = account_ids[current_account_index]
-        account = next((acc for acc in email_accounts if str(acc["_id"]) == account_id), None)
-        
-        if not account:
-            continue
-            
-        try:
-            msgstr = build_message(
-                account["email"], 
-                m["to"], 
-                m["subject"], 
-                m["body"], 
-                sender_name=account.get("sender_name"),
-                attachments=m.get("attachments")
-            )
-            connections[account_id].sendmail(account["email"], m["to"], msgstr)
-            sent.append({"email": m["to"], "account_id": str(account["_id"])})
-            print(f"Sent email to {m['to']} using account {account['email']}")
-        except Exception as e:
-            error_msg = str(e)
-            print(f"Failed to send to {m.get('to')} using account {account['email']}: {error_msg}")
-            failed.append({"email": m.get("to"), "error": error_msg, "account_id": str(account["_id"])})
-            
-            # If connection failed, remove this account from pool
-            try:
-                connections[account_id].quit()
-            except:
-                pass
-            del connections[account_id]
-            email_accounts = [a for a in email_accounts if str(a["_id"]) != account_id]
-            account_ids = list(connections.keys())
-            if not account_ids:
-                break
-            current_account_index = current_account_index % len(account_ids)
-        
-        # Move to next account
-        current_account_index = (current_account_index + 1) % len(account_ids)
-        
-        if delay and delay > 0:
-            time.sleep(delay)
-    
-    # Close all connections
-    for conn in connections.values():
-        try:
-            conn.quit()
-        except:
-            pass
-    
-    return {"sent": sent, "failed": failed}
-
-async def mark_leads_sent(lead_ids: List[str], user_id: str):
-    oids = []
-    for lid in lead_ids:
-        try:
-            oids.append(ObjectId(lid))
-        except Exception:
-            continue
-    if not oids:
-        return
-    await leads_col.update_many(
-        {"_id": {"$in": oids}, "user_id": user_id}, 
-        {"$set": {"mail_sent": True, "last_mailed_at": datetime.utcnow()}}
-    )
-
-async def background_send(template_id: str, lead_ids: List[str], user_id: str, attachments: Optional[List[Dict[str, str]]] = None, email_account_ids: Optional[List[str]] = None):
-    tmpl = await templates_col.find_one({"_id": oid(template_id), "user_id": user_id})
-    if not tmpl:
-        return {"status": "template_not_found"}
-
-    # Convert lead IDs to ObjectIds
-    lead_object_ids = []
-    for lid in lead_ids:
-        try:
-            if ObjectId.is_valid(lid):
-                lead_object_ids.append(ObjectId(lid))
-        except Exception:
-            continue
-    
-    if not lead_object_ids:
-        return {"status": "no_valid_leads"}
-    
-    q = {"_id": {"$in": lead_object_ids}, "user_id": user_id}
-    leads_cursor = leads_col.find(q)
-    leads = []
-    async for l in leads_cursor:
-        leads.append(l)
-
-    messages = []
-    valid_leads = []
-    for l in leads:
-        recipient = l.get("email")
-        # Skip leads without email or with invalid email
-        if not recipient or not is_valid_email(recipient):
-            continue
-        
-        body = tmpl.get("content", "")
-        first = l["owner_name"].split()[0] if l.get("owner_name") else ""
-        body = body.replace("{First Name}", first)
-        body = body.replace("{Company}", l.get("company_name", ""))
-        subject = tmpl.get("subject", "")
-        
-        messages.append({
-            "to": recipient, 
-            "subject": subject, 
-            "body": body,
-            "attachments": attachments
-        })
-        valid_leads.append(l)
-
-    if not messages:
-        return {"status": "no_valid_recipients"}
-
-    # Get available email accounts
-    if email_account_ids:
-        # Use specific accounts requested
-        account_oids = [ObjectId(acc_id) for acc_id in email_account_ids if ObjectId.is_valid(acc_id)]
-        email_accounts = await email_accounts_col.find({
-            "_id": {"$in": account_oids},
-            "user_id": user_id,
-            "is_active": True
-        }).to_list(length=None)
-    else:
-        # Use all available accounts for this user
-        email_accounts = await get_available_email_accounts(user_id)
-    
-    if not email_accounts:
-        return {"status": "no_valid_accounts", "message": "No active email accounts available"}
-
-    result = await asyncio.to_thread(
-        send_bulk_via_smtp_blocking, 
-        email_accounts, 
-        messages, 
-        SMTP_DELAY
-    )
-
-    # Update tracking of sent emails
-    sent_emails = [s["email"] for s in result.get("sent", [])]
-    sent_lead_ids = [str(l["_id"]) for l in valid_leads if l.get("email") in sent_emails]
-    if sent_lead_ids:
-        await mark_leads_sent(sent_lead_ids, user_id)
-
-    await mail_logs_col.insert_one({
-        "template_id": template_id,
-        "user_id": user_id,
-        "sent_count": len(result.get("sent", [])),
-        "failed": result.get("failed", []),
-        "created_at": datetime.utcnow(),
-        "had_attachments": bool(attachments),
-        "accounts_used": [str(acc["_id"]) for acc in email_accounts],
-        "total_leads_processed": len(leads),
-        "valid_leads_count": len(valid_leads)
-    })
-    return result
-
 # --------------------
 # API Endpoints (All require authentication)
 # --------------------
@@ -666,15 +609,15 @@ async def rephrase_email(request: RephraseRequest, current_user: dict = Depends(
     print(f"Rephrase request received from user: {current_user['email']}")  # Debug
     print(f"Requested template ID: {request.template_id}")  # Debug
     
-    if not rephrase_agent:
+    if not await load_rephrase_agent():
         raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVERAGE,
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Rephrasing service not configured"
         )
     
     try:
         # Verify template exists first and belongs to user
-        template = await templates_col.find_one({"_id": oid(request.template_id), "user_id": current_user["_id"]})
+        template = await templates_col.find_one({"_id": oid(request.template_id), "user_id": str(current_user["_id"])})
         print(f"Template lookup result: {template is not None}")  # Debug
         
         if not template:
@@ -683,33 +626,32 @@ async def rephrase_email(request: RephraseRequest, current_user: dict = Depends(
                 detail="Template not found"
             )
 
-        # Run the rephrase agent
-        result = await Runner.run(
-            rephrase_agent,
-            request.content,
-            run_config=RunConfig(
-                model=rephrase_agent.model,
-                tracing_disabled=True
-            )
+        # Identical input + model + instructions reuse the stored result unless a fresh variant is asked for
+        key = rephrase_cache.cache_key(request.content, REPHRASE_MODEL, REPHRASE_INSTRUCTIONS)
+        rephrased_content, cached = await rephrase_cache.get_or_compute(
+            rephrase_cache_col, key, REPHRASE_MODEL, lambda: run_rephrase_agent(request.content), fresh=request.fresh
         )
-        
-        rephrased_content = result.final_output.rephrased_email
+        print(f"Rephrase {'served from cache' if cached else 'generated'} for key {key[:12]}")  # Debug
         
         # Update the template in the database
         update_result = await templates_col.update_one(
-            {"_id": oid(request.template_id), "user_id": current_user["_id"]},
+            {"_id": oid(request.template_id), "user_id": str(current_user["_id"])},
             {"$set": {"content": rephrased_content}}
         )
         
-        if update_result.modified_count == 0:
+        # a cached answer can equal what is already stored, so only a missing template is an error
+        if update_result.matched_count == 0:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Template not updated"
             )
+        if update_result.modified_count:
+            await http_cache.bump(cache_versions_col, str(current_user["_id"]), "templates")
         
         return {
             "success": True,
             "rephrased_content": rephrased_content,
+            "cached": cached,
             "template": serialize_doc(template)
         }
         
@@ -723,19 +665,103 @@ async def rephrase_email(request: RephraseRequest, current_user: dict = Depends(
             detail=f"Failed to rephrase email: {str(e)}"
         )
 
+@app.post("/rephrase-email/stream")
+async def rephrase_email_stream(request: RephraseRequest, current_user: dict = Depends(get_current_user)):
+    """
+    Same as /rephrase-email, streamed as server-sent events: `delta` events carry
+    text as the model produces it, then `done` carries the full text once it is
+    saved to the template (or `error`). A cached result arrives as a single delta.
+    """
+    await load_rephrase_agent()
+    if not rephrase_stream_agent:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Rephrasing service not configured")
+    user_id = str(current_user["_id"])
+    template = await templates_col.find_one({"_id": oid(request.template_id), "user_id": user_id}, {"_id": 1})
+    if not template:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Template not found")
+
+    key = rephrase_cache.cache_key(request.content, REPHRASE_MODEL, REPHRASE_INSTRUCTIONS)
+    cached_content = None if request.fresh else await rephrase_cache.get(rephrase_cache_col, key)
+
+    async def stream():
+        rephrased_content = cached_content
+        if rephrased_content is not None:
+            yield events.format_sse("delta", {"text": rephrased_content})
+        else:
+            started = time.perf_counter()
+            first_token_ms = None
+            from agents import Runner
+            from agents.run import RunConfig
+
+            result = Runner.run_streamed(
+                rephrase_stream_agent,
+                request.content,
+                run_config=RunConfig(model=rephrase_stream_agent.model, tracing_disabled=True)
+            )
+            try:
+                async for event in result.stream_events():
+                    if event.type != "raw_response_event" or getattr(event.data, "type", None) != "response.output_text.delta":
+                        continue
+                    if first_token_ms is None:
+                        first_token_ms = (time.perf_counter() - started) * 1000
+                    yield events.format_sse("delta", {"text": event.data.delta})
+                rephrased_content = str(result.final_output or "").strip()
+            except Exception as e:
+                print(f"Rephrase stream error: {str(e)}")
+                yield events.format_sse("error", {"detail": f"Failed to rephrase email: {str(e)}"})
+                return
+            finally:
+                # client went away (or the model failed): stop generating
+                if not result.is_complete:
+                    result.cancel()
+            print(f"Rephrase streamed in {time.perf_counter() - started:.1f}s, first token after {first_token_ms or 0:.0f} ms")  # Debug
+            if not rephrased_content:
+                yield events.format_sse("error", {"detail": "Empty rephrase result"})
+                return
+            await rephrase_cache.put(rephrase_cache_col, key, rephrased_content, REPHRASE_MODEL)
+
+        update_result = await templates_col.update_one(
+            {"_id": template["_id"], "user_id": user_id},
+            {"$set": {"content": rephrased_content}}
+        )
+        if update_result.matched_count == 0:
+            yield events.format_sse("error", {"detail": "Template not updated"})
+            return
+        if update_result.modified_count:
+            await http_cache.bump(cache_versions_col, user_id, "templates")
+        yield events.format_sse("done", {
+            "template_id": request.template_id,
+            "rephrased_content": rephrased_content,
+            "cached": cached_content is not None,
+        })
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+async def load_templates(user_id: str) -> List[Dict[str, Any]]:
+    cursor = templates_col.find({"user_id": user_id}, TEMPLATE_LIST_PROJECTION).sort("created_at", -1)
+    return await cursor.to_list(length=None)
+
 @app.get("/templates", response_model=List[TemplateOut])
-async def get_templates(current_user: dict = Depends(get_current_user)):
-    cursor = templates_col.find({"user_id": str(current_user["_id"])}).sort("created_at", -1)
-    docs = []
-    async for d in cursor:
-        docs.append(serialize_doc(d))
-    return docs
+async def get_templates(request: Request, current_user: dict = Depends(get_current_user)):
+    user_id = str(current_user["_id"])
+    tag, not_modified = await conditional_get(request, user_id, "templates")
+    if not_modified:
+        return not_modified
+    return lean_response(await load_templates(user_id), headers=http_cache.headers(tag))
 
 @app.get("/templates/{template_id}", response_model=TemplateOut)
-async def get_template(template_id: str, current_user: dict = Depends(get_current_user)):
-    t = await templates_col.find_one({"_id": oid(template_id), "user_id": str(current_user["_id"])})
+async def get_template(template_id: str, request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    user_id = str(current_user["_id"])
+    tag, not_modified = await conditional_get(request, user_id, "templates", template_id)
+    if not_modified:
+        return not_modified
+    t = await templates_col.find_one({"_id": oid(template_id), "user_id": user_id})
     if not t:
         raise HTTPException(status_code=404, detail="Template not found")
+    response.headers.update(http_cache.headers(tag))
     return serialize_doc(t)
 
 @app.post("/templates", response_model=TemplateOut, status_code=status.HTTP_201_CREATED)
@@ -744,6 +770,7 @@ async def create_template(payload: TemplateIn, current_user: dict = Depends(get_
     doc["created_at"] = datetime.utcnow()
     doc["user_id"] = str(current_user["_id"])
     r = await templates_col.insert_one(doc)
+    await http_cache.bump(cache_versions_col, doc["user_id"], "templates")
     created = await templates_col.find_one({"_id": r.inserted_id})
     return serialize_doc(created)
 
@@ -753,33 +780,167 @@ async def update_template(template_id: str, payload: TemplateIn, current_user: d
     res = await templates_col.update_one({"_id": oid(template_id), "user_id": str(current_user["_id"])}, update_doc)
     if res.matched_count == 0:
         raise HTTPException(status_code=404, detail="Template not found")
+    if res.modified_count:
+        await http_cache.bump(cache_versions_col, str(current_user["_id"]), "templates")
     new = await templates_col.find_one({"_id": oid(template_id)})
     return serialize_doc(new)
 
-@app.get("/leads", response_model=List[LeadOut])
-async def get_leads(limit: int = 100, sent: Optional[bool] = None, current_user: dict = Depends(get_current_user)):
-    query = {"user_id": str(current_user["_id"])}
-    if sent is not None:
-        query["mail_sent"] = sent
+@app.post("/templates/{template_id}/variants")
+async def generate_template_variants(template_id: str, payload: VariantsRequest, current_user: dict = Depends(get_current_user)):
+    """Generate `count` reworded bodies concurrently and add them to the template's variant pool."""
+    if not await load_rephrase_agent():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Rephrasing service not configured")
+    user_id = str(current_user["_id"])
+    tmpl = await templates_col.find_one({"_id": oid(template_id), "user_id": user_id})
+    if not tmpl:
+        raise HTTPException(status_code=404, detail="Template not found")
+
+    content = tmpl.get("content", "")
+    current = [] if payload.replace else rephrase_variants.pool_for(tmpl)
+    started = time.perf_counter()
+    variants, errors = await rephrase_variants.generate(lambda: run_rephrase_agent(content), payload.count,
+                                                        existing=current, source=content)
+    print(f"🧬 Generated {len(variants)}/{payload.count} variants for template {template_id} "
+          f"in {time.perf_counter() - started:.1f}s ({len(errors)} failed)")
+    if not variants and errors:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Variant generation failed: {errors[0]}")
+
+    source = rephrase_variants.source_hash(content)
+    if current:
+        update = {"$push": {"variants": {"$each": variants, "$slice": -rephrase_variants.VARIANT_POOL_MAX}}}
     else:
-        query["mail_sent"] = False  # Default to only unsent leads
-        
-    cursor = leads_col.find(query).sort("created_at", -1).limit(limit)
-    out = []
-    async for d in cursor:
-        doc = serialize_doc(d)
-        doc.setdefault("mail_sent", False)
-        out.append(doc)
-    return out
+        # replacing, or the stored pool belongs to an older version of the content
+        update = {"$set": {"variants": variants[-rephrase_variants.VARIANT_POOL_MAX:], "variants_source": source}}
+    update.setdefault("$set", {})["variants_updated_at"] = datetime.utcnow()
+    # only write if the content did not change while the model was running
+    res = await templates_col.update_one({"_id": tmpl["_id"], "user_id": user_id, "content": content}, update)
+    if res.matched_count == 0:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Template changed while generating variants")
+    await http_cache.bump(cache_versions_col, user_id, "templates")
+
+    saved = await templates_col.find_one({"_id": tmpl["_id"]}, {"variants": 1, "variants_source": 1, "content": 1})
+    return {
+        "template_id": template_id,
+        "generated": len(variants),
+        "failed": len(errors),
+        "errors": errors,
+        "variants": rephrase_variants.pool_for(saved),
+    }
+
+@app.get("/templates/{template_id}/variants")
+async def get_template_variants(template_id: str, current_user: dict = Depends(get_current_user)):
+    tmpl = await templates_col.find_one({"_id": oid(template_id), "user_id": str(current_user["_id"])},
+                                        {"variants": 1, "variants_source": 1, "content": 1})
+    if not tmpl:
+        raise HTTPException(status_code=404, detail="Template not found")
+    return {"template_id": template_id, "variants": rephrase_variants.pool_for(tmpl)}
+
+@app.delete("/templates/{template_id}/variants")
+async def clear_template_variants(template_id: str, current_user: dict = Depends(get_current_user)):
+    res = await templates_col.update_one(
+        {"_id": oid(template_id), "user_id": str(current_user["_id"])},
+        {"$unset": {"variants": "", "variants_source": "", "variants_updated_at": ""}}
+    )
+    if res.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Template not found")
+    if res.modified_count:
+        await http_cache.bump(cache_versions_col, str(current_user["_id"]), "templates")
+    return {"template_id": template_id, "variants": []}
+
+def build_leads_query(
+    user_id: str,
+    sent: Optional[bool] = False,
+    source: Optional[str] = None,
+    has_email: Optional[bool] = None,
+    query: Optional[str] = None
+) -> Dict[str, Any]:
+    """Server-side lead filters shared by the listing endpoints"""
+    q: Dict[str, Any] = {"user_id": user_id}
+    if sent is not None:
+        q["mail_sent"] = sent
+    if source:
+        q["source"] = source
+    if has_email is True:
+        q["email"] = {"$nin": [None, ""]}
+    elif has_email is False:
+        q["email"] = {"$in": [None, ""]}
+    if query and query.strip():
+        pattern = {"$regex": re.escape(query.strip()), "$options": "i"}
+        q["$and"] = [{"$or": [{"company_name": pattern}, {"email": pattern}, {"owner_name": pattern}]}]
+    return q
+
+@app.get("/leads", response_model=List[LeadOut])
+async def get_leads(
+    limit: int = 100,
+    sent: Optional[bool] = None,
+    cursor: Optional[str] = None,
+    source: Optional[str] = None,
+    has_email: Optional[bool] = None,
+    query: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Newest-first page of leads. Pass the X-Next-Cursor response header back as `cursor` for the next page."""
+    limit = max(1, min(limit, LEADS_PAGE_SIZE_MAX))
+    q = build_leads_query(
+        str(current_user["_id"]),
+        sent=False if sent is None else sent,  # Default to only unsent leads
+        source=source,
+        has_email=has_email,
+        query=query
+    )
+    try:
+        after = pagination.keyset_filter(cursor)
+    except pagination.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if after:
+        q.setdefault("$and", []).append(after)
+
+    # one extra document tells us whether another page exists
+    docs = await leads_col.find(q, LEAD_LIST_PROJECTION).sort(pagination.SORT).limit(limit + 1).to_list(length=limit + 1)
+    headers = {}
+    if len(docs) > limit:
+        docs = docs[:limit]
+        headers["X-Next-Cursor"] = pagination.encode_cursor(docs[-1])
+
+    for d in docs:
+        d.setdefault("mail_sent", False)
+    return lean_response(docs, headers)
 
 @app.get("/leads/count")
 async def leads_count(sent: Optional[bool] = None, current_user: dict = Depends(get_current_user)):
-    query = {"user_id": str(current_user["_id"])}
-    if sent is not None:
-        query["mail_sent"] = sent
-        
-    count = await leads_col.count_documents(query)
-    return {"count": count}
+    counts = await lead_counters.get_counts(leads_col, lead_counters_col, str(current_user["_id"]))
+    if sent is None:
+        return {"count": counts["total"]}
+    return {"count": counts["sent"] if sent else counts["unsent"]}
+
+@app.get("/leads/export")
+async def export_leads(
+    format: str = "csv",
+    sent: Optional[bool] = None,
+    source: Optional[str] = None,
+    has_email: Optional[bool] = None,
+    query: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream every matching lead as CSV, NDJSON or Parquet (newest first)"""
+    if format not in lead_export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(lead_export.FORMATS)}")
+    if format == "parquet" and not lead_export.parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires the pyarrow package")
+    q = build_leads_query(str(current_user["_id"]), sent=sent, source=source, has_email=has_email, query=query)
+    cursor = leads_col.find(q, lead_export.PROJECTION).sort(pagination.SORT).batch_size(lead_export.BATCH_SIZE)
+    media_type, extension = lead_export.FORMATS[format]
+    filename = f"leads-{datetime.utcnow():%Y%m%d-%H%M%S}.{extension}"
+    return StreamingResponse(
+        lead_export.stream(format, cursor),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/leads/counters")
+async def get_lead_counters(current_user: dict = Depends(get_current_user)):
+    """Total, unsent, sent, with-email and per-source lead counts"""
+    return await lead_counters.get_counts(leads_col, lead_counters_col, str(current_user["_id"]))
 
 @app.post("/leads", response_model=LeadOut, status_code=status.HTTP_201_CREATED)
 async def create_lead(payload: LeadIn, current_user: dict = Depends(get_current_user)):
@@ -787,9 +948,9 @@ async def create_lead(payload: LeadIn, current_user: dict = Depends(get_current_
     doc["mail_sent"] = False
     doc["created_at"] = datetime.utcnow()
     doc["user_id"] = str(current_user["_id"])
-    r = await leads_col.insert_one(doc)
-    created = await leads_col.find_one({"_id": r.inserted_id})
-    return serialize_doc(created)
+    await leads_col.insert_one(doc)  # sets doc["_id"]
+    await record_new_leads([doc])
+    return serialize_doc(doc)
 
 @app.post("/leads/manual", response_model=LeadOut, status_code=status.HTTP_201_CREATED)
 async def create_lead_manual(payload: LeadIn, current_user: dict = Depends(get_current_user)):
@@ -809,9 +970,197 @@ async def create_lead_manual(payload: LeadIn, current_user: dict = Depends(get_c
     doc["user_id"] = str(current_user["_id"])
     doc["source"] = "manual_entry"
     
-    r = await leads_col.insert_one(doc)
-    created = await leads_col.find_one({"_id": r.inserted_id})
-    return serialize_doc(created)
+    await leads_col.insert_one(doc)  # sets doc["_id"]
+    await record_new_leads([doc])
+    return serialize_doc(doc)
+
+# Fields a bulk operation may set on a lead
+BULK_LEAD_FIELDS = set(LeadIn.__fields__) | {"source", "website"}
+
+def parse_bulk_body(body: bytes, content_type: str):
+    """Yield operations from an NDJSON body or a JSON array; unparseable lines yield an error string"""
+    text = body.decode("utf-8", errors="replace")
+    if "ndjson" not in content_type and "jsonl" not in content_type or text.lstrip().startswith("["):
+        try:
+            items = json.loads(text or "[]")
+        except ValueError as e:
+            yield f"Invalid JSON body: {e}"
+            return
+        if not isinstance(items, list):
+            yield "Expected a JSON array of operations"
+            return
+        yield from items
+        return
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield f"Invalid JSON line: {e}"
+
+def bulk_lead_fields(fields: Any) -> Dict[str, Any]:
+    if not isinstance(fields, dict):
+        raise ValueError("lead fields must be an object")
+    unknown = set(fields) - BULK_LEAD_FIELDS - {"mail_sent"}
+    if unknown:
+        raise ValueError(f"Unknown lead fields: {', '.join(sorted(unknown))}")
+    clean = LeadIn(**{k: v for k, v in fields.items() if k in LeadIn.__fields__}).dict(exclude_unset=True)
+    if fields.get("email") and not clean.get("email"):
+        raise ValueError(f"Invalid email: {fields['email']}")
+    for key in ("source", "website"):
+        if key in fields:
+            clean[key] = None if fields[key] is None else str(fields[key])
+    if "mail_sent" in fields:
+        if not isinstance(fields["mail_sent"], bool):
+            raise ValueError("mail_sent must be true or false")
+        clean["mail_sent"] = fields["mail_sent"]
+    return clean
+
+def build_bulk_op(op: Any, user_id: str, now: datetime):
+    """Turn one request operation into (write model, new lead document or None); raises ValueError"""
+    if isinstance(op, str):
+        raise ValueError(op)
+    if not isinstance(op, dict):
+        raise ValueError("operation must be an object")
+    kind = op.get("op")
+    if kind == "upsert":
+        fields = bulk_lead_fields(op.get("lead"))
+        fields.pop("mail_sent", None)  # sending state is only changed by "update"
+        if not fields.get("email") and not fields.get("company_name"):
+            raise ValueError("upsert needs an email or a company_name")
+        key = {"user_id": user_id, "email": fields.pop("email", None), "company_name": fields.pop("company_name", None)}
+        on_insert = {"mail_sent": False, "created_at": now, "source": fields.pop("source", "bulk_api")}
+        update = {"$setOnInsert": on_insert}
+        if fields:
+            update["$set"] = fields
+        return UpdateOne(key, update, upsert=True), {**key, **on_insert, **fields}
+    if kind in ("update", "delete"):
+        if not ObjectId.is_valid(str(op.get("id", ""))):
+            raise ValueError("a valid lead id is required")
+        match = {"_id": ObjectId(op["id"]), "user_id": user_id}
+        if kind == "delete":
+            return DeleteOne(match), None
+        fields = bulk_lead_fields(op.get("set"))
+        if not fields:
+            raise ValueError("update needs at least one field in 'set'")
+        return UpdateOne(match, {"$set": fields}), None
+    raise ValueError("op must be one of upsert, update, delete")
+
+@app.post("/leads/bulk")
+async def bulk_leads(request: Request, current_user: dict = Depends(get_current_user)):
+    """
+    Apply many lead upserts, updates and deletes in chunked unordered bulk writes.
+
+    Body: NDJSON (Content-Type: application/x-ndjson) or a JSON array of
+    {"op": "upsert", "lead": {...}}, {"op": "update", "id": "...", "set": {...}}
+    or {"op": "delete", "id": "..."}. Upserts are keyed on (email, company_name).
+    The response is NDJSON: one result line per chunk, then a summary line.
+    """
+    user_id = str(current_user["_id"])
+    # read the body up front: the request stream can't be consumed while the response streams
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    chunk_size = max(1, LEADS_BULK_CHUNK)
+
+    async def run_chunk(number: int, first_index: int, ops: List[Any]) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        writes, new_docs, errors, positions = [], [], [], []
+        for offset, op in enumerate(ops):
+            try:
+                write, new_doc = build_bulk_op(op, user_id, now)
+            except (ValueError, ValidationError) as e:
+                errors.append({"index": first_index + offset, "error": str(e)})
+                continue
+            writes.append(write)
+            new_docs.append(new_doc)
+            positions.append(first_index + offset)
+
+        result = {"chunk": number, "received": len(ops), "upserted": 0, "matched": 0, "modified": 0, "deleted": 0}
+        upserted: Dict[int, Any] = {}
+        if writes:
+            try:
+                r = await leads_col.bulk_write(writes, ordered=False)
+                details = r.bulk_api_result
+            except BulkWriteError as bwe:
+                details = bwe.details
+                for err in details.get("writeErrors", []):
+                    errors.append({"index": positions[err["index"]], "error": err.get("errmsg", "write failed")})
+            upserted = {u["index"]: u["_id"] for u in details.get("upserted", [])}
+            result.update(
+                upserted=len(upserted),
+                matched=details.get("nMatched", 0),
+                modified=details.get("nModified", 0),
+                deleted=details.get("nRemoved", 0),
+            )
+            await record_new_leads([new_docs[i] for i in upserted if new_docs[i] is not None])
+        result["errors"] = sorted(errors, key=lambda e: e["index"])
+        return result
+
+    async def results():
+        totals = {"ops": 0, "upserted": 0, "matched": 0, "modified": 0, "deleted": 0, "errors": 0}
+        chunk, number, end = [], 0, object()
+        ops = parse_bulk_body(body, content_type)
+        while True:
+            op = next(ops, end)
+            if op is not end:
+                chunk.append(op)
+            if chunk and (len(chunk) >= chunk_size or op is end):
+                number += 1
+                r = await run_chunk(number, totals["ops"], chunk)
+                totals["ops"] += r["received"]
+                for key in ("upserted", "matched", "modified", "deleted"):
+                    totals[key] += r[key]
+                totals["errors"] += len(r["errors"])
+                chunk = []
+                yield json.dumps(r, default=str) + "\n"
+            if op is end:
+                break
+        if totals["modified"] or totals["deleted"]:
+            # updates may flip mail_sent or clear emails and deletes shrink the totals: recount once
+            await lead_counters.reconcile(leads_col, lead_counters_col, user_id)
+            await publish_counts(user_id)
+        yield json.dumps({"done": True, "chunks": number, **totals}) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@app.post("/leads/import")
+async def import_leads_file(
+    file: UploadFile = File(...),
+    source: str = Form("file_import"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Import a CSV (header row required) or NDJSON file of leads.
+
+    Rows are parsed as a stream and upserted in batches, skipping leads whose
+    email (or company name, when there is no email) the user already has.
+    The response is NDJSON: a progress line per batch, then a summary line.
+    """
+    user_id = str(current_user["_id"])
+    fmt = lead_import.detect_format(file.filename, file.content_type)
+    # the upload is spooled to disk by the form parser, which closes it when the endpoint
+    # returns; take over the handle so it stays readable while the response streams
+    upload, file.file = file.file, io.BytesIO()
+
+    async def chunks():
+        while True:
+            chunk = await executors.run("cpu", upload.read, 64 * 1024)
+            if not chunk:
+                break
+            yield chunk
+
+    async def progress():
+        try:
+            async for line in lead_import.import_leads(
+                leads_col, user_id, chunks(), fmt=fmt, source=source,
+                batch_size=max(1, LEADS_IMPORT_BATCH), on_inserted=record_new_leads
+            ):
+                yield json.dumps(line) + "\n"
+        finally:
+            upload.close()
+
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
 
 @app.post("/send-emails")
 async def send_emails(payload: SendEmailsPayload, background_tasks: BackgroundTasks, current_user: dict = Depends(get_current_user)):
@@ -824,7 +1173,11 @@ async def send_emails(payload: SendEmailsPayload, background_tasks: BackgroundTa
 
     lead_ids = payload.lead_ids or []
     if not lead_ids:
-        cursor = leads_col.find({"user_id": str(current_user["_id"]), "mail_sent": False}).sort("created_at", 1).limit(100)
+        cursor = leads_col.find({
+            "user_id": str(current_user["_id"]),
+            "mail_sent": False,
+            "email_status": {"$nin": UNDELIVERABLE_STATUSES}
+        }).sort("created_at", 1).limit(100)
         lead_ids = []
         async for l in cursor:
             lead_ids.append(str(l["_id"]))
@@ -837,6 +1190,15 @@ async def send_emails(payload: SendEmailsPayload, background_tasks: BackgroundTa
     if payload.attachments:
         attachments = [a.dict() for a in payload.attachments]
 
+    if jobs.WORKER_MODE == "queue":
+        job_id = await jobs.enqueue(jobs_col, "send", str(current_user["_id"]), {
+            "template_id": payload.template_id,
+            "lead_ids": lead_ids,
+            "attachments": attachments,
+            "email_account_ids": payload.email_account_ids,
+        })
+        return {"status": "queued", "leads_count": len(lead_ids), "job_id": job_id}
+
     background_tasks.add_task(
         background_send, 
         payload.template_id, 
@@ -847,21 +1209,40 @@ async def send_emails(payload: SendEmailsPayload, background_tasks: BackgroundTa
     )
     return {"status": "queued", "leads_count": len(lead_ids)}
 
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Status of a send or scrape job enqueued for the workers (WORKER_MODE=queue)."""
+    job = await jobs_col.find_one({"_id": oid(job_id), "user_id": str(current_user["_id"])})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return jobs.public(job)
+
 # --------------------
 # Email Accounts Endpoints
 # --------------------
-@app.get("/email-accounts", response_model=List[EmailAccountOut])
-async def get_email_accounts(active_only: bool = True, current_user: dict = Depends(get_current_user)):
-    query = {"user_id": str(current_user["_id"])}
+async def load_email_accounts(user_id: str, active_only: bool = True) -> List[Dict[str, Any]]:
+    query = {"user_id": user_id}
     if active_only:
         query["is_active"] = True
         
-    cursor = email_accounts_col.find(query).sort("created_at", -1)
-    accounts = []
-    async for acc in cursor:
-        accounts.append(serialize_doc(acc))
+    cursor = email_accounts_col.find(query, EMAIL_ACCOUNT_LIST_PROJECTION).sort("created_at", -1)
+    accounts = await cursor.to_list(length=None)
+    for acc in accounts:
+        acc["health"] = account_health.health_state(acc)
+        acc.pop("auth_health", None)
+        acc.setdefault("sender_name", None)
+        acc.setdefault("emails_sent_today", 0)
+        acc.setdefault("last_reset_date", None)
     return accounts
 
+@app.get("/email-accounts", response_model=List[EmailAccountOut])
+async def get_email_accounts(request: Request, active_only: bool = True, current_user: dict = Depends(get_current_user)):
+    user_id = str(current_user["_id"])
+    tag, not_modified = await conditional_get(request, user_id, "email_accounts", active_only)
+    if not_modified:
+        return not_modified
+    return lean_response(await load_email_accounts(user_id, active_only), headers=http_cache.headers(tag))
+
 @app.get("/unread-emails", response_model=List[UnreadEmail])
 async def get_unread_emails(max_emails: int = 10, current_user: dict = Depends(get_current_user)):
     """Get unread emails from all email accounts"""
@@ -878,6 +1259,27 @@ async def get_unread_emails(max_emails: int = 10, current_user: dict = Depends(g
             detail="Failed to fetch unread emails"
         )
 
+@app.get("/inbox/search", response_model=List[InboxMessageOut])
+async def search_inbox(
+    q: Optional[str] = None,
+    sender: Optional[str] = None,
+    subject: Optional[str] = None,
+    company: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    kind: Optional[str] = None,
+    limit: int = 50,
+    current_user: dict = Depends(get_current_user)
+):
+    """Search synced messages across all of the user's accounts without touching IMAP"""
+    docs = await inbox_search.search_messages(
+        db,
+        str(current_user["_id"]),
+        limit=max(1, min(limit, 200)),
+        q=q, sender=sender, subject=subject, company=company, since=since, until=until, kind=kind
+    )
+    return [serialize_doc(d) for d in docs]
+
 @app.post("/email-accounts", response_model=EmailAccountOut, status_code=status.HTTP_201_CREATED)
 async def create_email_account(payload: EmailAccountIn, current_user: dict = Depends(get_current_user)):
     # Check if email already exists for this user
@@ -891,103 +1293,95 @@ async def create_email_account(payload: EmailAccountIn, current_user: dict = Dep
     doc["smtp_port"] = SMTP_PORT
     doc["user_id"] = str(current_user["_id"])
     
-    r = await email_accounts_col.insert_one(doc)
+    try:
+        r = await email_accounts_col.insert_one(doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email account already exists")
+    await http_cache.bump(cache_versions_col, doc["user_id"], "email_accounts")
     created = await email_accounts_col.find_one({"_id": r.inserted_id})
     return serialize_doc(created)
 
 @app.put("/email-accounts/{account_id}", response_model=EmailAccountOut)
 async def update_email_account(account_id: str, payload: EmailAccountIn, current_user: dict = Depends(get_current_user)):
-    update_doc = {"$set": payload.dict()}
-    res = await email_accounts_col.update_one({"_id": oid(account_id), "user_id": str(current_user["_id"])}, update_doc)
-    if res.matched_count == 0:
+    existing = await email_accounts_col.find_one({"_id": oid(account_id), "user_id": str(current_user["_id"])})
+    if not existing:
         raise HTTPException(status_code=404, detail="Email account not found")
-    updated = await email_accounts_col.find_one({"_id": oid(account_id)})
-    return serialize_doc(updated)
+    update_doc = {"$set": payload.dict()}
+    if existing.get("email") != payload.email or existing.get("password") != payload.password:
+        # New credentials: lift any auth quarantine so the account is retried right away
+        update_doc.update(account_health.reset_update())
+    await email_accounts_col.update_one({"_id": existing["_id"]}, update_doc)
+    await http_cache.bump(cache_versions_col, existing["user_id"], "email_accounts")
+    updated = await email_accounts_col.find_one({"_id": existing["_id"]})
+    doc = serialize_doc(updated)
+    doc["health"] = account_health.health_state(updated)
+    return doc
 
 @app.delete("/email-accounts/{account_id}")
 async def delete_email_account(account_id: str, current_user: dict = Depends(get_current_user)):
     res = await email_accounts_col.delete_one({"_id": oid(account_id), "user_id": str(current_user["_id"])})
     if res.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Email account not found")
+    await http_cache.bump(cache_versions_col, str(current_user["_id"]), "email_accounts")
     return {"status": "deleted"}
 
 # --------------------
 # Analytics Endpoints
 # --------------------
-@app.get("/analytics/daily-stats")
-async def get_daily_stats(days: int = 30, current_user: dict = Depends(get_current_user)):
-    """Get daily statistics for leads and emails for the current user"""
+async def load_daily_stats(user_id: str, days: int = 30) -> List[Dict[str, Any]]:
     end_date = datetime.utcnow()
     start_date = end_date - timedelta(days=days)
-    user_id = str(current_user["_id"])
-    
-    # Get daily lead counts
-    lead_pipeline = [
-        {"$match": {"user_id": user_id, "created_at": {"$gte": start_date, "$lte": end_date}}},
-        {"$group": {
-            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
-            "leads_count": {"$sum": 1}
-        }},
-        {"$sort": {"_id": 1}}
-    ]
-    
-    # Get daily email counts from mail_logs
-    email_pipeline = [
-        {"$match": {"user_id": user_id, "created_at": {"$gte": start_date, "$lte": end_date}}},
-        {"$group": {
-            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
-            "emails_sent": {"$sum": "$sent_count"},
-            "emails_failed": {"$sum": {"$size": "$failed"}}
-        }},
-        {"$sort": {"_id": 1}}
-    ]
     
-    lead_stats = await leads_col.aggregate(lead_pipeline).to_list(None)
-    email_stats = await mail_logs_col.aggregate(email_pipeline).to_list(None)
-    
-    # Convert to dictionaries for easier merging
-    leads_dict = {stat["_id"]: stat["leads_count"] for stat in lead_stats}
-    emails_dict = {stat["_id"]: stat["emails_sent"] for stat in email_stats}
-    
-    # Generate all dates in range
-    all_dates = []
-    current_date = start_date
-    while current_date <= end_date:
-        date_str = current_date.strftime("%Y-%m-%d")
-        all_dates.append(date_str)
-        current_date += timedelta(days=1)
+    rollups = await daily_stats.read_days(daily_stats_col, user_id, start_date, end_date)
     
     # Build complete dataset
     result = []
-    for date_str in all_dates:
+    for date_str in daily_stats.day_range(start_date, end_date):
+        day = rollups.get(date_str, {})
         result.append({
             "date": date_str,
-            "leads": leads_dict.get(date_str, 0),
-            "emails_sent": emails_dict.get(date_str, 0)
+            "leads": day.get("leads", 0),
+            "emails_sent": day.get("emails_sent", 0)
         })
     
     return result
 
-@app.get("/analytics/summary")
-async def get_analytics_summary(current_user: dict = Depends(get_current_user)):
-    """Get overall analytics summary for the current user"""
+@app.get("/analytics/daily-stats")
+async def get_daily_stats(days: int = 30, current_user: dict = Depends(get_current_user)):
+    """Get daily statistics for leads and emails for the current user"""
+    return await load_daily_stats(str(current_user["_id"]), days)
+
+@app.get("/analytics/accounts")
+async def get_account_analytics(days: int = 30, current_user: dict = Depends(get_current_user)):
+    """Sent/failed counts, success rate and SMTP latency per sending account"""
     user_id = str(current_user["_id"])
-    total_leads = await leads_col.count_documents({"user_id": user_id})
-    unsent_leads = await leads_col.count_documents({"user_id": user_id, "mail_sent": False})
-    sent_leads = total_leads - unsent_leads
-    
-    # Get email stats from mail_logs
-    email_stats = await mail_logs_col.aggregate([
-        {"$match": {"user_id": user_id}},
-        {"$group": {
-            "_id": None,
-            "total_sent": {"$sum": "$sent_count"},
-            "total_failed": {"$sum": {"$size": "$failed"}}
-        }}
-    ]).to_list(None)
-    
-    total_emails_sent = email_stats[0]["total_sent"] if email_stats else 0
-    total_emails_failed = email_stats[0]["total_failed"] if email_stats else 0
+    since = datetime.utcnow() - timedelta(days=days)
+    rows, accounts = await asyncio.gather(
+        send_events.by_account(send_events_col, user_id, since),
+        email_accounts_col.find({"user_id": user_id}, {"email": 1}).to_list(length=None),
+    )
+    emails = {str(a["_id"]): a.get("email") for a in accounts}
+    for row in rows:
+        row["email"] = emails.get(row["account_id"])
+    return rows
+
+@app.get("/analytics/domains")
+async def get_domain_analytics(days: int = 30, limit: int = 50, current_user: dict = Depends(get_current_user)):
+    """Sent/failed counts and SMTP codes per recipient domain, worst first"""
+    since = datetime.utcnow() - timedelta(days=days)
+    return await send_events.by_domain(send_events_col, str(current_user["_id"]), since, max(1, min(limit, 500)))
+
+async def load_analytics_summary(user_id: str) -> Dict[str, Any]:
+    # lead counters and the email totals from the daily rollups (one small document per active day) are independent
+    counts, email_stats = await asyncio.gather(
+        lead_counters.get_counts(leads_col, lead_counters_col, user_id),
+        daily_stats.totals(daily_stats_col, user_id),
+    )
+    total_leads = counts["total"]
+    unsent_leads = counts["unsent"]
+    sent_leads = counts["sent"]
+    total_emails_sent = email_stats["emails_sent"]
+    total_emails_failed = email_stats["emails_failed"]
     
     return {
         "total_leads": total_leads,
@@ -998,12 +1392,71 @@ async def get_analytics_summary(current_user: dict = Depends(get_current_user)):
         "success_rate": (total_emails_sent / (total_emails_sent + total_emails_failed)) * 100 if (total_emails_sent + total_emails_failed) > 0 else 100
     }
 
+@app.get("/analytics/summary")
+async def get_analytics_summary(request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    """Get overall analytics summary for the current user"""
+    user_id = str(current_user["_id"])
+    tag, not_modified = await conditional_get(request, user_id, "analytics")
+    if not_modified:
+        return not_modified
+    response.headers.update(http_cache.headers(tag))
+    return await load_analytics_summary(user_id)
+
+# --------------------
+# Dashboard bootstrap
+# --------------------
+# page -> the cache scopes its data depends on (see http_cache.py)
+DASHBOARD_PAGES = {
+    "send": ("templates", "email_accounts", "analytics"),
+    "analytics": ("analytics",),
+}
+
+@app.get("/dashboard")
+async def get_dashboard(request: Request, page: str = "send", days: int = 30, current_user: dict = Depends(get_current_user)):
+    """
+    Everything a page needs on mount in one round trip. The reads run
+    concurrently, so the response takes as long as the slowest one.
+    `send`: templates, lead counts and active email accounts;
+    `analytics`: summary and daily stats for the last `days` days.
+    """
+    if page not in DASHBOARD_PAGES:
+        raise HTTPException(status_code=400, detail=f"page must be one of: {', '.join(DASHBOARD_PAGES)}")
+    user_id = str(current_user["_id"])
+    # daily stats end today, so the date is part of the ETag
+    tag, not_modified = await conditional_get(request, user_id, DASHBOARD_PAGES[page], page, days, daily_stats.day_key())
+    if not_modified:
+        return not_modified
+
+    if page == "send":
+        templates, counts, accounts = await asyncio.gather(
+            load_templates(user_id),
+            lead_counters.get_counts(leads_col, lead_counters_col, user_id),
+            load_email_accounts(user_id),
+        )
+        data = {"templates": lean_docs(templates), "lead_counts": counts, "email_accounts": lean_docs(accounts)}
+    else:
+        summary, stats = await asyncio.gather(load_analytics_summary(user_id), load_daily_stats(user_id, days))
+        data = {"summary": summary, "daily_stats": stats}
+    return ORJSONResponse(data, headers=http_cache.headers(tag))
+
 # --------------------
 # Bing Maps Scraping Endpoints
 # --------------------
 @app.post("/scrape-bing-maps", response_model=ScrapeResponse)
 async def scrape_bing_maps_endpoint(request: ScrapeRequest, background_tasks: BackgroundTasks, current_user: dict = Depends(get_current_user)):
     try:
+        if jobs.WORKER_MODE == "queue":
+            job_id = await jobs.enqueue(jobs_col, "scrape_bing_maps", str(current_user["_id"]), {
+                "query": request.query,
+                "max_businesses": request.max_businesses,
+            })
+            return {
+                "status": "queued",
+                "message": f"Scraping queued for '{request.query}'. Results will be saved to database.",
+                "total_requested": request.max_businesses,
+                "job_id": job_id,
+            }
+
         # Start the scraping in the background
         background_tasks.add_task(
             save_scraped_data_to_db,
@@ -1020,49 +1473,6 @@ async def scrape_bing_maps_endpoint(request: ScrapeRequest, background_tasks: Ba
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-async def save_scraped_data_to_db(query: str, max_businesses: int, user_id: str):
-    """Background task that performs scraping and saves to DB in batches of 10"""
-    try:
-        # Import here to avoid circular imports
-        from scraper import scrape_bing_maps
-        
-        results = scrape_bing_maps(query, max_businesses)
-        
-        # Convert to lead format for your database
-        leads_to_insert = []
-        batch_size = 10  # Save in batches of 10 to reduce API calls
-        
-        for i, business in enumerate(results):
-            lead = {
-                "company_name": business.shop_name,
-                "contact_number": business.phone,
-                "email": business.emails[0] if business.emails else None,
-                "owner_name": "",  # Can't get this from Bing Maps
-                "mail_sent": False,
-                "created_at": datetime.utcnow(),
-                "user_id": user_id,
-                "source": "bing_maps_scraper",
-                "website": business.website,
-                "additional_info": {
-                    "website_name": business.website_name,
-                    "all_emails": business.emails,
-                    "scraped_with_proxy": business.proxy_used
-                }
-            }
-            leads_to_insert.append(lead)
-            
-            # Save in batches of 10
-            if len(leads_to_insert) >= batch_size or i == len(results) - 1:
-                await leads_col.insert_many(leads_to_insert)
-                print(f"✅ Saved batch of {len(leads_to_insert)} leads to database")
-                leads_to_insert = []  # Reset for next batch
-        
-        print(f"🎉 Total {len(results)} leads processed and saved in batches")
-        
-    except Exception as e:
-        print(f"❌ Error in background scraping task: {str(e)}")
-        traceback.print_exc()
-
 # --------------------
 # Dev endpoints
 # --------------------
@@ -1071,7 +1481,7 @@ async def seed_dev():
     # Create a default user if none exists
     default_user = await users_collection.find_one({"email": "admin@example.com"})
     if not default_user:
-        hashed_password = get_password_hash("password123")
+        hashed_password = await get_password_hash("password123")
         user_doc = {
             "email": "admin@example.com",
             "password": hashed_password,
@@ -1093,6 +1503,7 @@ async def seed_dev():
             "user_id": user_id
         }
         await templates_col.insert_one(tdoc)
+        await http_cache.bump(cache_versions_col, user_id, "templates")
     
     # Create sample leads
     sample_leads = [
@@ -1100,6 +1511,7 @@ async def seed_dev():
         {"company_name": "Beta Co", "contact_number": "03127654321", "email": "lead2@example.com", "owner_name": "Sara Ahmed", "mail_sent": False, "created_at": datetime.utcnow(), "user_id": user_id},
     ]
     await leads_col.insert_many(sample_leads)
+    await record_new_leads(sample_leads)
     
     # Add sample email accounts if none exist
     email_count = await email_accounts_col.count_documents({"user_id": user_id})
@@ -1117,6 +1529,7 @@ async def seed_dev():
             }
         ]
         await email_accounts_col.insert_many(sample_accounts)
+        await http_cache.bump(cache_versions_col, user_id, "email_accounts")
     
     return {"status": "seeded", "user_id": user_id}
 
@@ -1126,6 +1539,18 @@ async def seed_dev():
 @app.post("/scrape-google-maps", response_model=ScrapeResponse)
 async def scrape_google_maps_endpoint(request: ScrapeRequest, background_tasks: BackgroundTasks, current_user: dict = Depends(get_current_user)):
     try:
+        if jobs.WORKER_MODE == "queue":
+            job_id = await jobs.enqueue(jobs_col, "scrape_google_maps", str(current_user["_id"]), {
+                "query": request.query,
+                "max_businesses": request.max_businesses,
+            })
+            return {
+                "status": "queued",
+                "message": f"Google Maps scraping queued for '{request.query}'. Results will be saved to database.",
+                "total_requested": request.max_businesses,
+                "job_id": job_id,
+            }
+
         # Start the scraping in the background
         background_tasks.add_task(
             save_google_scraped_data_to_db,
@@ -1142,66 +1567,85 @@ async def scrape_google_maps_endpoint(request: ScrapeRequest, background_tasks:
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-async def save_google_scraped_data_to_db(query: str, max_businesses: int, user_id: str):
-    """Background task that performs Google Maps scraping and saves to DB in batches of 10, skipping duplicates."""
+@app.on_event("startup")
+async def bootstrap_indexes():
     try:
-        from google_scraper import scrape_google_maps  # Import here to avoid circular imports
-        from pymongo import UpdateOne
-        from pymongo.errors import BulkWriteError
-
-        results = scrape_google_maps(query, max_businesses)
-
-        batch_size = 10
-        operations = []
-
-        for i, business in enumerate(results):
-            # Prepare the lead document
-            lead_doc = {
-                "company_name": business.get("company_name", ""),
-                "contact_number": business.get("phone", ""),
-                "email": business.get("emails", [""])[0] if business.get("emails") else None,
-                "owner_name": "",  # Can't get this from Google Maps
-                "mail_sent": False,
-                "created_at": datetime.utcnow(),
-                "user_id": user_id,
-                "source": "google_maps_scraper",
-                "website": business.get("website", ""),
-                "additional_info": {
-                    "all_emails": business.get("emails", []),
-                    "scraped_with_proxy": True,
-                    "original_query": query  # Store the query that found this lead
-                }
-            }
-
-            # Create UpdateOne operation (duplicate skipping with upsert)
-            filter = {
-                "email": lead_doc["email"],
-                "company_name": lead_doc["company_name"],
-                "user_id": user_id
-            }
-            operation = UpdateOne(
-                filter,
-                {'$setOnInsert': lead_doc},  # Only set on insert
-                upsert=True
-            )
-            operations.append(operation)
+        await indexes.bootstrap(db)
+    except Exception as e:
+        print(f"⚠️ Index bootstrap failed: {str(e)}")
+
+@app.on_event("startup")
+async def start_lead_counter_reconciliation():
+    if lead_counters.RECONCILE_MINUTES > 0:
+        asyncio.create_task(lead_counters.reconcile_forever(leads_col, lead_counters_col))
+
+@app.on_event("startup")
+async def start_job_event_relay():
+    # workers publish to job_events instead of this process's bus
+    if jobs.WORKER_MODE == "queue":
+        asyncio.create_task(jobs.relay_forever(job_events_col, events.bus))
+
+@app.post("/events/token")
+async def create_event_stream_token(current_user: dict = Depends(get_current_user)):
+    """Short-lived token for `GET /events?token=`, which EventSource needs because it cannot set headers."""
+    token = create_access_token(
+        {"sub": current_user["email"], "tv": user_cache.token_version(current_user), "scope": EVENTS_TOKEN_SCOPE},
+        expires_delta=timedelta(seconds=EVENTS_TOKEN_EXPIRE_SECONDS),
+    )
+    return {"token": token, "expires_in": EVENTS_TOKEN_EXPIRE_SECONDS}
 
-            # Execute in batches of 10
-            if len(operations) >= batch_size or i == len(results) - 1:
+@app.get("/events")
+async def event_stream(request: Request, token: Optional[str] = None):
+    """
+    Server-sent events for the current user: `counts` (lead counters), `scrape`
+    and `send` progress. EventSource cannot set headers, so it passes a token
+    from `POST /events/token` as ?token=; the access token itself is only
+    accepted in the Authorization header. The first event is always the
+    current counts.
+    """
+    if token:
+        user = await user_from_token(token, scope=EVENTS_TOKEN_SCOPE)
+    else:
+        auth = request.headers.get("authorization", "")
+        if not auth.lower().startswith("bearer "):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+        user = await user_from_token(auth[7:])
+    user_id = str(user["_id"])
+    queue = events.bus.subscribe(user_id)
+
+    async def stream():
+        try:
+            counts = await lead_counters.get_counts(leads_col, lead_counters_col, user_id)
+            yield events.format_sse("counts", counts)
+            while True:
                 try:
-                    result = await leads_col.bulk_write(operations, ordered=False)
-                    print(f"✅ Batch completed. Inserted: {result.upserted_count}, Matched: {result.matched_count}")
-                except BulkWriteError as bwe:
-                    print(f"⚠️ Batch completed with some duplicates ignored. "
-                          f"Inserted: {bwe.details.get('nInserted', 0)}, "
-                          f"Duplicates: {len(bwe.details.get('writeErrors', []))}")
-                operations = []  # Reset for next batch
+                    event, data = await asyncio.wait_for(queue.get(), timeout=EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield events.format_sse(event, data)
+        finally:
+            events.bus.unsubscribe(user_id, queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # tell nginx not to buffer the stream
+    })
 
-        print(f"🎉 Scraping complete. Processed {len(results)} businesses in batches of {batch_size}.")
+@app.get("/executors")
+async def executor_stats(current_user: dict = Depends(get_current_user)):
+    """Busy threads, queue depth and saturation of each worker pool (see executors.py)."""
+    return executors.stats()
 
-    except Exception as e:
-        print(f"❌ Error in background Google Maps scraping task: {str(e)}")
-        traceback.print_exc()
+@app.on_event("startup")
+async def preload_rephrase_agent():
+    # off the loop and not awaited, so startup is not held up by the SDK import
+    if REPHRASE_PRELOAD and GEMINI_API_KEY:
+        asyncio.ensure_future(load_rephrase_agent())
+
+@app.on_event("shutdown")
+async def stop_executors():
+    executors.shutdown(wait=False)
 
 @app.get("/")
 async def root():
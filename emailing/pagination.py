@@ -0,0 +1,55 @@
+# pagination.py
+"""Keyset (cursor) pagination over (created_at, _id), newest first.
+
+A cursor is the sort key of the last item of a page, base64url-encoded so
+clients treat it as opaque. The next page is everything strictly "before"
+that key, which an index ending in (created_at -1, _id -1) serves without
+skipping, so page N costs the same as page 1.
+"""
+import json
+import base64
+from datetime import datetime
+from typing import Any, Dict, Optional
+from bson import ObjectId
+
+SORT = [("created_at", -1), ("_id", -1)]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    created_at = doc.get("created_at")
+    payload = {
+        "c": created_at.isoformat() if isinstance(created_at, datetime) else None,
+        "i": str(doc["_id"]),
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return {
+            "created_at": datetime.fromisoformat(payload["c"]) if payload.get("c") else None,
+            "_id": ObjectId(payload["i"]),
+        }
+    except Exception as e:
+        raise InvalidCursor(f"Invalid cursor: {e}")
+
+
+def keyset_filter(cursor: Optional[str]) -> Dict[str, Any]:
+    """Filter fragment selecting the items that come after `cursor` in SORT order."""
+    if not cursor:
+        return {}
+    key = decode_cursor(cursor)
+    if key["created_at"] is None:
+        # legacy documents without created_at sort last; page through them by _id only
+        return {"created_at": None, "_id": {"$lt": key["_id"]}}
+    return {"$or": [
+        {"created_at": {"$lt": key["created_at"]}},
+        {"created_at": key["created_at"], "_id": {"$lt": key["_id"]}},
+        {"created_at": None},
+    ]}
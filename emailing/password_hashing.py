@@ -0,0 +1,34 @@
+# password_hashing.py
+"""Run bcrypt off the event loop on the bounded `hashing` pool.
+
+A bcrypt verify costs ~250 ms of CPU; done inline in an async endpoint it
+stalls every other request on the worker. Hashes run on the hashing pool's
+threads (bcrypt releases the GIL) and at most its queue bound more wait for
+a thread; beyond that `run` raises HashingOverloaded straight away, which
+the API turns into 429 instead of letting a login storm queue unbounded.
+Pool sizes are set in executors.py (HASH_WORKERS / HASH_QUEUE_MAX still work).
+"""
+import os
+from typing import Any, Callable, Dict
+
+import executors
+
+HASH_RETRY_AFTER_SECONDS = int(os.getenv("HASH_RETRY_AFTER_SECONDS", 2))
+HASH_WORKERS = executors.pool("hashing").workers
+HASH_QUEUE_MAX = executors.pool("hashing").queue_max
+
+
+class HashingOverloaded(Exception):
+    pass
+
+
+async def run(fn: Callable[..., Any], *args) -> Any:
+    """Run a hashing call on the pool, or raise HashingOverloaded if too many are waiting."""
+    try:
+        return await executors.run("hashing", fn, *args)
+    except executors.PoolSaturated as e:
+        raise HashingOverloaded(str(e)) from None
+
+
+def stats() -> Dict[str, Any]:
+    return executors.pool("hashing").stats()
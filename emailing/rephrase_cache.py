@@ -0,0 +1,107 @@
+# rephrase_cache.py
+"""Content-hash cache for rephrase results.
+
+The key is a SHA-256 of the whitespace-normalised input together with the
+model name and the agent instructions, so editing the prompt or switching
+models never serves a stale answer. Results live in the `rephrase_cache`
+collection (TTL index on `expires_at`, REPHRASE_CACHE_TTL_HOURS) with a
+per-process LRU in front. Identical requests that arrive while the first
+one is still waiting on the model share its result instead of paying for
+a second call. Callers pass `fresh=True` to skip the lookup; the new result
+then replaces the cached one.
+"""
+import os
+import re
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from ttl_cache import TTLCache
+
+REPHRASE_CACHE_TTL_HOURS = float(os.getenv("REPHRASE_CACHE_TTL_HOURS", 24 * 7))
+REPHRASE_CACHE_MEMORY_SIZE = int(os.getenv("REPHRASE_CACHE_MEMORY_SIZE", 1000))
+REPHRASE_CACHE_MEMORY_SECONDS = float(os.getenv("REPHRASE_CACHE_MEMORY_SECONDS", 3600))
+
+memory = TTLCache(REPHRASE_CACHE_MEMORY_SECONDS, REPHRASE_CACHE_MEMORY_SIZE)
+_in_flight: Dict[str, asyncio.Future] = {}
+_stats = {"mongo_hits": 0, "computed": 0, "shared": 0}
+
+_SPACES = re.compile(r"[ \t\f\v]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def normalize(content: str) -> str:
+    """Collapse differences that do not change the email: line endings, runs of spaces, edge whitespace."""
+    text = content.replace("\r\n", "\n").replace("\r", "\n")
+    text = "\n".join(_SPACES.sub(" ", line).strip() for line in text.split("\n"))
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+def cache_key(content: str, model: str, instructions: str) -> str:
+    h = hashlib.sha256()
+    for part in (model, instructions, normalize(content)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+async def get(col, key: str) -> Optional[str]:
+    output = memory.get(key)
+    if output is not None:
+        return output
+    doc = await col.find_one({"_id": key, "expires_at": {"$gt": datetime.utcnow()}}, {"output": 1})
+    if doc is None:
+        return None
+    _stats["mongo_hits"] += 1
+    memory.put(key, doc["output"])
+    return doc["output"]
+
+
+async def put(col, key: str, output: str, model: str):
+    now = datetime.utcnow()
+    memory.put(key, output)
+    await col.update_one(
+        {"_id": key},
+        {"$set": {"output": output, "model": model, "created_at": now,
+                  "expires_at": now + timedelta(hours=REPHRASE_CACHE_TTL_HOURS)}},
+        upsert=True,
+    )
+
+
+async def get_or_compute(col, key: str, model: str, compute: Callable[[], Awaitable[str]],
+                         fresh: bool = False) -> Tuple[str, bool]:
+    """Return (output, cached). `compute` only runs on a miss, once per key at a time."""
+    if not fresh:
+        output = await get(col, key)
+        if output is not None:
+            return output, True
+    pending = _in_flight.get(key)
+    if pending is not None:
+        _stats["shared"] += 1
+        return await asyncio.shield(pending), not fresh
+
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[key] = future
+    try:
+        output = await compute()
+        _stats["computed"] += 1
+        future.set_result(output)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # mark retrieved so an unshared failure is not logged as unhandled
+        raise
+    finally:
+        del _in_flight[key]
+    try:
+        await put(col, key, output, model)
+    except Exception as e:
+        print(f"⚠️ Could not store rephrase result in cache: {e}")
+    return output, False
+
+
+def stats() -> Dict[str, Any]:
+    return {**memory.stats(), **_stats, "in_flight": len(_in_flight)}
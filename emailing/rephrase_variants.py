@@ -0,0 +1,98 @@
+# rephrase_variants.py
+"""Generate a pool of body variants for a template and rotate them at send time.
+
+`generate` runs up to VARIANT_CONCURRENCY model calls at once and retries
+each slot (errors and duplicate wordings alike) up to VARIANT_RETRIES times
+with jittered exponential backoff. The pool is stored on the template next
+to a hash of the content it was generated from; `pool_for` only returns it
+while that hash still matches, so editing or rephrasing the template
+retires old variants without a separate cleanup step. The send path just
+indexes into the stored list: no model call per recipient.
+
+A variant must keep exactly the placeholders of the content ({First Name},
+{Company}, ...); one that drops or invents any is retried like a duplicate,
+and `pool_for` skips such variants in pools stored before this check.
+"""
+import os
+import re
+import random
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from rephrase_cache import normalize
+
+VARIANT_CONCURRENCY = int(os.getenv("REPHRASE_VARIANT_CONCURRENCY", 4))
+VARIANT_RETRIES = int(os.getenv("REPHRASE_VARIANT_RETRIES", 3))
+VARIANT_BACKOFF_SECONDS = float(os.getenv("REPHRASE_VARIANT_BACKOFF_SECONDS", 1.0))
+VARIANT_BATCH_MAX = int(os.getenv("REPHRASE_VARIANT_BATCH_MAX", 20))  # variants per request
+VARIANT_POOL_MAX = int(os.getenv("REPHRASE_VARIANT_POOL_MAX", 50))  # variants kept per template
+
+PLACEHOLDER_RE = re.compile(r"\{[^{}\n]+\}")
+
+
+def placeholders(text: str) -> FrozenSet[str]:
+    return frozenset(PLACEHOLDER_RE.findall(text or ""))
+
+
+def source_hash(content: str) -> str:
+    return hashlib.sha256(normalize(content).encode("utf-8")).hexdigest()
+
+
+def pool_for(tmpl: Dict[str, Any]) -> List[str]:
+    """Variants usable for the template's current content (empty when stale or never generated)."""
+    variants = tmpl.get("variants") or []
+    content = tmpl.get("content", "")
+    if variants and tmpl.get("variants_source") == source_hash(content):
+        expected = placeholders(content)
+        return [v for v in variants if placeholders(v) == expected]
+    return []
+
+
+def rotation(tmpl: Dict[str, Any]) -> Callable[[int], str]:
+    """Body for the i-th recipient: round-robin over the pool from a random start, or the content itself."""
+    pool = pool_for(tmpl)
+    if not pool:
+        content = tmpl.get("content", "")
+        return lambda i: content
+    start = random.randrange(len(pool))
+    return lambda i: pool[(start + i) % len(pool)]
+
+
+async def generate(run_one: Callable[[], Awaitable[str]], count: int, existing: List[str] = (),
+                   concurrency: int = VARIANT_CONCURRENCY, retries: int = VARIANT_RETRIES,
+                   source: Optional[str] = None) -> Tuple[List[str], List[str]]:
+    """Produce up to `count` variants distinct from each other and from `existing`. Returns (variants, errors).
+
+    With `source`, a variant whose placeholders differ from the source's is rejected and retried.
+    """
+    expected = placeholders(source) if source is not None else None
+    gate = asyncio.Semaphore(max(1, concurrency))
+    seen = {normalize(v) for v in existing}
+    variants: List[str] = []
+    errors: List[str] = []
+
+    async def slot():
+        last_error = "duplicate variant"
+        for attempt in range(retries + 1):
+            if attempt:
+                await asyncio.sleep(VARIANT_BACKOFF_SECONDS * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            try:
+                async with gate:
+                    text = (await run_one()).strip()
+            except Exception as e:
+                last_error = str(e) or type(e).__name__
+                continue
+            if expected is not None and placeholders(text) != expected:
+                last_error = "variant changed the placeholders"
+                continue
+            key = normalize(text)
+            if text and key not in seen:
+                seen.add(key)
+                variants.append(text)
+                return
+            last_error = "duplicate variant"
+        errors.append(last_error)
+
+    await asyncio.gather(*(slot() for _ in range(count)))
+    return variants, errors
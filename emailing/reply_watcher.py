@@ -0,0 +1,440 @@
+# reply_watcher.py
+"""Async IMAP reply watcher for every account in `email_accounts`.
+
+One asyncio task per account keeps an IMAP IDLE session open, fetches only
+messages above a persisted UID watermark, stores them in `inbox_messages`
+and marks the leads they reply to as replied. Bounces and auto replies are
+recognised on the way in (see bounces.py) and update lead state instead.
+
+Run standalone with:  python reply_watcher.py
+"""
+import os
+import re
+import asyncio
+import email
+import email.utils
+from email import policy
+from email.header import decode_header, make_header
+from datetime import datetime, timezone
+from typing import List, Optional, Any, Dict
+from dotenv import load_dotenv
+import motor.motor_asyncio
+from pymongo import UpdateOne
+from aioimaplib import aioimaplib
+from bounces import classify_message, apply_feedback
+import account_health
+import executors
+
+load_dotenv()
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+MONGODB_DB = os.getenv("MONGODB_DB", "email_agent_db")
+IMAP_HOST = os.getenv("IMAP_HOST", "imap.gmail.com")
+IMAP_PORT = int(os.getenv("IMAP_PORT", 993))
+IMAP_SSL = os.getenv("IMAP_SSL", "true").lower() != "false"
+
+IDLE_SECONDS = float(os.getenv("REPLY_WATCHER_IDLE_SECONDS", 25 * 60))  # re-issue IDLE before servers drop it
+REFRESH_SECONDS = float(os.getenv("REPLY_WATCHER_REFRESH_SECONDS", 60))  # how often the account list is reloaded
+CONNECT_CONCURRENCY = int(os.getenv("REPLY_WATCHER_CONNECT_CONCURRENCY", 20))  # parallel logins across accounts
+INITIAL_SYNC = int(os.getenv("REPLY_WATCHER_INITIAL_SYNC", 50))  # messages synced for an account seen for the first time
+FETCH_BATCH = int(os.getenv("REPLY_WATCHER_FETCH_BATCH", 50))  # most UIDs fetched per round trip
+FETCH_BYTES = int(os.getenv("REPLY_WATCHER_FETCH_BYTES", 64 * 1024))  # partial fetch size per message
+MAX_BACKOFF = float(os.getenv("REPLY_WATCHER_MAX_BACKOFF", 15 * 60))
+SNIPPET_LENGTH = 200
+
+FETCH_LINE_RE = re.compile(rb"^\d+ FETCH \(")
+UID_RE = re.compile(rb"UID (\d+)")
+LITERAL_RE = re.compile(rb"\{(\d+)\}$")
+STATUS_CODE_RE = re.compile(rb"\[(UIDVALIDITY|UIDNEXT) (\d+)\]")
+MESSAGE_ID_RE = re.compile(r"<[^<>\s]+>")
+
+
+class ImapAuthError(Exception):
+    """Raised when the server rejects the account credentials."""
+
+
+# --------------------
+# Message parsing
+# --------------------
+def _decode(value: Optional[str]) -> str:
+    if not value:
+        return ""
+    try:
+        return str(make_header(decode_header(value)))
+    except Exception:
+        return str(value)
+
+
+def _snippet(msg: email.message.Message) -> str:
+    part = None
+    for candidate in msg.walk():
+        if candidate.get_content_maintype() == "multipart":
+            continue
+        if candidate.get_content_type() == "text/plain":
+            part = candidate
+            break
+        if part is None and candidate.get_content_type() == "text/html":
+            part = candidate
+    if part is None:
+        return ""
+    try:
+        payload = part.get_payload(decode=True) or b""
+        text = payload.decode(part.get_content_charset() or "utf-8", errors="replace")
+    except Exception:
+        return ""
+    if part.get_content_type() == "text/html":
+        text = re.sub(r"<[^>]+>", " ", text)
+    text = " ".join(text.split())
+    return text[:SNIPPET_LENGTH]
+
+
+def parse_message(uid: int, raw: bytes) -> Dict[str, Any]:
+    """Turn a (possibly truncated) raw RFC822 message into the fields we store."""
+    msg = email.message_from_bytes(raw, policy=policy.compat32)
+    from_name, from_email = email.utils.parseaddr(msg.get("From", ""))
+    try:
+        date = email.utils.parsedate_to_datetime(msg.get("Date")) if msg.get("Date") else None
+        if date is not None and date.tzinfo is not None:
+            date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    except Exception:
+        date = None
+    references = MESSAGE_ID_RE.findall(msg.get("In-Reply-To", "") + " " + msg.get("References", ""))
+    return {
+        "uid": uid,
+        "message_id": (msg.get("Message-ID") or "").strip() or None,
+        "from_email": from_email.strip().lower(),
+        "from_name": _decode(from_name),
+        "to": msg.get("To", ""),
+        "subject": _decode(msg.get("Subject")) or "No Subject",
+        "date": date,
+        "references": references,
+        "snippet": _snippet(msg),
+        "message": msg,
+    }
+
+
+def parse_batch(chunk: List[tuple]) -> List[Dict[str, Any]]:
+    return [parse_message(uid, raw) for uid, raw in chunk]
+
+
+def parse_search_response(lines: List[Any]) -> List[int]:
+    """UIDs from an aioimaplib UID SEARCH response (`SEARCH 4 7 9`, then the tagged status line)."""
+    uids = []
+    for line in lines:
+        line = bytes(line).strip()
+        if line.upper().startswith(b"SEARCH"):
+            line = line[len(b"SEARCH"):]
+        numbers = line.split()
+        if numbers and all(n.isdigit() for n in numbers):
+            uids.extend(int(n) for n in numbers)
+    return sorted(set(uids))
+
+
+def parse_fetch_response(lines: List[Any]) -> List[tuple]:
+    """Split an aioimaplib UID FETCH response into (uid, literal bytes) pairs."""
+    messages = []
+    uid, literal, expecting_literal = None, None, False
+    for line in lines:
+        if isinstance(line, bytearray) or expecting_literal:
+            literal = bytes(line)
+            expecting_literal = False
+            continue
+        if FETCH_LINE_RE.match(line):
+            if uid is not None and literal is not None:
+                messages.append((uid, literal))
+            uid, literal = None, None
+        match = UID_RE.search(line)
+        if match:
+            uid = int(match.group(1))
+        if LITERAL_RE.search(line):
+            expecting_literal = True
+    if uid is not None and literal is not None:
+        messages.append((uid, literal))
+    return messages
+
+
+# --------------------
+# Mongo side
+# --------------------
+async def record_messages(db, account: Dict[str, Any], uidvalidity: int, parsed: List[Dict[str, Any]]) -> int:
+    """Store synced messages, mark answered leads as replied and feed bounces back. Returns replies matched."""
+    if not parsed:
+        return 0
+    user_id = account["user_id"]
+    leads_col = db["leads"]
+
+    senders = {m["from_email"] for m in parsed if m["from_email"]}
+    references = {ref for m in parsed for ref in m["references"]}
+    clauses = []
+    if senders:
+        clauses.append({"email": {"$in": list(senders)}})
+    if references:
+        clauses.append({"outbound_message_ids": {"$in": list(references)}})
+
+    by_email, by_message_id = {}, {}
+    if clauses:
+        cursor = leads_col.find(
+            {"user_id": user_id, "$or": clauses},
+            {"email": 1, "company_name": 1, "outbound_message_ids": 1},
+        )
+        async for lead in cursor:
+            if lead.get("email"):
+                by_email.setdefault(lead["email"].strip().lower(), lead)
+            for mid in lead.get("outbound_message_ids") or []:
+                by_message_id[mid] = lead
+
+    message_ops, lead_ops, feedback = [], [], []
+    for m in parsed:
+        lead = next((by_message_id[r] for r in m["references"] if r in by_message_id), None)
+        if lead is None:
+            lead = by_email.get(m["from_email"])
+        classified = classify_message(m["message"], m["from_email"], m["subject"], account["email"])
+        if classified:
+            feedback.append(classified)
+        doc = {k: v for k, v in m.items() if k not in ("message", "references")}
+        doc.update({
+            "kind": classified["kind"] if classified else ("reply" if lead else "message"),
+            "user_id": user_id,
+            "account_id": str(account["_id"]),
+            "account_email": account["email"],
+            "uidvalidity": uidvalidity,
+            "in_reply_to": m["references"][0] if m["references"] else None,
+            "lead_id": str(lead["_id"]) if lead else None,
+            "lead_company": lead.get("company_name") if lead else None,
+            "synced_at": datetime.utcnow(),
+        })
+        message_ops.append(UpdateOne(
+            {"account_id": doc["account_id"], "uidvalidity": uidvalidity, "uid": m["uid"]},
+            {"$setOnInsert": doc},
+            upsert=True,
+        ))
+        if lead is not None and not classified:
+            # keyed by the message's op index: only applied if the message is new (see below)
+            lead_ops.append((len(message_ops) - 1, UpdateOne(
+                {"_id": lead["_id"]},
+                {
+                    "$set": {"replied": True, "last_replied_at": m["date"] or datetime.utcnow()},
+                    "$inc": {"reply_count": 1},
+                },
+            )))
+
+    result = await db["inbox_messages"].bulk_write(message_ops, ordered=False)
+    # a re-fetch after a crash before save_watermark matches stored UIDs; those replies were already counted
+    inserted = set(result.upserted_ids)
+    lead_ops = [op for index, op in lead_ops if index in inserted]
+    if lead_ops:
+        await leads_col.bulk_write(lead_ops, ordered=False)
+    if feedback:
+        applied = await apply_feedback(db, user_id, feedback)
+        print(f"📭 {account['email']}: {applied['bounced']} bounced addresses, {applied['auto_replies']} auto replies")
+    return len(lead_ops)
+
+
+async def save_watermark(db, account_id, uidvalidity: int, last_uid: int):
+    await db["email_accounts"].update_one(
+        {"_id": account_id},
+        {"$set": {
+            "imap_sync.uidvalidity": uidvalidity,
+            "imap_sync.last_uid": last_uid,
+            "imap_sync.updated_at": datetime.utcnow(),
+        }},
+    )
+
+
+# --------------------
+# Per-account watcher
+# --------------------
+class AccountWatcher:
+    """Keeps one IMAP connection per account in IDLE and syncs new UIDs."""
+
+    def __init__(self, db, account: Dict[str, Any], login_slots: asyncio.Semaphore):
+        self.db = db
+        self.account = account
+        self.login_slots = login_slots
+        self.imap = None
+        self.uidvalidity = None
+        self.last_uid = 0
+
+    @property
+    def label(self) -> str:
+        return self.account.get("email", "Unknown")
+
+    async def connect(self):
+        if IMAP_SSL:
+            imap = aioimaplib.IMAP4_SSL(host=IMAP_HOST, port=IMAP_PORT, timeout=30)
+        else:
+            imap = aioimaplib.IMAP4(host=IMAP_HOST, port=IMAP_PORT, timeout=30)
+        async with self.login_slots:
+            await imap.wait_hello_from_server()
+            response = await imap.login(self.account["email"], self.account["password"])
+        if response.result != "OK":
+            raise ImapAuthError(b" ".join(bytes(l) for l in response.lines).decode(errors="replace"))
+        response = await imap.select("INBOX")
+        if response.result != "OK":
+            raise aioimaplib.Error(f"SELECT INBOX failed for {self.label}")
+        codes = {}
+        for line in response.lines:
+            for name, value in STATUS_CODE_RE.findall(bytes(line)):
+                codes[name.decode()] = int(value)
+        self.imap = imap
+        self._load_watermark(codes.get("UIDVALIDITY", 0), codes.get("UIDNEXT", 1))
+
+    def _load_watermark(self, uidvalidity: int, uidnext: int):
+        state = self.account.get("imap_sync") or {}
+        if state.get("uidvalidity") == uidvalidity:
+            self.last_uid = int(state.get("last_uid", 0))
+        else:
+            # first sync, or the mailbox was rebuilt: only look at the newest messages
+            self.last_uid = max(0, uidnext - 1 - INITIAL_SYNC)
+        self.uidvalidity = uidvalidity
+
+    async def sync(self) -> int:
+        """Fetch everything above the watermark, FETCH_BATCH UIDs per round trip. Returns number of new messages."""
+        total = 0
+        while True:
+            # UIDs only, so a first sync or a long disconnect never pulls the whole mailbox at once
+            response = await self.imap.uid_search(f"UID {self.last_uid + 1}:*", charset=None)
+            if response.result != "OK":
+                raise aioimaplib.Error(f"UID SEARCH failed for {self.label}")
+            # `n:*` always matches the highest UID even when it is below n
+            pending = [uid for uid in parse_search_response(response.lines) if uid > self.last_uid]
+            if not pending:
+                return total
+            for start in range(0, len(pending), FETCH_BATCH):
+                window = pending[start:start + FETCH_BATCH]
+                response = await self.imap.uid(
+                    "fetch", f"{window[0]}:{window[-1]}", f"(UID BODY.PEEK[]<0.{FETCH_BYTES}>)"
+                )
+                if response.result != "OK":
+                    raise aioimaplib.Error(f"UID FETCH failed for {self.label}")
+                chunk = sorted(
+                    (uid, raw) for uid, raw in parse_fetch_response(response.lines) if window[0] <= uid <= window[-1]
+                )
+                if chunk:
+                    parsed = await executors.run("cpu", parse_batch, chunk)
+                    replies = await record_messages(self.db, self.account, self.uidvalidity, parsed)
+                    total += len(chunk)
+                    if replies:
+                        print(f"💬 {replies} replies matched to leads for {self.label}")
+                # messages expunged since the search are simply skipped
+                self.last_uid = window[-1]
+                await save_watermark(self.db, self.account["_id"], self.uidvalidity, self.last_uid)
+                self.account["imap_sync"] = {"uidvalidity": self.uidvalidity, "last_uid": self.last_uid}
+
+    async def idle_once(self):
+        idle = await self.imap.idle_start(timeout=IDLE_SECONDS)
+        try:
+            while self.imap.has_pending_idle():
+                push = await self.imap.wait_server_push(timeout=IDLE_SECONDS + 60)
+                if push == aioimaplib.STOP_WAIT_SERVER_PUSH:
+                    break
+                if any(b"EXISTS" in bytes(line) for line in push):
+                    break
+        finally:
+            self.imap.idle_done()
+            await asyncio.wait_for(idle, timeout=30)
+
+    async def close(self):
+        if self.imap is not None:
+            try:
+                await self.imap.logout()
+            except Exception:
+                pass
+            self.imap = None
+
+    async def run(self):
+        backoff = 5.0
+        while True:
+            try:
+                await self.connect()
+                await account_health.record_auth_success(self.db["email_accounts"], self.account)
+                print(f"✅ Watching {self.label} from UID {self.last_uid}")
+                backoff = 5.0
+                while True:
+                    await self.sync()
+                    await self.idle_once()
+            except asyncio.CancelledError:
+                await self.close()
+                raise
+            except ImapAuthError as e:
+                # quarantined accounts are skipped by the supervisor until their backoff expires
+                await self.close()
+                await account_health.record_auth_failure(self.db["email_accounts"], self.account, e)
+                return
+            except Exception as e:
+                print(f"❌ Watcher error for {self.label}: {e}")
+            await self.close()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF)
+
+
+# --------------------
+# Supervisor
+# --------------------
+class ReplyWatcher:
+    """Runs one AccountWatcher per active account and follows changes to `email_accounts`."""
+
+    def __init__(self, db):
+        self.db = db
+        self.login_slots = asyncio.Semaphore(CONNECT_CONCURRENCY)
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.fingerprints: Dict[str, tuple] = {}
+
+    async def refresh(self):
+        accounts = await self.db["email_accounts"].find(
+            {"is_active": True, **account_health.available_filter()},
+            {"email": 1, "password": 1, "user_id": 1, "imap_sync": 1, "auth_health": 1},
+        ).to_list(length=None)
+
+        seen = set()
+        for account in accounts:
+            key = str(account["_id"])
+            fingerprint = (account.get("email"), account.get("password"))
+            seen.add(key)
+            if key in self.tasks and self.fingerprints.get(key) == fingerprint and not self.tasks[key].done():
+                continue
+            if key in self.tasks and self.tasks[key].done():
+                print(f"🔁 Retrying {account.get('email')}")
+            await self._stop(key)
+            watcher = AccountWatcher(self.db, account, self.login_slots)
+            self.tasks[key] = asyncio.create_task(watcher.run())
+            self.fingerprints[key] = fingerprint
+
+        for key in list(self.tasks):
+            if key not in seen:
+                await self._stop(key)
+
+    async def _stop(self, key: str):
+        task = self.tasks.pop(key, None)
+        self.fingerprints.pop(key, None)
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    async def run(self):
+        print(f"👀 Reply watcher started (IMAP {IMAP_HOST}:{IMAP_PORT})")
+        try:
+            while True:
+                await self.refresh()
+                await asyncio.sleep(REFRESH_SECONDS)
+        finally:
+            for key in list(self.tasks):
+                await self._stop(key)
+
+
+async def main():
+    client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URI)
+    try:
+        await ReplyWatcher(client[MONGODB_DB]).run()
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
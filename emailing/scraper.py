@@ -2,6 +2,7 @@ import time
 import json
 import re
 import requests
+import threading
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
@@ -19,14 +20,25 @@ import tempfile
 from typing import List, Dict, Optional
 from pydantic import BaseModel
 
-try:
-    from fake_useragent import UserAgent
-    ua = UserAgent()
-    print("✅ fake_useragent library loaded")
-except ImportError:
-    print("⚠️ fake_useragent not installed. Using static user agents.")
-    print("💡 Install with: pip install fake-useragent")
-    ua = None
+# fake_useragent reads its data file when instantiated, so it is loaded on first use
+_ua = None
+_ua_loaded = False
+_ua_lock = threading.Lock()
+
+def get_user_agents():
+    """The shared fake_useragent.UserAgent, created on first call; None if the package is missing."""
+    global _ua, _ua_loaded
+    with _ua_lock:
+        if not _ua_loaded:
+            try:
+                from fake_useragent import UserAgent
+                _ua = UserAgent()
+                print("✅ fake_useragent library loaded")
+            except ImportError:
+                print("⚠️ fake_useragent not installed. Using static user agents.")
+                print("💡 Install with: pip install fake-useragent")
+            _ua_loaded = True
+    return _ua
 
 class HeaderManager:
     def __init__(self):
@@ -39,6 +51,7 @@ class HeaderManager:
     
     def get_random_user_agent(self):
         """Get a random user agent"""
+        ua = get_user_agents()
         if ua:
             try:
                 return ua.random
@@ -49,6 +62,7 @@ class HeaderManager:
     
     def get_chrome_user_agent(self):
         """Get a Chrome-specific user agent"""
+        ua = get_user_agents()
         if ua:
             try:
                 return ua.chrome
@@ -263,7 +277,14 @@ class ProxyManager:
             except:
                 pass
 
-proxy_manager = ProxyManager(SCRAPER_API_KEY)
+_proxy_manager = None
+
+def get_proxy_manager() -> ProxyManager:
+    """The shared ProxyManager, created on the first scrape rather than at import."""
+    global _proxy_manager
+    if _proxy_manager is None:
+        _proxy_manager = ProxyManager(SCRAPER_API_KEY)
+    return _proxy_manager
 
 def clean_email_raw(e: str) -> str:
     e = e.strip().strip('.,;:"\'<>[]{} ')
@@ -418,9 +439,9 @@ def create_driver_with_proxy():
             print(f"🔄 Trying {approach_name}...")
             
             if approach_type == "extension":
-                chrome_options = proxy_manager.configure_selenium_with_extension()
+                chrome_options = get_proxy_manager().configure_selenium_with_extension()
             else:  
-                chrome_options = proxy_manager.configure_selenium_without_proxy()
+                chrome_options = get_proxy_manager().configure_selenium_without_proxy()
             
             driver = webdriver.Chrome(options=chrome_options)
             driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
@@ -526,13 +547,13 @@ def scrape_bing_maps(query: str, max_businesses: int) -> List[BusinessData]:
                     shop_name="",
                     phone="",
                     emails=[],
-                    proxy_used=proxy_manager.current_proxy
+                    proxy_used=get_proxy_manager().current_proxy
                 )
                 
                 try:
                     print(f"\n{'='*50}")
                     print(f"🏪 Processing business {total_processed+1} of {max_businesses}")
-                    print(f"🔄 Current Proxy: {proxy_manager.current_proxy}")
+                    print(f"🔄 Current Proxy: {get_proxy_manager().current_proxy}")
                     
                     try:
                         listing = listings[idx]
@@ -753,13 +774,13 @@ def scrape_bing_maps(query: str, max_businesses: int) -> List[BusinessData]:
     finally:
         print("\n🛑 Closing driver and cleaning up...")
         driver.quit()
-        proxy_manager.cleanup()
+        get_proxy_manager().cleanup()
         
         print("\n" + "=" * 60)
         print("💾 RETURNING RESULTS")
         print("=" * 60)
         print(f"✅ Scraping complete! Collected {len(results)} businesses.")
-        print(f"🔄 Connection method used: {proxy_manager.current_proxy}")
+        print(f"🔄 Connection method used: {get_proxy_manager().current_proxy}")
         print("=" * 60)
     
     return results
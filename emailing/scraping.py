@@ -0,0 +1,137 @@
+# scraping.py
+"""Scrape jobs: run a Maps scraper on the scrape pool and save the leads in batches.
+
+Runs inside the API process (BackgroundTasks) or in `python -m worker
+scraper-worker`. The scraper modules (Selenium) are imported on the first
+scrape, not when this module is.
+"""
+import traceback
+from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+import events
+import executors
+from db import leads_col
+from lead_activity import record_new_leads
+
+
+async def save_scraped_data_to_db(query: str, max_businesses: int, user_id: str):
+    """Background task that performs scraping and saves to DB in batches of 10"""
+    try:
+        from scraper import scrape_bing_maps  # Selenium is only imported when a scrape runs
+        
+        events.bus.publish(user_id, "scrape", {"source": "bing_maps", "query": query, "total": max_businesses, "saved": 0, "status": "scraping"})
+        results = await executors.run("scrape", scrape_bing_maps, query, max_businesses)
+        saved = 0
+        
+        # Convert to lead format for your database
+        leads_to_insert = []
+        batch_size = 10  # Save in batches of 10 to reduce API calls
+        
+        for i, business in enumerate(results):
+            lead = {
+                "company_name": business.shop_name,
+                "contact_number": business.phone,
+                "email": business.emails[0] if business.emails else None,
+                "owner_name": "",  # Can't get this from Bing Maps
+                "mail_sent": False,
+                "created_at": datetime.utcnow(),
+                "user_id": user_id,
+                "source": "bing_maps_scraper",
+                "website": business.website,
+                "additional_info": {
+                    "website_name": business.website_name,
+                    "all_emails": business.emails,
+                    "scraped_with_proxy": business.proxy_used
+                }
+            }
+            leads_to_insert.append(lead)
+            
+            # Save in batches of 10
+            if len(leads_to_insert) >= batch_size or i == len(results) - 1:
+                await leads_col.insert_many(leads_to_insert)
+                await record_new_leads(leads_to_insert)
+                saved += len(leads_to_insert)
+                events.bus.publish(user_id, "scrape", {"source": "bing_maps", "query": query, "total": len(results), "saved": saved, "status": "saving"})
+                print(f"✅ Saved batch of {len(leads_to_insert)} leads to database")
+                leads_to_insert = []  # Reset for next batch
+        
+        print(f"🎉 Total {len(results)} leads processed and saved in batches")
+        events.bus.publish(user_id, "scrape", {"source": "bing_maps", "query": query, "total": len(results), "saved": saved, "status": "complete"})
+        
+    except Exception as e:
+        print(f"❌ Error in background scraping task: {str(e)}")
+        traceback.print_exc()
+        events.bus.publish(user_id, "scrape", {"source": "bing_maps", "query": query, "status": "error", "error": str(e)})
+
+async def save_google_scraped_data_to_db(query: str, max_businesses: int, user_id: str):
+    """Background task that performs Google Maps scraping and saves to DB in batches of 10, skipping duplicates."""
+    try:
+        from google_scraper import scrape_google_maps  # Selenium is only imported when a scrape runs
+
+        events.bus.publish(user_id, "scrape", {"source": "google_maps", "query": query, "total": max_businesses, "saved": 0, "status": "scraping"})
+        results = await executors.run("scrape", scrape_google_maps, query, max_businesses)
+        saved = 0
+
+        batch_size = 10
+        operations = []
+        batch_docs = []
+
+        for i, business in enumerate(results):
+            # Prepare the lead document
+            lead_doc = {
+                "company_name": business.get("company_name", ""),
+                "contact_number": business.get("phone", ""),
+                "email": business.get("emails", [""])[0] if business.get("emails") else None,
+                "owner_name": "",  # Can't get this from Google Maps
+                "mail_sent": False,
+                "created_at": datetime.utcnow(),
+                "user_id": user_id,
+                "source": "google_maps_scraper",
+                "website": business.get("website", ""),
+                "additional_info": {
+                    "all_emails": business.get("emails", []),
+                    "scraped_with_proxy": True,
+                    "original_query": query  # Store the query that found this lead
+                }
+            }
+
+            # Create UpdateOne operation (duplicate skipping with upsert)
+            filter = {
+                "email": lead_doc["email"],
+                "company_name": lead_doc["company_name"],
+                "user_id": user_id
+            }
+            operation = UpdateOne(
+                filter,
+                {'$setOnInsert': lead_doc},  # Only set on insert
+                upsert=True
+            )
+            operations.append(operation)
+            batch_docs.append(lead_doc)
+
+            # Execute in batches of 10
+            if len(operations) >= batch_size or i == len(results) - 1:
+                try:
+                    result = await leads_col.bulk_write(operations, ordered=False)
+                    upserted = result.upserted_ids
+                    print(f"✅ Batch completed. Inserted: {result.upserted_count}, Matched: {result.matched_count}")
+                except BulkWriteError as bwe:
+                    upserted = {u["index"]: u["_id"] for u in bwe.details.get("upserted", [])}
+                    print(f"⚠️ Batch completed with some duplicates ignored. "
+                          f"Inserted: {bwe.details.get('nInserted', 0)}, "
+                          f"Duplicates: {len(bwe.details.get('writeErrors', []))}")
+                await record_new_leads([batch_docs[i] for i in (upserted or {})])
+                saved += len(upserted or {})
+                events.bus.publish(user_id, "scrape", {"source": "google_maps", "query": query, "total": len(results), "processed": i + 1, "saved": saved, "status": "saving"})
+                operations = []  # Reset for next batch
+                batch_docs = []
+
+        print(f"🎉 Scraping complete. Processed {len(results)} businesses in batches of {batch_size}.")
+        events.bus.publish(user_id, "scrape", {"source": "google_maps", "query": query, "total": len(results), "processed": len(results), "saved": saved, "status": "complete"})
+
+    except Exception as e:
+        print(f"❌ Error in background Google Maps scraping task: {str(e)}")
+        traceback.print_exc()
+        events.bus.publish(user_id, "scrape", {"source": "google_maps", "query": query, "status": "error", "error": str(e)})
@@ -0,0 +1,150 @@
+# send_events.py
+"""Per-message send events, one small document per delivery attempt.
+
+Campaign summaries in `mail_logs` only keep counters; the detail of every
+attempt (lead, account, recipient domain, status, SMTP code, latency) goes
+to the `send_events` time-series collection instead of an ever-growing
+`failed` array. Events are produced inside the blocking SMTP thread and
+handed to the event loop in batches by `SendEventWriter`.
+"""
+import os
+import asyncio
+import threading
+import smtplib
+from datetime import datetime
+from typing import Optional, Any, Dict, List
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+COLLECTION = "send_events"
+BATCH_SIZE = int(os.getenv("SEND_EVENTS_BATCH", 100))
+RETENTION_DAYS = int(os.getenv("SEND_EVENTS_RETENTION_DAYS", 180))  # 0 keeps events forever
+
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+
+
+async def ensure_collection(db):
+    """Create send_events as a time-series collection (MongoDB 5.0+); plain collection otherwise."""
+    options: Dict[str, Any] = {"timeseries": {"timeField": "ts", "metaField": "meta", "granularity": "seconds"}}
+    if RETENTION_DAYS > 0:
+        options["expireAfterSeconds"] = RETENTION_DAYS * 86400
+    try:
+        await db.create_collection(COLLECTION, **options)
+        print(f"🗂️ Created time-series collection {COLLECTION}")
+    except CollectionInvalid:
+        pass  # already exists
+    except OperationFailure as e:
+        print(f"⚠️ {COLLECTION} created as a regular collection: {e.details.get('errmsg') if e.details else e}")
+
+
+def smtp_code(error: Exception) -> Optional[int]:
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code
+    if isinstance(error, smtplib.SMTPRecipientsRefused) and error.recipients:
+        return next(iter(error.recipients.values()))[0]
+    return None
+
+
+def make_event(
+    user_id: str,
+    campaign_id: str,
+    account_id: str,
+    lead_id: Optional[str],
+    recipient: str,
+    status: str,
+    latency_ms: float,
+    code: Optional[int] = None,
+    error: Optional[str] = None,
+    message_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    return {
+        "ts": datetime.utcnow(),
+        "meta": {"user_id": user_id, "account_id": account_id},
+        "campaign_id": campaign_id,
+        "lead_id": lead_id,
+        "email": recipient,
+        "domain": (recipient or "").rsplit("@", 1)[-1].lower(),
+        "status": status,
+        "smtp_code": code,
+        "error": error,
+        "latency_ms": round(latency_ms, 1),
+        "message_id": message_id,
+    }
+
+
+class SendEventWriter:
+    """Collects events from a worker thread and inserts them on the event loop in batches."""
+
+    def __init__(self, col, loop: asyncio.AbstractEventLoop, batch_size: int = BATCH_SIZE):
+        self.col = col
+        self.loop = loop
+        self.batch_size = max(1, batch_size)
+        self._buffer: List[Dict[str, Any]] = []
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def add(self, event: Dict[str, Any]):
+        """Thread-safe; called from the SMTP thread."""
+        with self._lock:
+            self._buffer.append(event)
+            if len(self._buffer) < self.batch_size:
+                return
+            batch, self._buffer = self._buffer, []
+            self._pending.append(asyncio.run_coroutine_threadsafe(self._insert(batch), self.loop))
+
+    async def _insert(self, batch: List[Dict[str, Any]]):
+        try:
+            await self.col.insert_many(batch, ordered=False)
+        except Exception as e:
+            print(f"⚠️ Failed to store {len(batch)} send events: {str(e)}")
+
+    async def flush(self):
+        """Write whatever is buffered and wait for batches still in flight. Call on the loop."""
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+            pending, self._pending = self._pending, []
+        if batch:
+            await self._insert(batch)
+        for future in pending:
+            await asyncio.wrap_future(future)
+
+
+def _window(user_id: str, since: datetime) -> Dict[str, Any]:
+    return {"$match": {"meta.user_id": user_id, "ts": {"$gte": since}}}
+
+
+_TOTALS = {
+    "sent": {"$sum": {"$cond": [{"$eq": ["$status", STATUS_SENT]}, 1, 0]}},
+    "failed": {"$sum": {"$cond": [{"$eq": ["$status", STATUS_FAILED]}, 1, 0]}},
+    "avg_latency_ms": {"$avg": "$latency_ms"},
+}
+
+
+def _finish(row: Dict[str, Any]) -> Dict[str, Any]:
+    attempts = row["sent"] + row["failed"]
+    row["success_rate"] = round(row["sent"] / attempts * 100, 1) if attempts else 100
+    row["avg_latency_ms"] = round(row["avg_latency_ms"] or 0, 1)
+    return row
+
+
+async def by_account(col, user_id: str, since: datetime) -> List[Dict[str, Any]]:
+    rows = await col.aggregate([
+        _window(user_id, since),
+        {"$group": {"_id": "$meta.account_id", **_TOTALS}},
+        {"$sort": {"sent": -1}},
+    ]).to_list(None)
+    return [_finish({"account_id": r.pop("_id"), **r}) for r in rows]
+
+
+async def by_domain(col, user_id: str, since: datetime, limit: int = 50) -> List[Dict[str, Any]]:
+    rows = await col.aggregate([
+        _window(user_id, since),
+        {"$group": {"_id": "$domain", **_TOTALS, "codes": {"$addToSet": "$smtp_code"}}},
+        {"$sort": {"failed": -1, "sent": -1}},
+        {"$limit": limit},
+    ]).to_list(None)
+    out = []
+    for r in rows:
+        r["smtp_codes"] = sorted(c for c in r.pop("codes") if c is not None)
+        out.append(_finish({"domain": r.pop("_id"), **r}))
+    return out
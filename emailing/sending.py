@@ -0,0 +1,385 @@
+# sending.py
+"""Campaign sending: message building, the blocking SMTP loop and `background_send`.
+
+Runs inside the API process (BackgroundTasks) or in `python -m worker
+sender-worker`, which imports this module without the web stack. The SMTP
+loop holds one thread of the smtp pool (executors.py) for the whole
+campaign; progress goes out as `send` events.
+"""
+import os
+import re
+import time
+import base64
+import asyncio
+import smtplib, ssl
+import email.utils
+from datetime import datetime
+from typing import List, Optional, Any, Dict, Callable
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from email.utils import formataddr
+from email import encoders
+from email.mime.base import MIMEBase
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from bounces import UNDELIVERABLE_STATUSES
+import account_health
+import daily_stats
+import events
+import executors
+import lead_counters
+import rephrase_variants
+import send_events
+from db import templates_col, leads_col, email_accounts_col, mail_logs_col, lead_counters_col, daily_stats_col, send_events_col
+from lead_activity import publish_counts
+
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 465))
+SMTP_DELAY = float(os.getenv("SMTP_DELAY", 15.0))  # seconds between emails in the blocking send loop
+
+EMAIL_REGEX = r'^[\w\.-]+@[\w\.-]+\.\w+$'
+
+def is_valid_email(email: str) -> bool:
+    if not email or not isinstance(email, str):
+        return False
+    email = email.strip()
+    if not email:
+        return False
+    return re.match(EMAIL_REGEX, email) is not None
+
+async def get_available_email_accounts(user_id: str) -> List[Dict[str, Any]]:
+    """Get all active, non-quarantined email accounts for a specific user (no daily limit checks)"""
+    # Get all active accounts
+    cursor = email_accounts_col.find({
+        "user_id": user_id,
+        "is_active": True,
+        **account_health.available_filter()
+    })
+    
+    accounts = []
+    async for acc in cursor:
+        accounts.append(acc)
+    
+    return accounts
+
+def build_message(
+    sender_email: str, 
+    recipient_email: str, 
+    subject: str, 
+    body: str, 
+    sender_name: Optional[str] = None,
+    attachments: Optional[List[Dict[str, str]]] = None,
+    message_id: Optional[str] = None
+) -> str:
+    msg = MIMEMultipart()
+    if sender_name:
+        msg["From"] = formataddr((sender_name, sender_email))
+    else:
+        msg["From"] = sender_email
+    msg["To"] = recipient_email
+    msg["Subject"] = subject
+    if message_id:
+        msg["Message-ID"] = message_id  # lets the reply watcher match In-Reply-To back to the lead
+    
+    # Add body
+    msg.attach(MIMEText(body, "plain"))
+    
+    # Add attachments
+    if attachments:
+        for attachment in attachments:
+            try:
+                part = MIMEBase("application", "octet-stream")
+                part.set_payload(base64.b64decode(attachment["content"]))
+                encoders.encode_base64(part)
+                part.add_header(
+                    "Content-Disposition",
+                    f"attachment; filename={attachment['filename']}",
+                )
+                msg.attach(part)
+            except Exception as e:
+                print(f"Failed to attach {attachment['filename']}: {str(e)}")
+                continue
+    
+    return msg.as_string()
+
+def send_bulk_via_smtp_blocking(
+    email_accounts: List[Dict[str, Any]], 
+    messages: List[Dict[str, Any]], 
+    delay: float = 1.0,
+    on_event: Optional[Callable[..., None]] = None
+) -> Dict[str, Any]:
+    """Send emails using multiple accounts with round-robin distribution (no daily limits).
+
+    `on_event(message, account_id, status, latency_ms, **details)` is called after every attempt.
+    """
+    sent = []
+    failed = []
+    auth_failed = []
+    
+    # Create SMTP connections for each account
+    connections = {}
+    for acc in email_accounts:
+        try:
+            ctx = ssl.create_default_context()
+            server = smtplib.SMTP_SSL(acc.get("smtp_host", SMTP_HOST), acc.get("smtp_port", SMTP_PORT), context=ctx)
+            server.login(acc["email"], acc["password"])
+            connections[str(acc["_id"])] = server
+        except Exception as e:
+            print(f"Failed to connect with account {acc['email']}: {str(e)}")
+            if account_health.is_auth_error(e):
+                auth_failed.append({"account_id": str(acc["_id"]), "error": str(e)})
+            # Remove failed account from pool
+            email_accounts = [a for a in email_accounts if a["_id"] != acc["_id"]]
+    
+    logged_in = list(connections.keys())
+    if not connections:
+        return {"sent": sent, "failed": failed, "auth_failed": auth_failed, "logged_in": logged_in,
+                "error": "No valid email accounts available"}
+    
+    # Round-robin distribution of emails to accounts
+    account_ids = list(connections.keys())
+    current_account_index = 0
+    
+    for i, m in enumerate(messages):
+        if not email_accounts:
+            break  # No accounts left
+            
+        # Select next account in round-robin fashion
+        account_id = account_ids[current_account_index]
+        account = next((acc for acc in email_accounts if str(acc["_id"]) == account_id), None)
+        
+        if not account:
+            continue
+            
+        started = time.perf_counter()
+        try:
+            message_id = email.utils.make_msgid(domain=account["email"].split("@")[-1])
+            msgstr = build_message(
+                account["email"], 
+                m["to"], 
+                m["subject"], 
+                m["body"], 
+                sender_name=account.get("sender_name"),
+                attachments=m.get("attachments"),
+                message_id=message_id
+            )
+            connections[account_id].sendmail(account["email"], m["to"], msgstr)
+            sent.append({"email": m["to"], "account_id": str(account["_id"]), "message_id": message_id})
+            print(f"Sent email to {m['to']} using account {account['email']}")
+            if on_event:
+                on_event(m, account_id, send_events.STATUS_SENT, (time.perf_counter() - started) * 1000,
+                         code=250, message_id=message_id)
+        except Exception as e:
+            error_msg = str(e)
+            print(f"Failed to send to {m.get('to')} using account {account['email']}: {error_msg}")
+            failed.append({"email": m.get("to"), "error": error_msg, "account_id": str(account["_id"])})
+            if on_event:
+                on_event(m, account_id, send_events.STATUS_FAILED, (time.perf_counter() - started) * 1000,
+                         code=send_events.smtp_code(e), error=error_msg)
+            
+            # If connection failed, remove this account from pool
+            try:
+                connections[account_id].quit()
+            except:
+                pass
+            del connections[account_id]
+            email_accounts = [a for a in email_accounts if str(a["_id"]) != account_id]
+            account_ids = list(connections.keys())
+            if not account_ids:
+                break
+            current_account_index = current_account_index % len(account_ids)
+        
+        # Move to next account
+        current_account_index = (current_account_index + 1) % len(account_ids)
+        
+        if delay and delay > 0:
+            time.sleep(delay)
+    
+    # Close all connections
+    for conn in connections.values():
+        try:
+            conn.quit()
+        except:
+            pass
+    
+    return {"sent": sent, "failed": failed, "auth_failed": auth_failed, "logged_in": logged_in}
+
+async def mark_leads_sent(lead_ids: List[str], user_id: str):
+    oids = []
+    for lid in lead_ids:
+        try:
+            oids.append(ObjectId(lid))
+        except Exception:
+            continue
+    if not oids:
+        return
+    now = datetime.utcnow()
+    # flip unsent leads first so modified_count is exactly what moves between the counters
+    flipped = await leads_col.update_many(
+        {"_id": {"$in": oids}, "user_id": user_id, "mail_sent": False},
+        {"$set": {"mail_sent": True, "last_mailed_at": now}}
+    )
+    if flipped.modified_count < len(oids):
+        await leads_col.update_many(
+            {"_id": {"$in": oids}, "user_id": user_id},  # re-sends to already sent leads
+            {"$set": {"mail_sent": True, "last_mailed_at": now}}
+        )
+    if flipped.modified_count:
+        await lead_counters.record_marked_sent(lead_counters_col, user_id, flipped.modified_count)
+        await publish_counts(user_id)
+
+async def record_outbound_message_ids(leads: List[Dict[str, Any]], sent: List[Dict[str, Any]]):
+    """Remember the Message-ID sent to each lead so replies can be matched via In-Reply-To"""
+    message_ids = {s["email"]: s["message_id"] for s in sent if s.get("message_id")}
+    ops = [
+        UpdateOne(
+            {"_id": l["_id"]},
+            {"$push": {"outbound_message_ids": {"$each": [message_ids[l["email"]]], "$slice": -20}}}
+        )
+        for l in leads if l.get("email") in message_ids
+    ]
+    if ops:
+        await leads_col.bulk_write(ops, ordered=False)
+
+def abort_send(user_id: str, status: str, message: Optional[str] = None) -> Dict[str, Any]:
+    """Result for a campaign that never started; also ends the /events progress for it"""
+    events.bus.publish(user_id, "send", {"total": 0, "sent": 0, "failed": 0, "status": "error", "error": message or status})
+    result = {"status": status}
+    if message:
+        result["message"] = message
+    return result
+
+async def background_send(template_id: str, lead_ids: List[str], user_id: str, attachments: Optional[List[Dict[str, str]]] = None, email_account_ids: Optional[List[str]] = None):
+    tmpl = None
+    if ObjectId.is_valid(template_id):
+        tmpl = await templates_col.find_one({"_id": ObjectId(template_id), "user_id": user_id})
+    if not tmpl:
+        return abort_send(user_id, "template_not_found")
+
+    # Convert lead IDs to ObjectIds
+    lead_object_ids = []
+    for lid in lead_ids:
+        try:
+            if ObjectId.is_valid(lid):
+                lead_object_ids.append(ObjectId(lid))
+        except Exception:
+            continue
+    
+    if not lead_object_ids:
+        return abort_send(user_id, "no_valid_leads")
+    
+    q = {"_id": {"$in": lead_object_ids}, "user_id": user_id, "email_status": {"$nin": UNDELIVERABLE_STATUSES}}
+    leads_cursor = leads_col.find(q)
+    leads = []
+    async for l in leads_cursor:
+        leads.append(l)
+
+    messages = []
+    valid_leads = []
+    # stored variants rotate per recipient; falls back to the template content
+    body_for = rephrase_variants.rotation(tmpl)
+    for l in leads:
+        recipient = l.get("email")
+        # Skip leads without email or with invalid email
+        if not recipient or not is_valid_email(recipient):
+            continue
+        
+        body = body_for(len(messages))
+        first = l["owner_name"].split()[0] if l.get("owner_name") else ""
+        body = body.replace("{First Name}", first)
+        body = body.replace("{Company}", l.get("company_name", ""))
+        subject = tmpl.get("subject", "")
+        
+        messages.append({
+            "to": recipient, 
+            "subject": subject, 
+            "body": body,
+            "attachments": attachments,
+            "lead_id": str(l["_id"])
+        })
+        valid_leads.append(l)
+
+    if not messages:
+        return abort_send(user_id, "no_valid_recipients")
+
+    # Get available email accounts
+    if email_account_ids:
+        # Use specific accounts requested
+        account_oids = [ObjectId(acc_id) for acc_id in email_account_ids if ObjectId.is_valid(acc_id)]
+        email_accounts = await email_accounts_col.find({
+            "_id": {"$in": account_oids},
+            "user_id": user_id,
+            "is_active": True,
+            **account_health.available_filter()
+        }).to_list(length=None)
+    else:
+        # Use all available accounts for this user
+        email_accounts = await get_available_email_accounts(user_id)
+    
+    if not email_accounts:
+        return abort_send(user_id, "no_valid_accounts", "No active email accounts available")
+
+    # Per-message outcomes go to send_events; mail_logs only keeps the campaign counters
+    campaign_id = ObjectId()
+    writer = send_events.SendEventWriter(send_events_col, asyncio.get_running_loop())
+    progress = {"campaign_id": str(campaign_id), "total": len(messages), "sent": 0, "failed": 0, "status": "sending"}
+    events.bus.publish(user_id, "send", dict(progress))
+    def on_event(m, account_id, status, latency_ms, **details):
+        writer.add(send_events.make_event(
+            user_id, str(campaign_id), account_id, m.get("lead_id"), m["to"], status, latency_ms, **details
+        ))
+        progress[status] += 1
+        events.bus.publish_threadsafe(user_id, "send", dict(progress))
+
+    try:
+        # holds one smtp pool thread for the whole campaign
+        result = await executors.run(
+            "smtp",
+            send_bulk_via_smtp_blocking, 
+            email_accounts, 
+            messages, 
+            SMTP_DELAY,
+            on_event
+        )
+    finally:
+        await writer.flush()
+
+    # Feed SMTP login outcomes into the per-account negative cache
+    accounts_by_id = {str(acc["_id"]): acc for acc in email_accounts}
+    for failure in result.get("auth_failed", []):
+        await account_health.record_auth_failure(email_accounts_col, accounts_by_id[failure["account_id"]], failure["error"])
+    for acc_id in result.get("logged_in", []):
+        await account_health.record_auth_success(email_accounts_col, accounts_by_id[acc_id])
+
+    # Update tracking of sent emails
+    sent_emails = [s["email"] for s in result.get("sent", [])]
+    sent_lead_ids = [str(l["_id"]) for l in valid_leads if l.get("email") in sent_emails]
+    if sent_lead_ids:
+        await mark_leads_sent(sent_lead_ids, user_id)
+        await record_outbound_message_ids(valid_leads, result.get("sent", []))
+
+    logged_at = datetime.utcnow()
+    await mail_logs_col.insert_one({
+        "_id": campaign_id,
+        "template_id": template_id,
+        "user_id": user_id,
+        "sent_count": len(result.get("sent", [])),
+        "failed_count": len(result.get("failed", [])),
+        "created_at": logged_at,
+        "had_attachments": bool(attachments),
+        "accounts_used": [str(acc["_id"]) for acc in email_accounts],
+        "total_leads_processed": len(leads),
+        "valid_leads_count": len(valid_leads)
+    })
+    await daily_stats.record_campaign(
+        daily_stats_col, user_id, len(result.get("sent", [])), len(result.get("failed", [])), logged_at
+    )
+    events.bus.publish(user_id, "send", {
+        **progress,
+        "sent": len(result.get("sent", [])),
+        "failed": len(result.get("failed", [])),
+        "status": "error" if result.get("error") else "complete",
+        "error": result.get("error"),
+    })
+    return result
@@ -0,0 +1,6 @@
+# tests/conftest.py
+# the API's modules are flat files in emailing/, imported as `import x`
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,51 @@
+# tests/test_account_health.py
+import smtplib
+
+from imap_tools.errors import MailboxLoginError
+
+import account_health
+import sending
+
+
+def test_auth_errors_by_type_and_code():
+    assert account_health.is_auth_error(smtplib.SMTPAuthenticationError(535, b"5.7.8 Username and Password not accepted"))
+    assert account_health.is_auth_error(smtplib.SMTPResponseException(534, b"5.7.9 Application-specific password required"))
+    assert account_health.is_auth_error(MailboxLoginError(("NO", [b"[AUTHENTICATIONFAILED] Invalid credentials"]), "OK"))
+
+
+def test_unrelated_errors_mentioning_535_are_not_auth_errors():
+    assert not account_health.is_auth_error(smtplib.SMTPServerDisconnected("Connection to 10.0.5.35:535 unexpectedly closed"))
+    assert not account_health.is_auth_error(smtplib.SMTPResponseException(421, b"4.7.0 Try again later, ref 5350012"))
+    assert not account_health.is_auth_error(OSError("sent 535 bytes before the login failed"))
+    assert not account_health.is_auth_error(TimeoutError("timed out waiting for <535.abc@mail.example.com>"))
+
+
+class FakeSMTP:
+    error = None
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def login(self, user, password):
+        raise self.error
+
+    def quit(self):
+        pass
+
+
+def send_with_login_error(monkeypatch, error):
+    FakeSMTP.error = error
+    monkeypatch.setattr(sending.smtplib, "SMTP_SSL", FakeSMTP)
+    account = {"_id": "acc1", "email": "sender@example.com", "password": "pw"}
+    message = {"to": "lead@example.com", "subject": "s", "body": "b"}
+    return sending.send_bulk_via_smtp_blocking([account], [message], 0)
+
+
+def test_unrelated_535_error_does_not_quarantine_the_account(monkeypatch):
+    result = send_with_login_error(monkeypatch, smtplib.SMTPServerDisconnected("relay on port 535 closed the connection"))
+    assert result["auth_failed"] == []
+
+
+def test_rejected_login_quarantines_the_account(monkeypatch):
+    result = send_with_login_error(monkeypatch, smtplib.SMTPAuthenticationError(535, b"5.7.8 Bad credentials"))
+    assert [f["account_id"] for f in result["auth_failed"]] == ["acc1"]
@@ -0,0 +1,83 @@
+# tests/test_bounces.py
+import asyncio
+from email.message import EmailMessage
+
+import bounces
+from lead_import import CASE_INSENSITIVE
+
+ACCOUNT = "me@sender.com"
+
+
+def message(from_email, subject, body, **headers):
+    msg = EmailMessage()
+    msg["From"] = from_email
+    msg["Subject"] = subject
+    for name, value in headers.items():
+        msg[name.replace("_", "-")] = value
+    msg.set_content(body)
+    return msg
+
+
+def classify(msg):
+    return bounces.classify_message(msg, msg["From"], msg["Subject"], ACCOUNT)
+
+
+def test_human_reply_with_bounce_like_subject_is_not_a_bounce():
+    msg = message(
+        "bob@client.com", "Re: returned mail policy",
+        "Thanks, please also loop in alice@other.com about this.\n\n> me@sender.com wrote: ...",
+    )
+    assert classify(msg) is None
+
+
+def test_human_auto_reply_with_bounce_like_subject_stays_an_auto_reply():
+    msg = message(
+        "bob@client.com", "Re: returned mail policy",
+        "I'm away until Monday, contact alice@other.com.", Auto_Submitted="auto-replied",
+    )
+    assert classify(msg) == {"kind": "auto_reply", "email": "bob@client.com"}
+
+
+def test_daemon_bounce_takes_the_address_from_the_body():
+    msg = message(
+        "MAILER-DAEMON@mx.example.com", "Undelivered Mail Returned to Sender",
+        "Delivery to Lead@Client.com failed: 550 5.1.1 user unknown",
+    )
+    assert classify(msg) == {
+        "kind": "bounce",
+        "failures": [{"email": "lead@client.com", "status": "5.1.1", "diagnostic": None}],
+    }
+
+
+def test_permanent_status_from_a_relay_counts_as_a_bounce():
+    msg = message(
+        "notices@relay.example.com", "Delivery has failed",
+        "Your message could not be delivered: 5.2.2 mailbox full",
+        X_Failed_Recipients="lead@client.com",
+    )
+    result = classify(msg)
+    assert result["kind"] == "bounce"
+    assert [f["email"] for f in result["failures"]] == ["lead@client.com"]
+
+
+def test_daemon_transient_failure_is_ignored():
+    msg = message("postmaster@mx.example.com", "Delivery delayed", "4.4.1 connection timed out for lead@client.com")
+    assert classify(msg) is None
+
+
+def test_feedback_updates_match_leads_case_insensitively():
+    class Leads:
+        ops = []
+
+        async def bulk_write(self, ops, ordered=True):
+            self.ops.extend(ops)
+
+    leads = Leads()
+    results = [
+        {"kind": "bounce", "failures": [{"email": "lead@client.com", "status": "5.1.1", "diagnostic": None}]},
+        {"kind": "auto_reply", "email": "bob@client.com"},
+    ]
+    counts = asyncio.run(bounces.apply_feedback({"leads": leads}, "u1", results))
+    assert counts == {"bounced": 1, "auto_replies": 1}
+    assert len(leads.ops) == 2
+    assert all(op._collation == CASE_INSENSITIVE for op in leads.ops)
@@ -0,0 +1,33 @@
+# tests/test_event_stream_token.py
+import asyncio
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+
+import main
+
+
+def rejected(token, scope=None):
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(main.user_from_token(token, scope=scope))
+    return excinfo.value.status_code == 401
+
+
+def test_access_token_is_not_accepted_as_a_stream_token():
+    access = main.create_access_token({"sub": "a@b.com", "tv": 0})
+    assert rejected(access, scope=main.EVENTS_TOKEN_SCOPE)
+
+
+def test_stream_token_is_not_accepted_as_an_access_token():
+    stream = main.create_access_token(
+        {"sub": "a@b.com", "tv": 0, "scope": main.EVENTS_TOKEN_SCOPE}, expires_delta=timedelta(seconds=60)
+    )
+    assert rejected(stream)
+
+
+def test_expired_stream_token_is_rejected():
+    stream = main.create_access_token(
+        {"sub": "a@b.com", "tv": 0, "scope": main.EVENTS_TOKEN_SCOPE}, expires_delta=timedelta(seconds=-1)
+    )
+    assert rejected(stream, scope=main.EVENTS_TOKEN_SCOPE)
@@ -0,0 +1,42 @@
+# tests/test_rephrase_variants.py
+import asyncio
+
+import rephrase_variants
+from rephrase_variants import source_hash
+
+SOURCE = "Hi {First Name},\n\nWe help {Company} grow.\n\nBest"
+
+
+def run_generate(outputs, count, retries=3):
+    replies = iter(outputs)
+
+    async def run_one():
+        return next(replies)
+
+    return asyncio.run(rephrase_variants.generate(run_one, count, retries=retries, source=SOURCE))
+
+
+def test_variant_that_drops_a_placeholder_is_regenerated(monkeypatch):
+    monkeypatch.setattr(rephrase_variants, "VARIANT_BACKOFF_SECONDS", 0)
+    variants, errors = run_generate([
+        "Hello there,\n\nWe help {Company} grow.",          # lost {First Name}
+        "Hey {First Name}, we help {Company} grow.",
+    ], count=1)
+    assert variants == ["Hey {First Name}, we help {Company} grow."]
+    assert errors == []
+
+
+def test_variant_with_an_invented_placeholder_is_rejected(monkeypatch):
+    monkeypatch.setattr(rephrase_variants, "VARIANT_BACKOFF_SECONDS", 0)
+    variants, errors = run_generate(["Hi {First Name} at {Company} in {City}"], count=1, retries=0)
+    assert variants == []
+    assert errors == ["variant changed the placeholders"]
+
+
+def test_stored_pool_skips_variants_without_the_placeholders():
+    tmpl = {
+        "content": SOURCE,
+        "variants_source": source_hash(SOURCE),
+        "variants": ["Dear customer, we help businesses grow.", "Hey {First Name}, {Company} could grow."],
+    }
+    assert rephrase_variants.pool_for(tmpl) == ["Hey {First Name}, {Company} could grow."]
@@ -0,0 +1,70 @@
+# tests/test_reply_watcher.py
+import asyncio
+from types import SimpleNamespace
+
+import reply_watcher
+
+RAW = b"From: lead@client.com\r\nSubject: Re: hello\r\n\r\nsounds good\r\n"
+
+
+class FakeImap:
+    """Serves UID SEARCH / UID FETCH the way aioimaplib returns them."""
+
+    def __init__(self, uids):
+        self.uids = sorted(uids)
+        self.fetches = []
+
+    async def uid_search(self, criteria, charset="utf-8"):
+        low = int(criteria.split()[1].split(":")[0])
+        # `n:*` also matches the highest UID when it is below n
+        found = [u for u in self.uids if u >= low] or self.uids[-1:]
+        return SimpleNamespace(result="OK", lines=[b"SEARCH " + b" ".join(str(u).encode() for u in found), b"SEARCH completed"])
+
+    async def uid(self, command, uid_set, parts):
+        low, high = (int(u) for u in uid_set.split(":"))
+        self.fetches.append((low, high))
+        lines = []
+        for u in self.uids:
+            if low <= u <= high:
+                lines += [f"{u} FETCH (UID {u} BODY[]<0> {{{len(RAW)}}}".encode(), bytearray(RAW), b")"]
+        return SimpleNamespace(result="OK", lines=lines + [b"FETCH completed"])
+
+
+def run_sync(monkeypatch, uids, last_uid, batch):
+    monkeypatch.setattr(reply_watcher, "FETCH_BATCH", batch)
+    recorded, watermarks = [], []
+
+    async def record_messages(db, account, uidvalidity, parsed):
+        recorded.append([m["uid"] for m in parsed])
+        return 0
+
+    async def save_watermark(db, account_id, uidvalidity, last_uid):
+        watermarks.append(last_uid)
+
+    monkeypatch.setattr(reply_watcher, "record_messages", record_messages)
+    monkeypatch.setattr(reply_watcher, "save_watermark", save_watermark)
+    watcher = reply_watcher.AccountWatcher(None, {"_id": "a1", "email": "me@sender.com"}, asyncio.Semaphore(1))
+    watcher.imap, watcher.uidvalidity, watcher.last_uid = FakeImap(uids), 7, last_uid
+    total = asyncio.run(watcher.sync())
+    return watcher, total, recorded, watermarks
+
+
+def test_parse_search_response():
+    assert reply_watcher.parse_search_response([b"SEARCH 9 4 7", b"SEARCH completed (Success)"]) == [4, 7, 9]
+    assert reply_watcher.parse_search_response([b"SEARCH", b"SEARCH completed"]) == []
+
+
+def test_sync_fetches_bounded_windows_and_advances_the_watermark(monkeypatch):
+    uids = [u for u in range(1, 121) if u % 10]  # gaps where messages were expunged
+    watcher, total, recorded, watermarks = run_sync(monkeypatch, uids, last_uid=0, batch=50)
+    assert total == len(uids)
+    assert all(len(chunk) <= 50 for chunk in recorded)
+    assert [uid for chunk in recorded for uid in chunk] == uids
+    assert watcher.imap.fetches == [(1, 55), (56, 111), (112, 119)]
+    assert watermarks == [55, 111, 119]
+    assert watcher.last_uid == 119
+
+
+def test_sync_with_nothing_new_fetches_nothing(monkeypatch):
+    watcher, total, recorded, watermarks = run_sync(monkeypatch, [3, 5, 8], last_uid=8, batch=50)
+    assert (total, recorded, watermarks, watcher.imap.fetches) == (0, [], [], [])
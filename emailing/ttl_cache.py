@@ -0,0 +1,47 @@
+# ttl_cache.py
+"""Small in-process TTL/LRU map shared by the per-process caches.
+
+Entries expire `ttl` seconds after they were stored; past `max_size` the
+least recently used entry is dropped. Not thread-safe: use it from the
+event loop only.
+"""
+import time
+from collections import OrderedDict
+from typing import Optional, Any, Dict, Tuple
+
+
+class TTLCache:
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: str, value: Any):
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: str):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses, "ttl_seconds": self.ttl}
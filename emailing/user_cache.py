@@ -0,0 +1,29 @@
+# user_cache.py
+"""In-process TTL/LRU cache of authenticated users, keyed by the token subject.
+
+`get_current_user` used to read the users collection on every request. With
+the cache a request only touches Mongo when the user is not cached or the
+entry is older than USER_CACHE_TTL_SECONDS. Revocation is carried by the
+`tv` (token version) claim: tokens are issued with the user's current
+`token_version`, bumping it rejects every older token, and the bump
+invalidates the local entry right away. Other API processes see the bump
+once their entry expires, so the TTL bounds how long a revoked token can
+still work elsewhere.
+"""
+import os
+from typing import Any, Dict
+
+from ttl_cache import TTLCache
+
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", 60))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", 10000))
+
+# never keep credentials in memory longer than needed
+USER_PROJECTION = {"password": 0}
+
+
+def token_version(user: Dict[str, Any]) -> int:
+    return int(user.get("token_version", 0))
+
+
+cache = TTLCache(USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_SIZE)
@@ -0,0 +1,144 @@
+# worker.py
+"""Worker processes for campaign sends and scrapes, without the web stack.
+
+    python -m worker sender-worker  [--concurrency 4]
+    python -m worker scraper-worker [--concurrency 1]
+
+Each worker claims jobs of its kind from the `jobs` collection (see jobs.py;
+the API enqueues them when WORKER_MODE=queue), runs up to --concurrency at
+once and keeps their leases alive while they run. Only db, the job queue
+and the sending or scraping module are imported; FastAPI, auth and the
+agents SDK are not, so a worker starts quickly and stays small. Workers
+scale independently of the API: run as many of each as the load needs.
+SIGINT/SIGTERM stop new claims and let running jobs finish.
+"""
+import os
+import sys
+import signal
+import asyncio
+import argparse
+import traceback
+from typing import Any, Awaitable, Callable, Dict
+
+import events
+import executors
+import jobs
+from db import jobs_col, job_events_col
+
+ROLE_CONCURRENCY = {
+    "sender": int(os.getenv("SENDER_WORKER_CONCURRENCY", 4)),
+    "scraper": int(os.getenv("SCRAPER_WORKER_CONCURRENCY", 1)),
+}
+
+
+def handlers_for(role: str) -> Dict[str, Callable[[Dict[str, Any], str], Awaitable[Any]]]:
+    """Job kind -> coroutine running it; the role's module is imported here, not at startup."""
+    if role == "sender":
+        import sending
+
+        async def send(payload, user_id):
+            result = await sending.background_send(
+                payload["template_id"], payload["lead_ids"], user_id,
+                payload.get("attachments"), payload.get("email_account_ids"),
+            )
+            # the full per-recipient lists stay in send_events
+            return {
+                "status": result.get("status") or ("error" if result.get("error") else "complete"),
+                "sent": len(result.get("sent", [])),
+                "failed": len(result.get("failed", [])),
+                "error": result.get("error") or result.get("message"),
+            }
+        return {"send": send}
+
+    import scraping
+
+    async def bing(payload, user_id):
+        await scraping.save_scraped_data_to_db(payload["query"], payload["max_businesses"], user_id)
+
+    async def google(payload, user_id):
+        await scraping.save_google_scraped_data_to_db(payload["query"], payload["max_businesses"], user_id)
+    return {"scrape_bing_maps": bing, "scrape_google_maps": google}
+
+
+async def keep_lease(job_id, worker: str):
+    while True:
+        await asyncio.sleep(jobs.JOB_LEASE_SECONDS / 3)
+        if not await jobs.extend_lease(jobs_col, job_id, worker):
+            print(f"⚠️ Lost the lease on job {job_id}")
+            return
+
+
+async def run_job(job: Dict[str, Any], handler, worker: str):
+    print(f"▶️ Job {job['_id']} ({job['kind']}) attempt {job['attempts']} for user {job['user_id']}")
+    lease = asyncio.create_task(keep_lease(job["_id"], worker))
+    try:
+        result = await handler(job.get("payload", {}), job["user_id"])
+        await jobs.finish(jobs_col, job["_id"], worker, result if isinstance(result, dict) else None)
+        print(f"✅ Job {job['_id']} done")
+    except Exception as e:
+        traceback.print_exc()
+        await jobs.fail(jobs_col, job["_id"], worker, str(e))
+        print(f"❌ Job {job['_id']} failed: {e}")
+    finally:
+        lease.cancel()
+
+
+async def run(role: str, concurrency: int):
+    worker = jobs.worker_id()
+    handlers = handlers_for(role)
+    kinds = list(handlers)
+    shipper = jobs.EventShipper(job_events_col)
+    events.bus.forward_to(shipper.add)
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stopping.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    slots = asyncio.Semaphore(concurrency)
+    running = set()
+    print(f"👷 {role}-worker {worker} started: kinds {', '.join(kinds)}, concurrency {concurrency}")
+    while not stopping.is_set():
+        await slots.acquire()
+        if stopping.is_set():
+            slots.release()
+            break
+        try:
+            await jobs.expire_lost(jobs_col, kinds)
+            job = await jobs.claim(jobs_col, kinds, worker)
+        except Exception as e:
+            print(f"⚠️ Could not claim a job: {e}")
+            job = None
+        if job is None:
+            slots.release()
+            try:
+                await asyncio.wait_for(stopping.wait(), timeout=jobs.JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        task = asyncio.create_task(run_job(job, handlers[job["kind"]], worker))
+        running.add(task)
+        task.add_done_callback(running.discard)
+        task.add_done_callback(lambda _: slots.release())
+
+    print(f"🛑 {role}-worker stopping; waiting for {len(running)} running job(s)")
+    if running:
+        await asyncio.gather(*running, return_exceptions=True)
+    await shipper.flush()
+    executors.shutdown(wait=False)
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Run a send or scrape worker")
+    parser.add_argument("role", choices=sorted(f"{role}-worker" for role in jobs.ROLES))
+    parser.add_argument("--concurrency", type=int, default=None, help="jobs run at once (default from env)")
+    args = parser.parse_args(argv)
+    role = args.role[:-len("-worker")]
+    asyncio.run(run(role, args.concurrency or ROLE_CONCURRENCY[role]))
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -65,42 +65,24 @@ const AnalyticsDashboard = () => {
         'Content-Type': 'application/json',
       };
 
-      // Fetch daily stats from the API.
-      const statsResponse = await fetch(`${BASE_URL}/analytics/daily-stats?days=${daysRange}`, {
+      // Fetch daily stats and the summary in one request.
+      const dashboardResponse = await fetch(`${BASE_URL}/dashboard?page=analytics&days=${daysRange}`, {
         headers: headers
       });
 
-      if (!statsResponse.ok) {
-        if (statsResponse.status === 401) {
+      if (!dashboardResponse.ok) {
+        if (dashboardResponse.status === 401) {
           const authError = 'Authentication failed. Please log in again.';
           toast.error(authError);
           throw new Error(authError);
         }
-        const fetchError = `Failed to fetch daily stats: ${statsResponse.statusText}`;
+        const fetchError = `Failed to fetch analytics: ${dashboardResponse.statusText}`;
         toast.error(fetchError);
         throw new Error(fetchError);
       }
 
-      const statsData = await statsResponse.json();
+      const { daily_stats: statsData, summary: summaryData } = await dashboardResponse.json();
       setDailyStats(statsData);
-
-      // Fetch summary data from the API.
-      const summaryResponse = await fetch(`${BASE_URL}/analytics/summary`, {
-        headers: headers
-      });
-
-      if (!summaryResponse.ok) {
-        if (summaryResponse.status === 401) {
-          const authError = 'Authentication failed. Please log in again.';
-          toast.error(authError);
-          throw new Error(authError);
-        }
-        const fetchError = `Failed to fetch summary: ${summaryResponse.statusText}`;
-        toast.error(fetchError);
-        throw new Error(fetchError);
-      }
-
-      const summaryData = await summaryResponse.json();
       setSummary(summaryData);
 
     } catch (error) {
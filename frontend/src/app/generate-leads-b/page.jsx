@@ -2,6 +2,7 @@
 import { useState, useEffect } from 'react';
 import Head from 'next/head';
 import toast, { Toaster } from 'react-hot-toast';
+import useServerEvents from '@/lib/useServerEvents';
 
 export default function BingMapsScraper() {
   const [query, setQuery] = useState('');
@@ -36,6 +37,31 @@ export default function BingMapsScraper() {
     fetchRecentLeads();
   }, []);
 
+  // Scrape progress is pushed by the backend over server-sent events instead of polled.
+  useServerEvents({
+    scrape: (data) => {
+      if (data.source !== 'bing_maps') return;
+      if (data.status === 'error') {
+        toast.error(data.error || 'Scraping failed');
+        setIsScraping(false);
+        setScrapeProgress({ scraped: 0, total: 0, status: 'error' });
+        return;
+      }
+      const complete = data.status === 'complete';
+      setScrapeProgress(prev => ({
+        ...prev,
+        scraped: data.saved ?? prev.scraped,
+        total: data.total ?? prev.total,
+        status: complete ? 'complete' : 'in_progress'
+      }));
+      if (complete) {
+        setIsScraping(false);
+        fetchRecentLeads();
+        toast.success(`Scraping completed! Found ${data.saved} businesses`);
+      }
+    }
+  }, 'http://127.0.0.1:8000');
+
   const fetchRecentLeads = async () => {
     try {
       setIsLoadingLeads(true);
@@ -119,8 +145,7 @@ export default function BingMapsScraper() {
         status: 'in_progress'
       }));
 
-      // Start polling for progress
-      startProgressPolling(maxBusinesses);
+      // Progress now arrives through the 'scrape' server-sent events.
     } catch (error) {
       toast.error(error.message || 'Failed to start scraping');
       setIsScraping(false);
@@ -132,69 +157,6 @@ export default function BingMapsScraper() {
     }
   };
 
-  const startProgressPolling = (total) => {
-    const interval = setInterval(async () => {
-      try {
-        const token = getAuthToken();
-        if (!token) {
-          clearInterval(interval);
-          toast.error('Authentication lost. Please log in again.');
-          return;
-        }
-
-        // Get count of unsent leads (newly scraped ones)
-        const countRes = await fetch('http://127.0.0.1:8000/leads/count?sent=false', {
-          headers: {
-            'Authorization': `Bearer ${token}`,
-          }
-        });
-
-        if (!countRes.ok) {
-          if (countRes.status === 401) {
-            clearInterval(interval);
-            toast.error('Authentication failed. Please log in again.');
-            return;
-          }
-          throw new Error(`Failed to fetch lead count: ${countRes.statusText}`);
-        }
-
-        const countData = await countRes.json();
-        const newLeads = countData.count;
-
-        let shouldComplete = false;
-
-        setScrapeProgress(prev => {
-          const newProgress = {
-            ...prev,
-            scraped: newLeads,
-            total: total
-          };
-
-          if (newLeads >= total || prev.scraped === newLeads) {
-            if (prev.scraped === newLeads && prev.status === 'in_progress') {
-              newProgress.status = 'complete';
-              shouldComplete = true;
-            }
-          }
-          return newProgress;
-        });
-
-        if (shouldComplete) {
-          setIsScraping(false);
-          clearInterval(interval);
-          fetchRecentLeads();
-          toast.success(`Scraping completed! Found ${newLeads} businesses`);
-        }
-      } catch (error) {
-        console.error('Error polling progress:', error);
-        if (error.message.includes('Authentication')) {
-          clearInterval(interval);
-          toast.error(error.message);
-        }
-      }
-    }, 3000); // Poll every 3 seconds
-  };
-
   const getStatusMessage = () => {
     switch (scrapeProgress.status) {
       case 'starting':
@@ -1,7 +1,8 @@
 'use client';
 
-import React, { useState, useEffect, useRef } from 'react';
+import React, { useState, useEffect } from 'react';
 import toast, { Toaster } from 'react-hot-toast';
+import useServerEvents from '@/lib/useServerEvents';
 
 const GoogleMapsScraper = () => {
   const BASE_URL = process.env.NEXT_PUBLIC_BASE_URL;
@@ -20,9 +21,6 @@ const GoogleMapsScraper = () => {
   const [recentLeads, setRecentLeads] = useState([]);
   const [isLoadingLeads, setIsLoadingLeads] = useState(true);
 
-  // Use a ref to hold the polling interval so we can clear it later.
-  const pollingIntervalRef = useRef(null);
-
   // Helper function to get the authentication token from local storage.
   const getAuthToken = () => {
     if (typeof window !== 'undefined') {
@@ -31,17 +29,35 @@ const GoogleMapsScraper = () => {
     return null;
   };
 
-  // Effect to fetch recent leads on component mount and whenever a scrape completes.
+  // Effect to fetch recent leads on component mount.
   useEffect(() => {
     fetchRecentLeads();
+  }, []);
 
-    // Cleanup function for the interval on component unmount.
-    return () => {
-      if (pollingIntervalRef.current) {
-        clearInterval(pollingIntervalRef.current);
+  // Scrape progress is pushed by the backend over server-sent events instead of polled.
+  useServerEvents({
+    scrape: (data) => {
+      if (data.source !== 'google_maps') return;
+      if (data.status === 'error') {
+        toast.error(data.error || 'An error occurred during scraping.');
+        setIsScraping(false);
+        setScrapeProgress({ scraped: 0, total: 0, status: 'error' });
+        return;
       }
-    };
-  }, []);
+      const complete = data.status === 'complete';
+      setScrapeProgress(prev => ({
+        ...prev,
+        scraped: data.saved ?? prev.scraped,
+        total: data.total ?? prev.total,
+        status: complete ? 'complete' : 'in_progress'
+      }));
+      if (complete) {
+        setIsScraping(false);
+        fetchRecentLeads(); // Fetch the new leads to display in the table
+        toast.success(`Scraping completed! Found ${data.saved} new businesses.`);
+      }
+    }
+  });
 
   /**
    * Fetches the 10 most recent unsent leads from the backend API.
@@ -134,8 +150,7 @@ const GoogleMapsScraper = () => {
         status: 'in_progress'
       }));
 
-      // Start polling for progress after a successful API call
-      startProgressPolling(maxBusinesses);
+      // Progress now arrives through the 'scrape' server-sent events.
     } catch (error) {
       toast.error(error.message || 'Failed to start scraping');
       setIsScraping(false);
@@ -147,84 +162,6 @@ const GoogleMapsScraper = () => {
     }
   };
 
-  /**
-   * Polls the backend API at a regular interval to check for scraping progress.
-   * Clears the interval when the scraping is complete or an error occurs.
-   */
-  const startProgressPolling = (total) => {
-    // Clear any existing interval to prevent multiple polling loops.
-    if (pollingIntervalRef.current) {
-      clearInterval(pollingIntervalRef.current);
-    }
-
-    const intervalId = setInterval(async () => {
-      try {
-        const token = getAuthToken();
-        if (!token) {
-          clearInterval(intervalId);
-          toast.error('Authentication lost. Please log in again.');
-          return;
-        }
-
-        // Get count of unsent leads (newly scraped ones)
-        const countRes = await fetch(`${BASE_URL}/leads/count?sent=false`, {
-          headers: {
-            'Authorization': `Bearer ${token}`,
-          }
-        });
-
-        if (!countRes.ok) {
-          if (countRes.status === 401) {
-            clearInterval(intervalId);
-            toast.error('Authentication failed. Please log in again.');
-            return;
-          }
-          throw new Error(`Failed to fetch lead count: ${countRes.statusText}`);
-        }
-
-        const countData = await countRes.json();
-        const newLeads = countData.count;
-
-        // Update the progress state
-        setScrapeProgress(prev => {
-          const newProgress = {
-            ...prev,
-            scraped: newLeads,
-            total: total
-          };
-
-          // Check for completion criteria
-          if (newLeads >= total) {
-            newProgress.status = 'complete';
-            return newProgress;
-          } else {
-            return newProgress;
-          }
-        });
-
-        // Check again after state update to see if we should stop polling
-        if (newLeads >= total) {
-          setIsScraping(false);
-          clearInterval(intervalId);
-          fetchRecentLeads(); // Fetch the new leads to display in the table
-          toast.success(`Scraping completed! Found ${newLeads} businesses.`);
-        }
-      } catch (error) {
-        console.error('Error polling progress:', error);
-        toast.error(error.message || 'An error occurred during scraping.');
-        setIsScraping(false);
-        clearInterval(intervalId);
-        setScrapeProgress({
-          scraped: 0,
-          total: 0,
-          status: 'error'
-        });
-      }
-    }, 3000); // Poll every 3 seconds
-
-    pollingIntervalRef.current = intervalId;
-  };
-
   /**
    * Returns a user-friendly status message based on the scraping progress.
    */
@@ -1,7 +1,8 @@
 'use client';
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import Head from 'next/head';
 import toast, { Toaster } from 'react-hot-toast';
+import useServerEvents from '@/lib/useServerEvents';
 
 export default function SendEmails() {
   const BASE_URL = process.env.NEXT_PUBLIC_BASE_URL;
@@ -40,6 +41,23 @@ export default function SendEmails() {
     owner_name: ''
   });
 
+  // Resolves when the backend reports the running campaign as finished
+  const sendDoneRef = useRef(null);
+
+  // Live lead counts and campaign progress pushed by the backend (server-sent events)
+  useServerEvents({
+    counts: (data) => setTotalLeads(data.unsent),
+    send: (data) => {
+      const done = data.sent + data.failed;
+      setCurrentEmail(done);
+      setProgress(data.total ? Math.min(100, Math.round((done / data.total) * 100)) : 100);
+      if ((data.status === 'complete' || data.status === 'error') && sendDoneRef.current) {
+        sendDoneRef.current(data);
+        sendDoneRef.current = null;
+      }
+    }
+  });
+
   // Function to get auth token from localStorage
   const getAuthToken = () => {
     if (typeof window !== 'undefined') {
@@ -69,43 +87,28 @@ export default function SendEmails() {
           'Authorization': `Bearer ${token}`,
         };
 
-        const [templatesRes, countRes, accountsRes] = await Promise.all([
-          fetch(`${BASE_URL}/templates`, { headers }),
-          fetch(`${BASE_URL}/leads/count?sent=false`, { headers }), // ✅ add sent=false
-          fetch(`${BASE_URL}/email-accounts`, { headers })
-        ]);
-
-        if (!templatesRes.ok) {
-          if (templatesRes.status === 401) {
-            throw new Error('Authentication failed. Please log in again.');
-          }
-          throw new Error(`Failed to load templates: ${templatesRes.statusText}`);
-        }
-
-        if (!countRes.ok) {
-          if (countRes.status === 401) {
-            throw new Error('Authentication failed. Please log in again.');
-          }
-          throw new Error(`Failed to load lead count: ${countRes.statusText}`);
-        }
+        // templates, lead counts and accounts in one round trip
+        const dashboardRes = await fetch(`${BASE_URL}/dashboard?page=send`, { headers });
 
-        if (!accountsRes.ok) {
-          if (accountsRes.status === 401) {
+        if (!dashboardRes.ok) {
+          if (dashboardRes.status === 401) {
             throw new Error('Authentication failed. Please log in again.');
           }
-          throw new Error(`Failed to load email accounts: ${accountsRes.statusText}`);
+          throw new Error(`Failed to load data: ${dashboardRes.statusText}`);
         }
 
-        const templatesData = await templatesRes.json();
-        const countData = await countRes.json();
-        const accountsData = await accountsRes.json();
+        const {
+          templates: templatesData,
+          lead_counts: leadCounts,
+          email_accounts: accountsData,
+        } = await dashboardRes.json();
 
         setTemplates(templatesData);
         setSelectedTemplate(templatesData[0]);
         setEmailContent(templatesData[0]?.content || '');
         setDistribution([{ templateId: templatesData[0]?.id || '', count: 0 }]);
 
-        setTotalLeads(countData.count);
+        setTotalLeads(leadCounts.unsent);
         setEmailAccounts(accountsData);
         setSelectedAccounts(accountsData.map(acc => acc.id));
 
@@ -204,6 +207,11 @@ export default function SendEmails() {
 
       setTotalEmails(leadsToSend.length);
 
+      // Listen for the campaign's completion event before it can possibly arrive
+      const finished = new Promise((resolve) => {
+        sendDoneRef.current = resolve;
+      });
+
       // Send all emails at once using the new bulk endpoint
       const response = await fetch(`${BASE_URL}/send-emails`, {
         method: 'POST',
@@ -230,53 +238,27 @@ export default function SendEmails() {
       const result = await response.json();
 
       if (result.status === 'queued') {
-        // Poll for completion
-        let attempts = 0;
-        const maxAttempts = 60; // 5 minutes max
-        let isComplete = false;
-
-        while (attempts < maxAttempts && !isComplete) {
-          await new Promise(resolve => setTimeout(resolve, 5000)); // Check every 5 seconds
-
-          const countRes = await fetch(`${BASE_URL}/leads/count?sent=false`, { headers });
-
-          if (!countRes.ok) {
-            if (countRes.status === 401) {
-              throw new Error('Authentication failed. Please log in again.');
-            }
-            throw new Error(`Failed to fetch lead count: ${countRes.statusText}`);
-          }
-
-          const countData = await countRes.json();
-          const remainingLeadsCount = countData.count;
-          const sentCount = totalLeads - remainingLeadsCount;
-          const currentProgress = Math.min(100, Math.round((sentCount / leadsToSend.length) * 100));
-
-          setCurrentEmail(sentCount);
-          setProgress(currentProgress);
-
-          if (sentCount >= leadsToSend.length || currentProgress === 100) {
-            isComplete = true;
-            break;
-          }
+        // Wait for the campaign to finish; progress and the unsent count arrive as events
+        const outcome = await Promise.race([
+          finished,
+          new Promise((resolve) => setTimeout(() => resolve(null), 5 * 60 * 1000)) // stop waiting after 5 minutes
+        ]);
 
-          attempts++;
+        if (outcome?.status === 'error') {
+          throw new Error(outcome.error || 'Failed to send emails');
         }
-
-        // Update total leads count
-        const finalCountRes = await fetch(`${BASE_URL}/leads/count?sent=false`, { headers });
-        if (finalCountRes.ok) {
-          const finalCountData = await finalCountRes.json();
-          setTotalLeads(finalCountData.count);
+        if (outcome) {
+          toast.success(`Successfully sent ${outcome.sent} emails${outcome.failed ? `, ${outcome.failed} failed` : ''}`);
+        } else {
+          toast.success(`Sending ${leadsToSend.length} emails in the background`);
         }
-
-        toast.success(`Successfully sent ${leadsToSend.length} emails`);
       } else {
         throw new Error(result.message || 'Failed to send emails');
       }
     } catch (error) {
       toast.error(error.message || 'Failed to send emails');
     } finally {
+      sendDoneRef.current = null;
       setIsSending(false);
       // Close modal after a short delay to show completion
       setTimeout(() => {
@@ -309,8 +291,9 @@ export default function SendEmails() {
     console.log('Auth token:', token); // Debug log
 
     const toastId = toast.loading('Rephrasing email...');
+    const originalContent = emailContent;
     try {
-      const response = await fetch(`${BASE_URL}/rephrase-email`, {
+      const response = await fetch(`${BASE_URL}/rephrase-email/stream`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -334,10 +317,44 @@ export default function SendEmails() {
         throw new Error(errorData.detail || `Rephrasing failed: ${response.status}`);
       }
 
-      const result = await response.json();
-      // ... rest of the function
+      // Server-sent events over the POST response: show text as it is generated
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let streamed = '';
+      let finished = false;
+      while (!finished) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const frames = buffer.split('\n\n');
+        buffer = frames.pop();
+        for (const frame of frames) {
+          const event = frame.match(/^event: (.*)$/m)?.[1];
+          const data = frame.match(/^data: (.*)$/m)?.[1];
+          if (!event || !data) continue;
+          const payload = JSON.parse(data);
+          if (event === 'delta') {
+            streamed += payload.text;
+            setEmailContent(streamed);
+          } else if (event === 'done') {
+            setEmailContent(payload.rephrased_content);
+            setTemplates((prev) => prev.map((t) => (
+              t.id === selectedTemplate.id ? { ...t, content: payload.rephrased_content } : t
+            )));
+            toast.success('Email rephrased!', { id: toastId });
+            finished = true;
+          } else if (event === 'error') {
+            throw new Error(payload.detail);
+          }
+        }
+      }
+      if (!finished) {
+        throw new Error('Rephrasing stopped before it finished');
+      }
     } catch (error) {
       console.error('Rephrase error:', error);
+      setEmailContent(originalContent);
       toast.error(error.message || 'Failed to rephrase email', { id: toastId });
     }
   };
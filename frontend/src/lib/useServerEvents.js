@@ -0,0 +1,93 @@
+'use client';
+
+import { useEffect, useRef } from 'react';
+
+const RETRY_MIN_MS = 1000;
+const RETRY_MAX_MS = 30000;
+
+/**
+ * Subscribes to the backend's server-sent events (GET /events) for the logged-in user.
+ * `handlers` maps event names ('counts', 'scrape', 'send') to callbacks receiving the parsed data.
+ * EventSource cannot send headers, so each connection uses a short-lived token from
+ * POST /events/token instead of the login token. When the browser gives up reconnecting
+ * (e.g. the stream token expired), a fresh token is fetched and the stream reopened.
+ * The first event after (re)connecting is always 'counts'.
+ */
+export default function useServerEvents(handlers, baseUrl = process.env.NEXT_PUBLIC_BASE_URL) {
+  // Keep the latest handlers without reopening the stream on every render.
+  const handlersRef = useRef(handlers);
+  handlersRef.current = handlers;
+
+  useEffect(() => {
+    const token = typeof window !== 'undefined' ? localStorage.getItem('token') : null;
+    if (!token || !baseUrl) {
+      return undefined;
+    }
+
+    let source = null;
+    let retryTimer = null;
+    let retryDelay = RETRY_MIN_MS;
+    let stopped = false;
+
+    const listeners = {};
+    ['counts', 'scrape', 'send'].forEach((name) => {
+      listeners[name] = (event) => {
+        const handler = handlersRef.current[name];
+        if (!handler) return;
+        try {
+          handler(JSON.parse(event.data));
+        } catch (error) {
+          console.error(`Bad ${name} event:`, error);
+        }
+      };
+    });
+
+    const scheduleRetry = () => {
+      if (stopped) return;
+      retryTimer = setTimeout(connect, retryDelay);
+      retryDelay = Math.min(retryDelay * 2, RETRY_MAX_MS);
+    };
+
+    async function connect() {
+      let streamToken;
+      try {
+        const response = await fetch(`${baseUrl}/events/token`, {
+          method: 'POST',
+          headers: { 'Authorization': `Bearer ${token}` },
+        });
+        if (response.status === 401) return; // login token expired or revoked
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        streamToken = (await response.json()).token;
+      } catch (error) {
+        console.error('Could not get an event stream token:', error);
+        scheduleRetry();
+        return;
+      }
+      if (stopped) return;
+
+      source = new EventSource(`${baseUrl}/events?token=${encodeURIComponent(streamToken)}`);
+      Object.entries(listeners).forEach(([name, listener]) => source.addEventListener(name, listener));
+      source.onopen = () => {
+        retryDelay = RETRY_MIN_MS;
+      };
+      source.onerror = () => {
+        // CONNECTING: the browser retries by itself; CLOSED: it gave up, so start over with a new token
+        if (source.readyState === EventSource.CLOSED) {
+          source = null;
+          scheduleRetry();
+        }
+      };
+    }
+
+    connect();
+
+    return () => {
+      stopped = true;
+      clearTimeout(retryTimer);
+      if (source) {
+        Object.entries(listeners).forEach(([name, listener]) => source.removeEventListener(name, listener));
+        source.close();
+      }
+    };
+  }, [baseUrl]);
+}